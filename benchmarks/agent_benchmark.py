@@ -0,0 +1,371 @@
+"""Agent benchmark: syllable counting, line generation, interpretation, messaging and full sessions.
+
+Every measurement uses a fixed corpus (below) and fixed seeds, so two runs on
+the same machine do the same work and their numbers can be compared:
+
+  syllables      `_count_syllables_for_word` over dictionary words and made-up
+                 (fallback heuristic) words, cold (fresh index, empty word
+                 cache) and warm (every word already cached); plus the
+                 heuristic alone over a bulk list of made-up words, scalar
+                 (`estimate_syllables`) and batched (`estimate_syllables_batch`).
+  haiku_line     `_generate_haiku_line` over fixed keyword pairs and 5/7
+                 syllable targets; also reports the success rate and solver
+                 attempts per line from the telemetry counters.
+  interpret      `interpret_poetry` on a short and a long poem, each at the
+                 start of a conversation.
+  round_trip     `send_message` then `receive_message` between two agents in
+                 one process, for the file and mailbox transports (see
+                 transport_benchmark.py for the cross-process numbers).
+  dedup          near-duplicate checks: MinHash `signature` of the short and
+                 long poems, and `most_similar` against an index holding
+                 DEDUP_INDEX_POEMS earlier poems (random signatures), for a
+                 poem that matches one of them and for one that matches none.
+  word_assoc     opening a word association index built from a synthetic
+                 corpus (WORD_ASSOC_VOCABULARY made-up words), and `related`
+                 for a word it holds and for one it does not.
+  session        full `run_workflow` dialogues (haiku and sonnet, two rounds,
+                 console, transcript and PDF output off) per second.
+
+Each benchmark is repeated `--repeat` times and the median and minimum are
+reported. `--json` writes the results, with the commit and environment, to a
+file; `--compare` checks a run against such a file and exits with status 1 if
+any median got slower by more than `--threshold`.
+
+Usage:
+    python benchmarks/agent_benchmark.py [--repeat 5] [--only syllables,session]
+        [--json results.json] [--compare baseline.json] [--threshold 0.25]
+"""
+
+import argparse
+import array
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import main_workflow
+from poet_agents.backends import load_backend
+from poet_agents.dedup import SIGNATURE_BINS, NearDuplicateIndex, signature
+from poet_agents.mailbox import MailboxTransport
+from poet_agents.poetry_agent import PoetryAgent
+from poet_agents.scheduler import DialogueConfig
+from poet_agents.syllable_index import SyllableIndex, estimate_syllables, estimate_syllables_batch, get_syllable_index
+from poet_agents.telemetry import configure_logging, counters
+from poet_agents.transport import FileTransport
+from poet_agents.word_assoc import WordAssociations, build_word_associations
+
+SEED = 20240601
+
+DICTIONARY_WORDS = (
+    "river", "mountain", "whisper", "evening", "silence", "remember", "lantern", "harvest", "shadow", "ocean",
+    "eternity", "wonder", "morning", "gather", "beautiful", "forgotten", "memory", "horizon", "quiet", "thunder",
+    "window", "garden", "crystal", "distance", "yesterday", "beneath", "hollow", "mirror", "journey", "melody",
+)
+FALLBACK_WORDS = (
+    "zorblat", "quixelm", "frandish", "moonvale", "glimmerous", "starlorn", "thrennic", "vasterly", "oomphine", "driftacle",
+    "cloudspun", "wyrmish", "lumenesque", "skorn", "bellowmere", "pribbet", "yonderish", "fennowy", "glaust", "mistrelling",
+)
+BULK_FALLBACK_WORDS = [word + suffix for word in FALLBACK_WORDS for suffix in ("", "e", "le", "es", "y", "ish")] * 500
+KEYWORD_PAIRS = (
+    ("river", "stone"), ("memory", "light"), ("ocean", "eternity"), ("lantern", "harvest"),
+    ("silence", "thunder"), ("mountain", "mirror"), ("cosmic", "destiny"), ("garden", "shadow"),
+)
+HAIKU_TARGETS = (5, 7, 5)
+
+SHORT_POEM = "An ember of the evening sky\nwhispers where the rivers lie\nand the mountains answer why."
+LONG_POEM = "\n".join((
+    "The lantern of the harvest moon hangs low above the field,",
+    "and every furrow keeps the shape the summer plough revealed.",
+    "The river carries silver leaves toward the sleeping town,",
+    "where bells recall the fading hour and slowly wind it down.",
+    "A heron in the shallows waits, as patient as the stone,",
+    "and memory, like water, finds a pathway of its own.",
+    "The orchard walls are warm with light long after dusk has come;",
+    "the crickets tune a quiet song, the distant thunder hums.",
+    "I walked the ridge at morning when the mist was on the pines,",
+    "and read the old cartographers' impossible designs:",
+    "the oceans drawn as sleeping beasts, the mountains drawn as waves,",
+    "the cities marked by candles and the harbours marked by graves.",
+    "Now every map I carry home has rivers I have crossed,",
+    "and every river answers with the names of what was lost.",
+    "So let the garden keep its secrets underneath the snow;",
+    "the mirror of the winter sky remembers what we know.",
+) * 3)
+INTERPRET_POEMS = {"short": SHORT_POEM, "long": LONG_POEM}
+
+SESSION_FORMS = ("haiku", "sonnet")
+SESSION_ROUNDS = 2
+
+DEDUP_INDEX_POEMS = 100_000
+
+WORD_ASSOC_VOCABULARY = 5_000
+WORD_ASSOC_PARAGRAPHS = 20_000
+WORD_ASSOC_PARAGRAPH_WORDS = 20
+
+BENCHMARKS = ("syllables", "haiku_line", "interpret", "round_trip", "dedup", "word_assoc", "session")
+
+
+def measure(fn, repeat: int) -> list:
+    """Runs `fn` `repeat` times and returns the wall time of each run, in seconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples: list, operations: int, unit: str = "us_per_op") -> dict:
+    """Median and minimum time per operation (microseconds) for `operations` operations per sample."""
+    scale = 1e6 / operations
+    return {"operations": operations, "unit": unit,
+            "median": statistics.median(samples) * scale, "min": min(samples) * scale}
+
+
+def counter_delta(before: dict, name: str) -> int:
+    return counters.get(name) - before.get(name, 0)
+
+
+def bench_syllables(repeat: int) -> dict:
+    get_syllable_index().stress_table() # Load (or build) the shared table outside the timings
+    results = {}
+    for kind, words in (("dictionary", DICTIONARY_WORDS), ("fallback", FALLBACK_WORDS)):
+        agent = PoetryAgent("alpha", seed=SEED)
+        cold, warm = [], []
+        for _ in range(repeat):
+            index = SyllableIndex()
+            index.stress_table() # Table loaded from the on-disk cache; the word cache starts empty
+            agent.syllable_index = index
+            cold.extend(measure(lambda: [agent._count_syllables_for_word(word) for word in words], 1))
+            warm.extend(measure(lambda: [agent._count_syllables_for_word(word) for word in words], 1))
+        results[f"{kind}_cold"] = summarize(cold, len(words))
+        results[f"{kind}_warm"] = summarize(warm, len(words))
+    results["fallback_bulk_scalar"] = summarize(measure(lambda: [estimate_syllables(word) for word in BULK_FALLBACK_WORDS], repeat),
+                                                len(BULK_FALLBACK_WORDS))
+    results["fallback_bulk_batch"] = summarize(measure(lambda: estimate_syllables_batch(BULK_FALLBACK_WORDS), repeat),
+                                               len(BULK_FALLBACK_WORDS))
+    return results
+
+
+def bench_haiku_line(repeat: int) -> dict:
+    cases = [(kw1, kw2, target, number) for kw1, kw2 in KEYWORD_PAIRS for number, target in enumerate(HAIKU_TARGETS, 1)]
+    agent = PoetryAgent("beta", seed=SEED)
+    buckets = agent._persona_buckets()
+    for kw1, kw2, target, number in cases: # Warm the syllable cache so only generation is timed
+        agent._generate_haiku_line(f"{kw1} {kw2}", kw1, kw2, target, number, buckets)
+
+    before = counters.snapshot()
+    samples = []
+    for _ in range(repeat):
+        agent.rng.seed(SEED)
+        samples.extend(measure(lambda: [agent._generate_haiku_line(f"{kw1} {kw2}", kw1, kw2, target, number, buckets)
+                                        for kw1, kw2, target, number in cases], 1))
+    lines = counter_delta(before, "lines_generated")
+    failed = counter_delta(before, "lines_failed")
+    result = summarize(samples, len(cases))
+    result.update({"lines": lines, "success_rate": (lines - failed) / lines if lines else 0.0,
+                   "attempts_per_line": counter_delta(before, "line_attempts") / lines if lines else 0.0})
+    return {"haiku_line": result}
+
+
+def bench_interpret(repeat: int) -> dict:
+    results = {}
+    for size, poem in INTERPRET_POEMS.items():
+        agent = PoetryAgent("alpha", seed=SEED)
+        agent.interpret_poetry(poem) # Warm the syllable cache and lexicon
+        iterations = 50
+
+        def interpret_fresh():
+            for _ in range(iterations):
+                agent.start_conversation()
+                agent.interpret_poetry(poem)
+
+        results[size] = summarize(measure(interpret_fresh, repeat), iterations)
+        results[size]["words"] = len(poem.split())
+    return results
+
+
+def bench_round_trip(repeat: int) -> dict:
+    results = {}
+    iterations = 200
+    for kind in ("file", "mailbox"):
+        directory = tempfile.mkdtemp(prefix=f"agent_bench_{kind}_")
+        try:
+            transport = FileTransport(directory) if kind == "file" else MailboxTransport(directory)
+            sender = PoetryAgent("alpha", transport=transport, seed=SEED)
+            receiver = PoetryAgent("beta", transport=transport, seed=SEED)
+
+            def ping():
+                for _ in range(iterations):
+                    sender.send_message(recipient_id="beta", message_type="response_poem", payload=SHORT_POEM)
+                    assert receiver.receive_message() is not None, f"{kind}: message lost"
+
+            results[kind] = summarize(measure(ping, repeat), iterations)
+            transport.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def bench_dedup(repeat: int) -> dict:
+    results = {}
+    iterations = 200
+    for size, poem in INTERPRET_POEMS.items():
+        results[f"signature_{size}"] = summarize(measure(lambda: [signature.__wrapped__(poem) for _ in range(iterations)], repeat),
+                                                 iterations)
+    rng = random.Random(SEED)
+    index = NearDuplicateIndex()
+    for entry in range(DEDUP_INDEX_POEMS):
+        index.add(array.array("I", (rng.getrandbits(32) for _ in range(SIGNATURE_BINS))), entry)
+    stored = index._signatures[:SIGNATURE_BINS]
+    for kind, query in (("hit", stored), ("miss", signature(LONG_POEM))):
+        results[f"query_{kind}"] = summarize(measure(lambda: [index.most_similar(query) for _ in range(iterations)], repeat),
+                                             iterations)
+        results[f"query_{kind}"]["indexed_poems"] = len(index)
+    return results
+
+
+def bench_word_assoc(repeat: int) -> dict:
+    results = {}
+    iterations = 200
+    rng = random.Random(SEED)
+    words = [f"word{number}" for number in range(WORD_ASSOC_VOCABULARY)]
+    # Zipf-like: low-numbered words are common, so rows and neighbour lists vary in length as in real text.
+    paragraphs = [[words[min(int(rng.paretovariate(1.0)) - 1, WORD_ASSOC_VOCABULARY - 1)] for _ in range(WORD_ASSOC_PARAGRAPH_WORDS)]
+                  for _ in range(WORD_ASSOC_PARAGRAPHS)]
+    directory = tempfile.mkdtemp(prefix="agent_bench_assoc_")
+    try:
+        path = os.path.join(directory, "assoc.bin")
+        stats = build_word_associations(paragraphs, path)
+        results["load"] = summarize(measure(lambda: [WordAssociations(path).close() for _ in range(iterations)], repeat), iterations)
+        results["load"]["vocabulary"] = stats["vocabulary"]
+        associations = WordAssociations(path)
+        for kind, word in (("hit", words[1]), ("miss", "unheard")):
+            results[f"related_{kind}"] = summarize(measure(lambda: [associations.related(word) for _ in range(iterations)], repeat),
+                                                   iterations)
+        associations.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def bench_session(repeat: int) -> dict:
+    results = {}
+    iterations = 5
+    for form in SESSION_FORMS:
+        directory = tempfile.mkdtemp(prefix="agent_bench_session_")
+        try:
+            def sessions():
+                for seed in range(SEED, SEED + iterations):
+                    config = DialogueConfig(form=form, rounds=SESSION_ROUNDS, seed=seed, message_dir=directory)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        main_workflow.run_workflow(config, transcript_path=None, pdf_path=None, echo=False)
+
+            sessions() # Warm-up: syllable and rhyme caches
+            result = summarize(measure(sessions, repeat), iterations, unit="ms_per_session")
+            result["median"] /= 1000
+            result["min"] /= 1000
+            result["sessions_per_s"] = 1000 / result["median"]
+            results[form] = result
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+BENCHMARK_FUNCTIONS = {
+    "syllables": bench_syllables,
+    "haiku_line": bench_haiku_line,
+    "interpret": bench_interpret,
+    "round_trip": bench_round_trip,
+    "dedup": bench_dedup,
+    "word_assoc": bench_word_assoc,
+    "session": bench_session,
+}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pronouncing": load_backend("pronouncing") is not None,
+        "seed": SEED,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """(benchmark, case, baseline median, current median, change) for every case present in both runs."""
+    rows = []
+    for name, cases in results.items():
+        for case, current in cases.items():
+            previous = baseline.get("results", {}).get(name, {}).get(case)
+            if previous and previous.get("unit") == current["unit"] and previous["median"] > 0:
+                change = current["median"] / previous["median"] - 1.0
+                rows.append((name, case, previous["median"], current["median"], change, change > threshold))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark; the median is reported.")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", default=None, help="JSON file from an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Slowdown (fraction) that counts as a regression.")
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in BENCHMARK_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    configure_logging("ERROR", stream=sys.stderr) # Degraded-mode notices would otherwise flood the output
+
+    results = {name: BENCHMARK_FUNCTIONS[name](max(1, args.repeat)) for name in selected}
+
+    print(f"{'benchmark':<12} {'case':<20} {'median':>12} {'min':>12}  unit")
+    for name, cases in results.items():
+        for case, result in cases.items():
+            extra = ""
+            if "success_rate" in result:
+                extra = f"  success {result['success_rate']:.1%}, {result['attempts_per_line']:.2f} attempts/line"
+            elif "sessions_per_s" in result:
+                extra = f"  {result['sessions_per_s']:.1f} sessions/s"
+            print(f"{name:<12} {case:<20} {result['median']:>12.2f} {result['min']:>12.2f}  {result['unit']}{extra}")
+
+    report = {"environment": environment(), "repeat": args.repeat, "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\nAgainst {args.compare} (commit {baseline.get('environment', {}).get('commit')}):")
+        for name, case, previous, current, change, regressed in rows:
+            print(f"  {name:<12} {case:<20} {previous:>10.2f} -> {current:>10.2f}  {change:+.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
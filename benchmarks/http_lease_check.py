@@ -0,0 +1,128 @@
+"""HTTP lease check: do takes, leases and acknowledgements keep messages whole and in order?
+
+Runs an `AgentServer` on loopback and an `HttpTransport` against it, and checks
+the delivery guarantees the lease protocol makes:
+
+  - a take whose reply is lost after the server leased the messages is retried
+    and gets the same messages back, so nothing is skipped or reordered;
+  - messages whose lease expires go back to the front of the mailbox in their
+    original order, and a long poll wakes for them without waiting out `wait`;
+  - acknowledging an unknown lease is answered (not acknowledged), not an error;
+  - a take asking for fewer than one message is rejected with 400.
+
+Prints one line per check and exits with status 1 if any fails.
+
+Usage:
+    python benchmarks/http_lease_check.py
+"""
+
+import http.client
+import os
+import socket
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poet_agents import http_transport
+from poet_agents.http_transport import AgentServer, HttpTransport
+from poet_agents.message_structure import Message
+
+RECIPIENT = "listener"
+
+
+def post(transport: HttpTransport, *payloads: str):
+    transport.send_many([Message("speaker", RECIPIENT, "check", payload) for payload in payloads])
+
+
+def check_lost_reply(server: AgentServer, transport: HttpTransport) -> bool:
+    post(transport, "first", "second", "third")
+    handler = http_transport._AgentRequestHandler
+    reply = handler._reply
+    dropped = []
+
+    def drop_first_take(self, status, body):
+        # Lose the reply to the first take that leased something: the server has dequeued, the client never hears.
+        if self.command == "GET" and not dropped and body.get("messages"):
+            dropped.append(body["lease"])
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        reply(self, status, body)
+
+    handler._reply = drop_first_take
+    try:
+        received = [transport.receive(RECIPIENT) for _ in range(3)]
+    finally:
+        handler._reply = reply
+    payloads = [message.payload if message else None for message in received]
+    return bool(dropped) and payloads == ["first", "second", "third"] and not server.httpd.mailboxes._leases
+
+
+def check_expiry_order(server: AgentServer, transport: HttpTransport) -> bool:
+    mailboxes = server.httpd.mailboxes
+    mailboxes.lease_seconds = 0.2
+    post(transport, "one", "two")
+    mailboxes.take(RECIPIENT, None, 0.0) # A client that leases both and never acknowledges
+    post(transport, "three")
+    time.sleep(0.3)
+    payloads = [message.payload for message in transport.receive_many(RECIPIENT)]
+    return payloads == ["one", "two", "three"]
+
+
+def check_expiry_wakes_long_poll(server: AgentServer, transport: HttpTransport) -> bool:
+    mailboxes = server.httpd.mailboxes
+    mailboxes.lease_seconds = 0.2
+    post(transport, "late")
+    mailboxes.take(RECIPIENT, None, 0.0)
+    started = time.monotonic()
+    message = transport.receive_blocking(RECIPIENT, 5.0)
+    return message is not None and message.payload == "late" and time.monotonic() - started < 2.0
+
+
+def raw_request(server: AgentServer, method: str, path: str):
+    url = urllib.parse.urlsplit(server.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=5)
+    try:
+        connection.request(method, path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def check_unknown_lease(server: AgentServer, transport: HttpTransport) -> bool:
+    status, body = raw_request(server, "DELETE", "/leases/no-such-lease")
+    return status == 200 and b'"acknowledged":false' in body
+
+
+def check_max_below_one(server: AgentServer, transport: HttpTransport) -> bool:
+    return all(raw_request(server, "GET", f"/messages/{RECIPIENT}?max={count}")[0] == 400 for count in (0, -1))
+
+
+CHECKS = [
+    ("lost take reply is retried without skipping or reordering", check_lost_reply),
+    ("expired leases requeue in front, in order", check_expiry_order),
+    ("lease expiry wakes a long poll", check_expiry_wakes_long_poll),
+    ("acknowledging an unknown lease", check_unknown_lease),
+    ("max below 1 is rejected", check_max_below_one),
+]
+
+
+def main() -> int:
+    ok = True
+    for name, check in CHECKS:
+        with AgentServer() as server: # A fresh server and client per check
+            transport = HttpTransport(server.url)
+            try:
+                passed = check(server, transport)
+            finally:
+                transport.close()
+        print(f"  {'OK  ' if passed else 'FAIL'} {name}")
+        ok = ok and passed
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Startup benchmark: how long does `import poet_agents` take in a fresh interpreter?
+
+Worker processes are short-lived, so import time is paid on every job. Each
+run spawns a new Python process, imports the package modules and reports the
+time spent inside the imports (interpreter start-up itself is excluded). The
+script also checks that no optional backend (any module listed in
+`backends.OPTIONAL_BACKENDS`) was imported as a side effect, and exits with
+status 1 if either the median import time exceeds the budget or a backend was
+loaded eagerly.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 20] [--budget-ms 50]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import poet_agents
+import poet_agents.poetry_agent
+import main_workflow
+elapsed = time.perf_counter() - start
+from poet_agents.backends import OPTIONAL_BACKENDS
+eager = [spec["module"] for spec in OPTIONAL_BACKENDS.values() if spec["module"] in sys.modules]
+print(json.dumps({"seconds": elapsed, "eager_backends": eager}))
+"""
+
+
+def measure_once() -> dict:
+    result = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Number of fresh interpreters to measure.")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="Maximum allowed median import time.")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    times_ms = sorted(sample["seconds"] * 1000.0 for sample in samples)
+    eager = sorted({name for sample in samples for name in sample["eager_backends"]})
+    median_ms = statistics.median(times_ms)
+
+    print(f"import poet_agents (+ poetry_agent, main_workflow) over {args.runs} runs:")
+    print(f"  min {times_ms[0]:.2f} ms | median {median_ms:.2f} ms | max {times_ms[-1]:.2f} ms "
+          f"| budget {args.budget_ms:.2f} ms")
+
+    ok = True
+    if eager:
+        print(f"  FAIL: optional backends imported eagerly: {', '.join(eager)}")
+        ok = False
+    if median_ms > args.budget_ms:
+        print("  FAIL: median import time is over budget")
+        ok = False
+    if ok:
+        print("  OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
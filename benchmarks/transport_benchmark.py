@@ -0,0 +1,155 @@
+"""Transport benchmark: round-trip latency and throughput between two processes.
+
+For each transport an echo agent runs in a separate process (the HTTP server
+gets a process of its own as well). Two measurements are taken:
+
+  latency     `--round-trips` ping-pongs of one envelope each; reports the
+              median and p99 round-trip time and the messages/s that implies.
+  throughput  `--messages` envelopes sent one way in batches of `--batch`
+              (`send_many`), drained by the echo agent with `receive_many`,
+              which acknowledges the last one. Skipped for the file
+              transport, which holds a single message per recipient.
+
+`--codec` selects the message encoding of the file and mailbox transports
+(json or binary, see poet_agents/message_codec.py); HTTP always speaks JSON.
+
+Usage:
+    python benchmarks/transport_benchmark.py [--transports file,mailbox,http]
+        [--round-trips 500] [--messages 5000] [--batch 50] [--codec json] [--json results.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from poet_agents.http_transport import AgentServer, HttpTransport
+from poet_agents.mailbox import MailboxTransport
+from poet_agents.message_codec import CODECS, DEFAULT_CODEC
+from poet_agents.transport import FileTransport
+
+PAYLOAD = "An ember of the evening sky\nwhispers where the rivers lie\nand the mountains answer why."
+RECEIVE_TIMEOUT = 10.0
+
+
+def make_transport(kind: str, location: str, codec: str):
+    if kind == "file":
+        return FileTransport(location, codec=codec)
+    if kind == "mailbox":
+        return MailboxTransport(location, codec=codec)
+    return HttpTransport(location)
+
+
+def envelope(sender: str, recipient: str, sequence: int) -> dict:
+    return {"sender_id": sender, "recipient_id": recipient, "message_type": "bench",
+            "payload": PAYLOAD, "sequence": sequence, "timestamp": "2024-01-01T00:00:00Z"}
+
+
+def run_server(connection):
+    server = AgentServer()
+    connection.send(server.url)
+    server.serve_forever()
+
+
+def run_echo(kind: str, location: str, codec: str, round_trips: int, messages: int):
+    transport = make_transport(kind, location, codec)
+    for _ in range(round_trips):
+        message = transport.receive_blocking("echo", RECEIVE_TIMEOUT)
+        transport.send(envelope("echo", "main", message["sequence"]))
+    received = 0
+    while received < messages:
+        if transport.receive_blocking("echo", RECEIVE_TIMEOUT) is None:
+            break
+        received += 1 + len(transport.receive_many("echo"))
+    if messages:
+        transport.send(envelope("echo", "main", received))
+    transport.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def bench_transport(kind: str, round_trips: int, messages: int, batch: int, codec: str = DEFAULT_CODEC) -> dict:
+    server_process = None
+    directory = None
+    if kind == "http":
+        parent_end, child_end = multiprocessing.Pipe()
+        server_process = multiprocessing.Process(target=run_server, args=(child_end,), daemon=True)
+        server_process.start()
+        location = parent_end.recv()
+    else:
+        location = directory = tempfile.mkdtemp(prefix=f"transport_bench_{kind}_")
+    if kind == "file":
+        messages = 0
+    echo = multiprocessing.Process(target=run_echo, args=(kind, location, codec, round_trips, messages))
+    echo.start()
+    transport = make_transport(kind, location, codec)
+    try:
+        latencies = []
+        for sequence in range(round_trips):
+            started = time.perf_counter()
+            transport.send(envelope("main", "echo", sequence))
+            reply = transport.receive_blocking("main", RECEIVE_TIMEOUT)
+            latencies.append(time.perf_counter() - started)
+            assert reply is not None and reply["sequence"] == sequence, f"{kind}: lost round trip {sequence}"
+        latencies.sort()
+        result = {
+            "transport": kind,
+            "codec": "json" if kind == "http" else codec,
+            "round_trips": round_trips,
+            "rtt_median_ms": statistics.median(latencies) * 1000,
+            "rtt_p99_ms": percentile(latencies, 0.99) * 1000,
+            "ping_pong_messages_per_s": 2 * round_trips / sum(latencies),
+        }
+        if messages:
+            started = time.perf_counter()
+            for start in range(0, messages, batch):
+                transport.send_many([envelope("main", "echo", sequence) for sequence in range(start, min(start + batch, messages))])
+            ack = transport.receive_blocking("main", RECEIVE_TIMEOUT)
+            elapsed = time.perf_counter() - started
+            assert ack is not None and ack["sequence"] == messages, f"{kind}: echo saw {ack and ack['sequence']} of {messages}"
+            result.update({"messages": messages, "batch": batch, "throughput_messages_per_s": messages / elapsed})
+        return result
+    finally:
+        echo.join(RECEIVE_TIMEOUT)
+        transport.close()
+        if server_process is not None:
+            server_process.terminate()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transports", default="file,mailbox,http", help="Comma-separated: file, mailbox, http.")
+    parser.add_argument("--round-trips", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--codec", default=DEFAULT_CODEC, choices=sorted(CODECS), help="Message encoding for file and mailbox.")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = [bench_transport(kind.strip(), args.round_trips, args.messages, max(1, args.batch), args.codec)
+               for kind in args.transports.split(",") if kind.strip()]
+    print(f"{'transport':<10} {'codec':<7} {'rtt median':>11} {'rtt p99':>9} {'ping-pong/s':>12} {'throughput/s':>13}")
+    for result in results:
+        throughput = result.get("throughput_messages_per_s")
+        print(f"{result['transport']:<10} {result['codec']:<7} {result['rtt_median_ms']:>9.3f}ms {result['rtt_p99_ms']:>7.3f}ms "
+              f"{result['ping_pong_messages_per_s']:>12.0f} {(f'{throughput:.0f}' if throughput else '-'):>13}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,52 +1,25 @@
-import time # To add slight delays for readability if needed, and for unique filenames if agents run too fast.
-import subprocess
+import os
 import sys
-import random
+from typing import TYPE_CHECKING
 
-# --- ReportLab Imports with Installation Attempt ---
-REPORTLAB_AVAILABLE = False
-try:
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib.units import inch
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    print("ReportLab not found. Attempting to install...")
-    try:
-        # Using sys.executable to ensure using the correct pip
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "reportlab"])
-        print("ReportLab installation attempted. Re-importing...")
-        # Attempt to import again after installation
-        # Forcing a re-check or re-import can be tricky.
-        # Python's import system caches, and sys.path might not be updated immediately
-        # for the current running process. This re-import might still fail here.
-        import site # Try to refresh sys.path
-        from importlib import reload
-        reload(site)
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.lib.units import inch
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT
-        REPORTLAB_AVAILABLE = True
-        print("ReportLab imported successfully after installation attempt.")
-    except Exception as e:
-        print(f"Could not install or import ReportLab after attempt: {e}. PDF generation will be skipped.")
-        # Define dummy classes if import still fails, so the rest of the script can be parsed
-        class SimpleDocTemplate:
-            def __init__(self, filename): self.filename = filename
-            def build(self, story): print(f"Dummy PDF Build for {self.filename} with story: {len(story)} elements")
-        class Paragraph:
-            def __init__(self, text, style): self.text = text; self.style = style
-        class Spacer:
-            def __init__(self, width, height): self.width = width; self.height = height
-        def getSampleStyleSheet(): return {'h1': type('Style', (), {'alignment':0, 'fontSize':18, 'spaceAfter':1}), 'h3': type('Style', (), {'fontSize':12, 'spaceBefore':1, 'spaceAfter':1}), 'Normal': type('Style', (), {'fontSize':10, 'leftIndent':0, 'spaceAfter':1, 'leading':12})}
-        inch = 72.0 # default value
-        TA_CENTER, TA_LEFT = 0, 2 # dummy alignment values
-        print("Defined dummy ReportLab components to allow script to proceed without PDF functionality.")
-
-from poet_agents.poetry_agent import PoetryAgent
+from poet_agents.telemetry import ERROR, INFO, WARNING, configure_logging, counters, get_logger, log_event
+from poet_agents.forms import FORM_RULES
+from poet_agents.message_codec import CODECS, DEFAULT_CODEC
+from poet_agents.result_cache import get_result_cache
+from poet_agents.scheduler import ROUND_ROBIN, DialogueConfig, TurnScheduler
 from poet_agents.style_guide import frederick_turner_style
+from poet_agents.tracing import tracer
+from poet_agents.transcript import JsonlTranscriptSink, TextTranscriptSink, write_pdf
+from poet_agents.transport import FileTransport
+
+if TYPE_CHECKING:
+    import argparse
+
+logger = get_logger("main_workflow")
+
+TRANSCRIPT_FILENAME = "poetic_exchange.jsonl" # Written turn by turn while the dialogue runs
+PDF_FILENAME = "poetic_exchange.pdf"
+RECEIVE_TIMEOUT = 5.0 # Seconds an agent waits for its partner's message before giving up
 
 def print_formatted_poem(agent_name: str, poem_text: str, title: str = "Generated Poem"):
     """Helper function to print poems with a standard format."""
@@ -56,266 +29,117 @@ def print_formatted_poem(agent_name: str, poem_text: str, title: str = "Generate
         print(f"  {line}")
     print("-----------------------------------")
 
-# This list is used by run_workflow, so it should be at module level or passed in.
-# For now, keeping it at module level as it was.
-ALPHA_INITIAL_PROMPTS_LIST = [
-    "themes of cosmic wonder and stellar destiny",
-    "the silent wisdom of ancient mountains and hidden valleys",
-    "a quest for the ephemeral city of echoes and lost dreams",
-    "the rhythmic dance of ocean tides under a cryptic moon",
-    "secrets whispered by the winds on a desolate plain"
-]
-
 def create_conversation_pdf(title_prompt: str, conversation_data: list, filename: str):
-    if not REPORTLAB_AVAILABLE:
-        print("ReportLab is not available or failed to import. Skipping PDF generation.")
-        return
-
-    print(f"\nGenerating PDF: {filename}...")
-    doc = SimpleDocTemplate(filename)
-    styles = getSampleStyleSheet()
-
-    story = []
-
-    # Title Style
-    title_style = styles['h1']
-    title_style.alignment = TA_CENTER
-    title_style.fontSize = 18
-    title_style.spaceAfter = 0.5 * inch
-
-    # Agent Name Style
-    agent_name_style = styles['h3']
-    agent_name_style.fontSize = 12
-    agent_name_style.spaceBefore = 0.2 * inch
-    agent_name_style.spaceAfter = 0.1 * inch
-
-    # Poem Style
-    poem_style = styles['Normal']
-    poem_style.fontSize = 10
-    poem_style.leftIndent = 0.2 * inch # Indent poem lines
-    poem_style.spaceAfter = 0.1 * inch
-    poem_style.leading = 12 # Line spacing for poems
-
-    # Add Title
-    story.append(Paragraph(title_prompt.title(), title_style)) # .title() for title case
+    # PDF is a post-processing step over the finished conversation; see poet_agents/transcript.py.
+    write_pdf(title_prompt, conversation_data, filename)
 
-    # Add Conversation
-    for entry in conversation_data:
-        agent_name = entry['agent'].upper()
-        poem_text = entry['poem'].replace('\n', '<br/>\n') # Preserve line breaks in PDF
+def run_workflow(config: DialogueConfig = None, transcript_path: str = TRANSCRIPT_FILENAME,
+                 pdf_path: str = PDF_FILENAME, echo: bool = True, store_path: str = None) -> list:
+    """Runs one dialogue as described by `config` (default: Alpha and Beta, two Haiku rounds) and returns its log.
 
-        story.append(Paragraph(f"{agent_name}:", agent_name_style))
-        story.append(Paragraph(poem_text, poem_style))
-        story.append(Spacer(1, 0.1 * inch)) # Small spacer after each poem block
-
-    try:
-        doc.build(story)
-        print(f"PDF '{filename}' generated successfully.")
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
-
-def run_workflow():
+    With `store_path`, every turn is also committed to that SQLite conversation store as it is written.
+    """
+    config = config or DialogueConfig()
     print("Initializing Agents...")
-    agent_alpha = PoetryAgent(agent_name="alpha")
-    agent_beta = PoetryAgent(agent_name="beta")
-    conversation_log = []
-    print(f"Agent Alpha: {agent_alpha.agent_name}")
-    print(f"Agent Beta: {agent_beta.agent_name}")
-
-    print("\n--- Session Configuration ---")
-
-    FORM_RULES = {
-        "haiku": {"name": "Haiku (3 lines, 5-7-5 syllables)", "line_count": 3, "syllables": [5, 7, 5], "rhyme_scheme": None, "meter_description": "Syllabic 5-7-5"},
-        "limerick": {"name": "Limerick (5 lines, AABBA rhyme)", "line_count": 5, "syllables": [8,8,5,5,8], "rhyme_scheme": "AABBA", "meter_description": "Anapestic (meter/syllables TBD)"}
-    }
-    # POSSIBLE_FORM_NAMES is not strictly needed if validating against FORM_RULES.keys() directly
-
-    # Temporarily hardcode for this test run
-    form_input = "haiku"
-    dialogue_rounds = 2
-    # print(f"DEBUG: Hardcoded form_input = '{form_input}', dialogue_rounds = {dialogue_rounds}") # Keep this commented
-    form_input = input(f"Enter the Poetic Form for this session (e.g., {', '.join(FORM_RULES.keys())}): ").strip().lower()
-
-    dialogue_length_input = input("Enter Dialogue Length (number of poems per agent, e.g., 1 or 2): ").strip()
-    try:
-        dialogue_rounds = int(dialogue_length_input)
-        if dialogue_rounds <= 0:
-            print("Dialogue length must be positive. Defaulting to 1 round.")
-            dialogue_rounds = 1
-    except ValueError:
-        print("Invalid dialogue length. Defaulting to 1 round.")
-        dialogue_rounds = 1
-
-    if form_input in FORM_RULES:
-        current_session_rules = FORM_RULES[form_input]
-    else:
-        print(f"Form '{form_input}' not recognized or not yet fully supported. Defaulting to Haiku for this session.")
-        current_session_rules = FORM_RULES["haiku"] # Default to Haiku
-
-    print(f"Session Poetic Form: {current_session_rules['name']}")
-    print(f"Session Dialogue Rounds per agent: {dialogue_rounds}")
+    print(f"Agents: {', '.join(config.agents)}")
+    print(f"Turn order per round: {' -> '.join(config.order)}")
+    print(f"Session Poetic Form: {config.rules['name']}")
+    print(f"Session Rounds: {config.rounds} ({len(config.turn_order())} poems)")
     print("---------------------------")
-    # This current_session_rules dictionary will be passed to generate_poetry
 
     # Clean up any previous message files to ensure a clean run
-    # This is important because agent names are fixed in this script
-    try:
-        import os
-        if os.path.exists(f"message_to_{agent_alpha.agent_name}.json"):
-            os.remove(f"message_to_{agent_alpha.agent_name}.json")
-            print(f"Cleaned up old message file for {agent_alpha.agent_name}")
-        if os.path.exists(f"message_to_{agent_beta.agent_name}.json"):
-            os.remove(f"message_to_{agent_beta.agent_name}.json")
-            print(f"Cleaned up old message file for {agent_beta.agent_name}")
-    except Exception as e:
-        print(f"Error during cleanup: {e}")
+    # This is important because agent names are fixed between runs
+    file_transport = config.transport if isinstance(config.transport, FileTransport) else None
+    if config.transport is None or file_transport is not None:
+        for agent_name in config.agents:
+            stale_file = (file_transport or FileTransport(config.message_dir)).path_for(agent_name)
+            try:
+                if os.path.exists(stale_file):
+                    os.remove(stale_file)
+                    log_event(logger, INFO, "cleaned up old message file", agent=agent_name)
+            except OSError as e:
+                log_event(logger, ERROR, "cleanup failed", file=stale_file, error=e)
+
+    sinks = []
+    if transcript_path:
+        sinks.append(JsonlTranscriptSink(transcript_path, mode="w"))
+    if store_path:
+        from poet_agents.conversation_store import ConversationStoreSink # sqlite3 is only loaded when archiving
+        sinks.append(ConversationStoreSink(store_path))
+    if echo:
+        sinks.append(TextTranscriptSink(sys.stdout))
 
     print("\n--- [BEGIN WORKFLOW] ---")
-
-    # 1. Agent Alpha's First Turn
-    print("\n--- Agent Alpha's First Turn ---")
-    alpha_initial_prompt_text = random.choice(ALPHA_INITIAL_PROMPTS_LIST) # Select random initial prompt
-    # alpha_initial_prompt_text = "themes of cosmic wonder and stellar destiny" # Ensure this is commented out or deleted
-    print(f"Alpha's initial prompt for first poem: '{alpha_initial_prompt_text}'")
-
-    # Alpha's first poem has no prior reference.
-    alpha_poem_1 = agent_alpha.generate_poetry(
-        prompt_data_or_text={'prompt': alpha_initial_prompt_text, 'reference': None}, # Changed keyword
-        session_form_rules=current_session_rules
-    )
-    conversation_log.append({'agent': agent_alpha.agent_name, 'poem': alpha_poem_1})
-    print_formatted_poem(agent_alpha.agent_name, alpha_poem_1, "First Poem (to Beta)")
-
-    print(f"\nAlpha ({agent_alpha.agent_name}) sending its first poem to Beta ({agent_beta.agent_name})...")
-    agent_alpha.send_message(recipient_id=agent_beta.agent_name, message_type="initial_poem", payload=alpha_poem_1)
-
-    # Adding a small delay to simulate message transfer and allow file system to catch up if necessary
-    time.sleep(0.1)
-
-    # 2. Agent Beta's Turn
-    print("\n--- Agent Beta's Turn ---")
-    print(f"Beta ({agent_beta.agent_name}) attempting to receive message...")
-    beta_received_message = agent_beta.receive_message()
-
-    if beta_received_message:
-        print("\nBeta received a message:")
-        print("--------------------------")
-        print(f"From: {beta_received_message['sender_id']}")
-        print(f"Type: {beta_received_message['message_type']}")
-        print("Payload (Poem from Alpha):")
-        print(beta_received_message['payload'])
-        print("--------------------------")
-
-        if beta_received_message['message_type'] == "initial_poem":
-            print(f"\nBeta ({agent_beta.agent_name}) interpreting Alpha's poem to derive a new prompt...")
-            # interpret_poetry now directly returns a creative prompt.
-            # The method itself prints the derived theme, reference, and the new prompt.
-            interpretation_data_for_beta = agent_beta.interpret_poetry(beta_received_message['payload'])
-            # Example of what interpret_poetry prints: "[beta] Interpreted keywords: 'kw1', 'kw2'. Ref: 'ref phrase'. New prompt: 'new creative prompt'"
-
-            print(f"\nBeta ({agent_beta.agent_name}) generating its first response poem based on interpretation (Prompt: '{interpretation_data_for_beta['prompt']}', Ref: '{interpretation_data_for_beta['reference']}')...")
-            beta_response_poem_1 = agent_beta.generate_poetry(
-                prompt_data_or_text=interpretation_data_for_beta, # Changed keyword
-                session_form_rules=current_session_rules
-            )
-            conversation_log.append({'agent': agent_beta.agent_name, 'poem': beta_response_poem_1})
-            print_formatted_poem(agent_beta.agent_name, beta_response_poem_1, "First Response Poem (to Alpha)")
-
-            print(f"\nBeta ({agent_beta.agent_name}) sending its first response poem to Alpha ({agent_alpha.agent_name})...")
-            agent_beta.send_message(recipient_id=agent_alpha.agent_name, message_type="response_poem", payload=beta_response_poem_1)
-        else:
-            print(f"Beta received unexpected message type: {beta_received_message['message_type']}")
-    else:
-        print("Beta received no message.")
-
-    # Adding a small delay
-    time.sleep(0.1)
-
-    # 3. Agent Alpha's Second Turn
-    print("\n--- Agent Alpha's Second Turn ---")
-    print(f"Alpha ({agent_alpha.agent_name}) attempting to receive message...")
-    alpha_received_message = agent_alpha.receive_message()
-
-    if alpha_received_message:
-        print("\nAlpha received a message:")
-        print("---------------------------")
-        print(f"From: {alpha_received_message['sender_id']}")
-        print(f"Type: {alpha_received_message['message_type']}")
-        print("Payload (Poem from Beta):")
-        print(alpha_received_message['payload'])
-        print("---------------------------")
-
-        if alpha_received_message['message_type'] == "response_poem":
-            print(f"\nAlpha ({agent_alpha.agent_name}) interpreting Beta's response poem to derive a new prompt...")
-            # interpret_poetry now directly returns a creative prompt.
-            # The method itself prints the derived theme, reference, and the new prompt.
-            interpretation_data_for_alpha = agent_alpha.interpret_poetry(alpha_received_message['payload'])
-
-            print(f"\nAlpha ({agent_alpha.agent_name}) generating its second poem based on interpretation (Prompt: '{interpretation_data_for_alpha['prompt']}', Ref: '{interpretation_data_for_alpha['reference']}')...")
-            alpha_poem_2 = agent_alpha.generate_poetry(
-                prompt_data_or_text=interpretation_data_for_alpha, # Changed keyword
-                session_form_rules=current_session_rules
-            )
-            conversation_log.append({'agent': agent_alpha.agent_name, 'poem': alpha_poem_2})
-            print_formatted_poem(agent_alpha.agent_name, alpha_poem_2, "Second Poem (to Beta)")
-
-            print(f"\nAlpha ({agent_alpha.agent_name}) sending its second poem to Beta ({agent_beta.agent_name})...")
-            agent_alpha.send_message(recipient_id=agent_beta.agent_name, message_type="second_poem", payload=alpha_poem_2)
-
-            # Adding a small delay
-            time.sleep(0.1)
-
-            # 4. Agent Beta's Second Response Turn
-            print("\n--- Agent Beta's Second Response Turn ---")
-            print(f"Beta ({agent_beta.agent_name}) attempting to receive Alpha's second poem...")
-            beta_received_second_message = agent_beta.receive_message()
-
-            if beta_received_second_message:
-                print("\nBeta received Alpha's second poem:")
-                print("------------------------------------")
-                print(f"From: {beta_received_second_message['sender_id']}")
-                print(f"Type: {beta_received_second_message['message_type']}")
-                print("Payload (Second Poem from Alpha):")
-                print(beta_received_second_message['payload'])
-                print("------------------------------------")
-
-                if beta_received_second_message['message_type'] == "second_poem":
-                    print(f"\nBeta ({agent_beta.agent_name}) interpreting Alpha's second poem to derive a new prompt...")
-                    interpretation_data_for_beta_2 = agent_beta.interpret_poetry(beta_received_second_message['payload'])
-
-                    print(f"\nBeta ({agent_beta.agent_name}) generating its second poem based on interpretation (Prompt: '{interpretation_data_for_beta_2['prompt']}', Ref: '{interpretation_data_for_beta_2['reference']}')...")
-                    beta_poem_2 = agent_beta.generate_poetry(
-                        prompt_data_or_text=interpretation_data_for_beta_2, # Changed keyword
-                        session_form_rules=current_session_rules
-                    )
-                    conversation_log.append({'agent': agent_beta.agent_name, 'poem': beta_poem_2})
-                    print_formatted_poem(agent_beta.agent_name, beta_poem_2, "Second Response Poem (Final)")
-                    # Workflow ends with Beta's second poem generation for now.
-                else:
-                    print(f"Beta received unexpected message type: {beta_received_second_message['message_type']}")
-            else:
-                print(f"Beta ({agent_beta.agent_name}) received no second message from Alpha.")
-        else:
-            print(f"Alpha received unexpected message type: {alpha_received_message['message_type']}")
-    else:
-        print(f"Alpha ({agent_alpha.agent_name}) received no response message from Beta.")
-
+    scheduler = TurnScheduler(config, sinks)
+    try:
+        conversation_log = scheduler.run()
+    finally:
+        for sink in sinks:
+            sink.close()
     print("\n--- [END WORKFLOW] ---")
+    if transcript_path:
+        log_event(logger, INFO, "transcript written", file=transcript_path, turns=len(conversation_log))
+    if store_path:
+        log_event(logger, INFO, "conversation stored", file=store_path, turns=len(conversation_log))
 
     # Generate the PDF with the conversation
-    # Note: 'alpha_initial_prompt' was renamed to 'alpha_initial_prompt_text' for clarity,
-    # as it's just the text string used for the PDF title and Alpha's first actual prompt.
-    if conversation_log and 'alpha_initial_prompt_text' in locals() and alpha_initial_prompt_text:
-        output_pdf_filename = "poetic_exchange.pdf"
-        create_conversation_pdf(
-            title_prompt=alpha_initial_prompt_text,
-            conversation_data=conversation_log,
-            filename=output_pdf_filename
-        )
-    else:
-        print("\nSkipping PDF generation as conversation data or initial prompt was missing.")
+    if pdf_path and conversation_log:
+        create_conversation_pdf(title_prompt=scheduler.title_prompt, conversation_data=conversation_log, filename=pdf_path)
 
+    print("\n" + counters.summary("Session counters"))
     print("\nEnd of poetic exchange simulation.")
+    return conversation_log
+
+def build_arg_parser() -> "argparse.ArgumentParser":
+    import argparse # Only the command line needs it; importing main_workflow for run_workflow should stay cheap
+    parser = argparse.ArgumentParser(description="Run an unattended poetic dialogue between agents.")
+    parser.add_argument("--form", default="haiku", choices=sorted(FORM_RULES), help="Poetic form for every poem.")
+    parser.add_argument("--rounds", type=int, default=2, help="How many times the turn order is played.")
+    parser.add_argument("--agents", default="alpha,beta", help="Comma-separated agent names ('alpha' writes as Alpha, others as Beta).")
+    parser.add_argument("--order", default=ROUND_ROBIN,
+                        help="Turn order within a round: 'round_robin' or comma-separated agent names (e.g. alpha,beta,beta).")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible dialogue.")
+    parser.add_argument("--title", default=None, help="Opening prompt and title (default: drawn from the built-in list).")
+    parser.add_argument("--receive-timeout", type=float, default=RECEIVE_TIMEOUT, help="Seconds to wait for each message.")
+    parser.add_argument("--message-dir", default=None, help="Directory for message files (default: working directory).")
+    parser.add_argument("--message-codec", default=DEFAULT_CODEC, choices=sorted(CODECS),
+                        help="Encoding of the message files: compact JSON or the length-prefixed binary format.")
+    parser.add_argument("--transcript", default=TRANSCRIPT_FILENAME, help="JSONL transcript written turn by turn ('' to skip).")
+    parser.add_argument("--store", default=None, help="Also archive the dialogue in this SQLite conversation store.")
+    parser.add_argument("--pdf", default=PDF_FILENAME, help="PDF rendered at the end ('' to skip).")
+    parser.add_argument("--quiet", action="store_true", help="Do not echo poems to the console.")
+    parser.add_argument("--result-cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="Memoize generation and interpretation on disk (default directory if DIR is omitted).")
+    parser.add_argument("--trace", default=None, help="Record timing spans and write them as Chrome trace JSON to this file.")
+    parser.add_argument("--log-level", default=None, help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    return parser
+
+def config_from_args(args: "argparse.Namespace") -> DialogueConfig:
+    agents = [name.strip() for name in args.agents.split(",") if name.strip()]
+    order = ROUND_ROBIN if args.order == ROUND_ROBIN else [name.strip() for name in args.order.split(",") if name.strip()]
+    return DialogueConfig(form=args.form, rounds=args.rounds, agents=agents, order=order, seed=args.seed,
+                          title_prompt=args.title, receive_timeout=args.receive_timeout, message_dir=args.message_dir,
+                          transport=FileTransport(args.message_dir, codec=args.message_codec) if args.message_codec != DEFAULT_CODEC else None,
+                          result_cache=get_result_cache(args.result_cache or None) if args.result_cache is not None else None)
+
+def main(argv=None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    try:
+        config = config_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.result_cache is not None and args.seed is None:
+        log_event(logger, WARNING, "result cache without --seed: poems are generated uncached, only interpretations are reused")
+    if args.trace:
+        tracer.start()
+    run_workflow(config, transcript_path=args.transcript, pdf_path=args.pdf, echo=not args.quiet, store_path=args.store)
+    if args.trace:
+        tracer.export_chrome(args.trace)
+        print("\n" + tracer.summary())
+        log_event(logger, INFO, "trace written", file=args.trace, spans=len(tracer.events))
+    return 0
 
 if __name__ == "__main__":
-    run_workflow()
+    raise SystemExit(main())
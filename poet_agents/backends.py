@@ -0,0 +1,66 @@
+# Optional Backends
+#
+# Third-party libraries the simulation can use but does not require:
+#   - "pronouncing": CMU Pronouncing Dictionary lookups (syllables, stress, rhymes).
+#     Without it, syllable counts come from the vowel-group heuristic.
+#   - "reportlab": PDF rendering of the conversation transcript.
+#     Without it, PDF generation is skipped.
+#   - "numpy": vectorized syllable estimation for bulk scoring of word lists.
+#     Without it, the same heuristic runs as a plain Python loop.
+#
+# Nothing here is imported when `poet_agents` is imported. A backend is imported
+# the first time some code actually asks for it, and the outcome (module or
+# None) is remembered for the life of the process. Missing backends are never
+# installed on the fly; a single notice explains the degraded mode instead.
+
+import importlib
+import importlib.util
+import threading
+from typing import Optional
+
+from .telemetry import WARNING, get_logger, log_event
+
+logger = get_logger(__name__)
+
+OPTIONAL_BACKENDS = {
+    "pronouncing": {
+        "module": "pronouncing",
+        "degraded_mode": "syllable counts will use the vowel-group heuristic and rhyme lookups are disabled",
+    },
+    "reportlab": {
+        "module": "reportlab",
+        "degraded_mode": "PDF transcripts will be skipped",
+    },
+    "numpy": {
+        "module": "numpy",
+        "degraded_mode": "bulk syllable estimation will use the scalar heuristic",
+    },
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def backend_available(name: str) -> bool:
+    """Cheap check (no import) for whether an optional backend is installed."""
+    if name in _loaded:
+        return _loaded[name] is not None
+    return importlib.util.find_spec(OPTIONAL_BACKENDS[name]["module"]) is not None
+
+
+def load_backend(name: str) -> Optional[object]:
+    """Imports an optional backend on first use. Returns the module, or None if it is not installed."""
+    if name in _loaded:
+        return _loaded[name]
+    with _lock:
+        if name in _loaded:
+            return _loaded[name]
+        spec = OPTIONAL_BACKENDS[name]
+        try:
+            module = importlib.import_module(spec["module"])
+        except ImportError:
+            module = None
+            log_event(logger, WARNING, f"optional library not installed; {spec['degraded_mode']}",
+                      library=spec["module"], install=f"pip install {spec['module']}")
+        _loaded[name] = module
+        return module
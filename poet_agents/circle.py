@@ -0,0 +1,252 @@
+# Poetry Circles
+#
+# One poem, many listeners: a host writes a poem from a prompt and broadcasts
+# it to every member of the circle, and each member interprets it and writes
+# its answer at the same time as the others. `PoetryCircle.broadcast` waits
+# until all answers are in or `deadline` seconds have passed, whichever comes
+# first, and keeps the answers that arrived in time, so a round costs about
+# as much as its slowest member (or the deadline), not the sum of all of them.
+#
+# Members answer on a pool (`executor`):
+#
+#   process  each answer is written in a worker process by a fresh agent with
+#            the member's name, a seed derived from (member seed, round) and
+#            the poems the member has heard and written so far, replayed with
+#            `resume_conversation`. Generation is CPU-bound pure Python, so
+#            this is the mode that runs members in parallel. Answers that miss
+#            the deadline are dropped and do not enter the member's history,
+#            so a seeded circle gives the same poems on every run as long as
+#            every member answers in time. The workers are started (and load
+#            the indexes) when the circle is created, not in its first round.
+#   thread   every member is a long-lived `PoetryAgent` in this process and
+#            answers on a thread. Threads share the interpreter lock, so this
+#            only overlaps members that wait (I/O, remote backends); for CPU-
+#            bound members it costs about the sum of their work.
+#
+# With either pool, a late answer that has already started keeps running (and
+# holds its worker); the member sits out the broadcasts until it finishes.
+# Late answers still waiting for a worker are cancelled. In thread mode,
+# `start_conversation` waits for late answers before resetting the agents.
+#
+# A broadcast is one `Message` per member (recipient_id = member), handed to
+# the pool instead of a transport; each answer is a `PoemPayload` message
+# back to the host. Answers in time, late answers and members that sat out
+# are counted (circle_answers, circle_answers_late, circle_members_busy).
+#
+# Command line:
+#   python -m poet_agents.circle --members 24 --form haiku --prompts 3 --deadline 0.5 [--executor thread] [--transcript circle.jsonl]
+
+import argparse
+import concurrent.futures
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence
+
+from .forms import DEFAULT_FORM, FORM_RULES
+from .lexicon import OPENING_PROMPTS
+from .message_structure import Message, PoemPayload
+from .poetry_agent import PoetryAgent
+from .rhyme_index import get_rhyme_index
+from .syllable_index import get_syllable_index
+from .telemetry import ERROR, WARNING, configure_logging, counters, get_logger, log_event
+from .tracing import span
+from .transcript import open_transcript
+
+logger = get_logger(__name__)
+
+PROCESS, THREAD = "process", "thread"
+EXECUTORS = (PROCESS, THREAD)
+DEFAULT_DEADLINE = 5.0
+HOST = "host"
+
+
+def round_seed(member_seed: int, round_number: int) -> int:
+    """Seed of a member's answer in a given round (process executor)."""
+    return (member_seed * 1_000_003 + round_number) & 0xFFFFFFFF
+
+
+def _answer(agent: PoetryAgent, envelope: Message, rules: dict) -> Dict:
+    started = time.perf_counter()
+    interpretation = agent.interpret_poetry(envelope.text)
+    poem = agent.generate_poetry(interpretation, rules)
+    reply = Message(agent.agent_name, envelope.sender_id, "response_poem",
+                    PoemPayload(poem, interpretation['prompt'], interpretation['reference']))
+    return {'agent': agent.agent_name, 'poem': poem, 'prompt': interpretation['prompt'],
+            'message': reply.to_dict(), 'seconds': time.perf_counter() - started}
+
+
+def _warm_worker():
+    # Load the shared indexes once per worker process instead of inside the first answer.
+    get_syllable_index().syllables("warm")
+    get_rhyme_index().available
+
+
+def _answer_in_worker(task: tuple) -> Dict:
+    name, seed, history, envelope, rules = task
+    agent = PoetryAgent(agent_name=name, seed=seed)
+    agent.resume_conversation(history)
+    return _answer(agent, Message.from_dict(envelope), rules)
+
+
+class PoetryCircle:
+    """A host and a group of members that all answer each broadcast poem concurrently. Use as a context manager."""
+
+    def __init__(self, members: Sequence[str], form: str = DEFAULT_FORM, executor: str = PROCESS,
+                 workers: Optional[int] = None, deadline: Optional[float] = DEFAULT_DEADLINE, seed: Optional[int] = None,
+                 host: str = HOST):
+        if form not in FORM_RULES:
+            raise ValueError(f"unknown form {form!r}; choose from {', '.join(sorted(FORM_RULES))}")
+        if executor not in EXECUTORS:
+            raise ValueError(f"unknown executor {executor!r}; choose from {', '.join(EXECUTORS)}")
+        self.members = list(members)
+        if not self.members or len(set(self.members)) != len(self.members) or host in self.members:
+            raise ValueError("members must be a non-empty list of distinct names, not including the host")
+        self.form = form
+        self.rules = FORM_RULES[form]
+        self.executor = executor
+        self.deadline = deadline
+        # Same derivation as the scheduler: one generator picks every agent's seed in order, host first.
+        rng = random.Random(seed)
+        self.host = PoetryAgent(agent_name=host, seed=rng.getrandbits(32) if seed is not None else None)
+        self.seeds = {name: rng.getrandbits(32) for name in self.members}
+        self.agents: Dict[str, PoetryAgent] = {}
+        if executor == THREAD:
+            self.agents = {name: PoetryAgent(agent_name=name, seed=self.seeds[name] if seed is not None else None)
+                           for name in self.members}
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers or len(self.members),
+                                                               thread_name_prefix="circle")
+        else:
+            workers = workers or os.cpu_count() or 1
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+            # Start every worker now: spawning and warming them would otherwise make the first rounds miss the deadline.
+            concurrent.futures.wait([self._pool.submit(os.getpid) for _ in range(workers)])
+        self.history: Dict[str, List[str]] = {name: [] for name in self.members} # Poems each member heard and wrote
+        self.round = 0
+        self._busy: Dict[str, concurrent.futures.Future] = {} # Members still writing a late answer
+
+    def start_conversation(self):
+        """Forgets the poems of the previous prompt, for every member and the host."""
+        if self.agents and self._busy:
+            # A member still writing a late answer is using its agent: let it finish before resetting it.
+            concurrent.futures.wait(self._busy.values())
+        self.host.start_conversation()
+        for agent in self.agents.values():
+            agent.start_conversation()
+        for heard in self.history.values():
+            heard.clear()
+
+    def open(self, prompt: str) -> str:
+        """The host's poem for `prompt`, to broadcast."""
+        return self.host.generate_poetry({'prompt': prompt, 'reference': None}, self.rules)
+
+    def broadcast(self, poem: str, deadline: Optional[float] = None) -> Dict:
+        """Sends `poem` to every member and gathers the answers written within the deadline (the circle's by default).
+
+        Returns {"answers": [...], "late": [...], "busy": [...], "seconds": ...}: answers in member order (agent, poem,
+        prompt, message, seconds), the members that missed the deadline, and those that sat out still writing.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        self.round += 1
+        started = time.perf_counter()
+        with span("circle_round", round=self.round, members=len(self.members)):
+            busy = [name for name, future in self._busy.items() if not future.done()]
+            self._busy = {name: self._busy[name] for name in busy}
+            futures = {}
+            for name in self.members:
+                if name in self._busy:
+                    continue
+                envelope = Message(self.host.agent_name, name, "broadcast_poem", poem)
+                if self.executor == THREAD:
+                    futures[name] = self._pool.submit(_answer, self.agents[name], envelope, self.rules)
+                else:
+                    task = (name, round_seed(self.seeds[name], self.round), list(self.history[name]), envelope.to_dict(), self.rules)
+                    futures[name] = self._pool.submit(_answer_in_worker, task)
+            concurrent.futures.wait(futures.values(), timeout=deadline)
+
+            answers, late = [], []
+            for name, future in futures.items():
+                if future.done() and not future.cancelled():
+                    try:
+                        answer = future.result()
+                    except Exception as e: # One failing member must not cost the circle its other answers
+                        log_event(logger, ERROR, "circle member failed", agent=name, round=self.round, error=e)
+                        continue
+                    answers.append(answer)
+                    self.history[name] += (poem, answer['poem'])
+                else:
+                    late.append(name)
+                    if not future.cancel():
+                        self._busy[name] = future # Still running (and holding a worker): no new answer until it finishes
+        counters.incr("circle_answers", len(answers))
+        counters.incr("circle_answers_late", len(late))
+        counters.incr("circle_members_busy", len(busy))
+        if late or busy:
+            log_event(logger, WARNING, "circle answers missing", round=self.round, late=",".join(late), busy=",".join(busy))
+        return {"answers": answers, "late": late, "busy": busy, "seconds": time.perf_counter() - started}
+
+    def close(self):
+        """Stops the pool without waiting for late answers."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "PoetryCircle":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_circle(prompts: Sequence[str], members: Sequence[str], form: str = DEFAULT_FORM, executor: str = PROCESS,
+               workers: Optional[int] = None, deadline: Optional[float] = DEFAULT_DEADLINE, seed: Optional[int] = None,
+               transcript_path: Optional[str] = None) -> List[Dict]:
+    """Broadcasts one host poem per prompt to the circle; returns each prompt's round (with "prompt" and "poem" added)."""
+    rounds = []
+    transcript = open_transcript(transcript_path) if transcript_path else None
+    try:
+        with PoetryCircle(members, form, executor, workers, deadline, seed) as circle:
+            for prompt in prompts:
+                circle.start_conversation()
+                poem = circle.open(prompt)
+                result = circle.broadcast(poem)
+                result.update(prompt=prompt, poem=poem)
+                rounds.append(result)
+                if transcript:
+                    transcript.begin(prompt, form=form, agents=",".join(members), executor=executor)
+                    transcript.write_turn({'agent': circle.host.agent_name, 'poem': poem, 'prompt': prompt})
+                    for answer in result["answers"]:
+                        transcript.write_turn({key: answer[key] for key in ('agent', 'poem', 'prompt')})
+                    transcript.end()
+    finally:
+        if transcript:
+            transcript.close()
+    return rounds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Broadcast poems to a circle of agents that all answer at once.")
+    parser.add_argument("--members", type=int, default=12, help="Number of circle members.")
+    parser.add_argument("--form", default=DEFAULT_FORM, choices=sorted(FORM_RULES), help="Poetic form of every poem.")
+    parser.add_argument("--prompts", type=int, default=1, help="Number of prompts, each broadcast to the whole circle.")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds to wait for answers to each broadcast.")
+    parser.add_argument("--executor", default=PROCESS, choices=EXECUTORS, help="Run members on processes or threads.")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: CPU count for processes, one thread per member).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for prompts and agents.")
+    parser.add_argument("--transcript", default=None, help="Stream each prompt's poems to this .jsonl, .html, .txt or .sqlite file.")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    rng = random.Random(args.seed)
+    prompts = [rng.choice(OPENING_PROMPTS) for _ in range(max(1, args.prompts))]
+    members = [f"poet{number:02d}" for number in range(1, max(1, args.members) + 1)]
+    for result in run_circle(prompts, members, args.form, args.executor, args.workers, args.deadline, args.seed, args.transcript):
+        print(f"--- {result['prompt']} ---\n[{HOST}]\n{result['poem']}\n")
+        for answer in result["answers"]:
+            print(f"[{answer['agent']}] ({answer['seconds'] * 1000:.1f} ms)\n{answer['poem']}\n")
+        print(f"{len(result['answers'])}/{len(members)} answers in {result['seconds']:.2f}s"
+              + (f"; late: {', '.join(result['late'])}" if result["late"] else "") + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,393 @@
+# Conversation Store
+#
+# A persistent archive of dialogues in one local SQLite file (stdlib sqlite3,
+# no server). Where a transcript is a log to be read front to back, the store
+# is indexed, so one agent's poems, one form's sessions or every poem about a
+# keyword can be pulled out of millions without reading the rest.
+#
+#   sessions  one row per dialogue: title, form, agents, the caller's
+#             session_id and any other metadata (as JSON)
+#   turns     one row per poem: session, turn number, agent, prompt, poem
+#   keywords  (keyword, session, turn) for every distinct significant word of
+#             a poem (the words the interpreter ranks: lower-cased, not a
+#             stopword, longer than two letters)
+#
+# Indexes cover sessions by form and session_id, turns by (session, turn) and
+# by (agent, session, turn), and keywords by keyword, so every filter below is
+# an index range scan that already comes out in conversation order.
+#
+# Writes are batched: `add_turns` inserts any number of turns and their
+# keywords with `executemany` in one transaction, and the file runs in WAL
+# mode, so readers never block the writer. `ConversationStoreSink` adapts the
+# store to the transcript-sink interface, so the scheduler's writer thread and
+# the session runner feed it like any other transcript (and `open_transcript`
+# picks it for .sqlite / .db paths).
+#
+# Queries stream: `iter_turns`, `iter_poems` and `iter_sessions` are
+# generators over a cursor, reading STORE_FETCH_ROWS rows at a time on their
+# own connection, so memory stays flat however large the archive and a long
+# analytics scan does not hold up a dialogue that is still writing. Feed
+# `iter_poems(session=...)` to `PoetryAgent.resume_conversation` to give an
+# interpreter the themes of a stored dialogue.
+#
+# Command line:
+#   python -m poet_agents.conversation_store archive.sqlite --import corpus.jsonl
+#   python -m poet_agents.conversation_store archive.sqlite --agent beta --keyword river --limit 5
+#   python -m poet_agents.conversation_store archive.sqlite --top-keywords 20 --form sonnet
+
+import argparse
+import contextlib
+import json
+import sqlite3
+import string
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .lexicon import STOPWORDS
+from .telemetry import INFO, configure_logging, counters, get_logger, log_event
+from .transcript import TranscriptSink, read_jsonl_transcript
+
+logger = get_logger(__name__)
+
+STORE_SCHEMA_VERSION = 1
+STORE_FETCH_ROWS = 1000 # Rows a streaming query reads from SQLite at a time
+IMPORT_BATCH_TURNS = 5000 # Turns per transaction when importing transcripts
+BUSY_TIMEOUT = 30.0 # Seconds to wait for another process's write lock
+STORE_CACHE_KIB = 32 << 10 # Page cache per connection; large imports touch many index pages
+
+_KEYWORD_STRIP_TABLE = str.maketrans('', '', string.punctuation.replace("'", ""))
+_TURN_FIELDS = ("agent", "poem", "prompt")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT,
+    title TEXT NOT NULL,
+    form TEXT,
+    agents TEXT,
+    metadata TEXT,
+    turns INTEGER NOT NULL DEFAULT 0,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    session INTEGER NOT NULL REFERENCES sessions(id),
+    turn INTEGER NOT NULL,
+    agent TEXT NOT NULL,
+    prompt TEXT,
+    poem TEXT NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (session, turn)
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    keyword TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    turn INTEGER NOT NULL,
+    PRIMARY KEY (keyword, session, turn)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_by_form ON sessions(form);
+CREATE INDEX IF NOT EXISTS sessions_by_session_id ON sessions(session_id);
+CREATE INDEX IF NOT EXISTS turns_by_agent ON turns(agent, session, turn);
+"""
+
+
+def poem_keywords(poem: str) -> List[str]:
+    """The distinct significant words of a poem, sorted."""
+    words = set(poem.lower().translate(_KEYWORD_STRIP_TABLE).split()).difference(STOPWORDS)
+    return sorted(word for word in words if len(word) > 2)
+
+
+class ConversationStore:
+    """Indexed SQLite archive of dialogues. Safe to share between threads; use ":memory:" for a throwaway store."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = self._connect()
+        with self._lock:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, STORE_SCHEMA_VERSION):
+                self._connection.close()
+                raise ValueError(f"{path} is a conversation store of schema version {version}, expected {STORE_SCHEMA_VERSION}")
+            if path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(f"PRAGMA user_version={STORE_SCHEMA_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: every write below opens and commits its own transaction explicitly.
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL") # With WAL, a power cut can lose the last commits but never corrupt the file
+        connection.execute(f"PRAGMA cache_size=-{STORE_CACHE_KIB}")
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def _insert_session(connection: sqlite3.Connection, title: str, metadata: Dict) -> int:
+        metadata = dict(metadata)
+        agents = metadata.pop("agents", None)
+        if isinstance(agents, (list, tuple)):
+            agents = ",".join(agents)
+        session_id = metadata.pop("session_id", None)
+        return connection.execute(
+            "INSERT INTO sessions (session_id, title, form, agents, metadata, started) VALUES (?, ?, ?, ?, ?, ?)",
+            (None if session_id is None else str(session_id), title, metadata.pop("form", None), agents,
+             json.dumps(metadata, ensure_ascii=False, default=str) if metadata else None, time.time())).lastrowid
+
+    @staticmethod
+    def _insert_turns(connection: sqlite3.Connection, batches: Sequence[Tuple[int, Sequence[Tuple[int, Dict]]]]) -> int:
+        turn_rows, keyword_rows, session_rows = [], [], []
+        for session, entries in batches:
+            for turn, entry in entries:
+                extra = {key: value for key, value in entry.items() if key not in _TURN_FIELDS}
+                turn_rows.append((session, turn, entry["agent"], entry.get("prompt"), entry["poem"],
+                                  json.dumps(extra, ensure_ascii=False, default=str) if extra else None))
+                keyword_rows.extend((keyword, session, turn) for keyword in poem_keywords(entry["poem"]))
+            if entries:
+                session_rows.append((max(turn for turn, _ in entries), session))
+        connection.executemany("INSERT OR REPLACE INTO turns (session, turn, agent, prompt, poem, extra) VALUES (?, ?, ?, ?, ?, ?)", turn_rows)
+        connection.executemany("INSERT OR IGNORE INTO keywords (keyword, session, turn) VALUES (?, ?, ?)", keyword_rows)
+        connection.executemany("UPDATE sessions SET turns = max(turns, ?) WHERE id = ?", session_rows)
+        counters.incr("store_turns_written", len(turn_rows))
+        return len(turn_rows)
+
+    def begin_session(self, title: str, **metadata) -> int:
+        """Records a new dialogue and returns its store id. `session_id`, `form` and `agents` are indexed columns."""
+        with self._transaction() as connection:
+            return self._insert_session(connection, title, metadata)
+
+    def add_turns(self, session: int, entries: Sequence[Tuple[int, Dict]]):
+        """Inserts (turn number, entry) pairs of one session, with their keywords, in a single transaction.
+
+        An entry needs 'agent' and 'poem'; 'prompt' is optional and any other keys are kept as JSON.
+        """
+        if entries:
+            with self._transaction() as connection:
+                self._insert_turns(connection, [(session, entries)])
+
+    def add_session(self, title: str, turns: Sequence[Dict], **metadata) -> int:
+        """Stores a finished dialogue in one transaction and returns its store id."""
+        with self._transaction() as connection:
+            session = self._insert_session(connection, title, metadata)
+            self._insert_turns(connection, [(session, list(enumerate(turns, 1)))])
+        return session
+
+    def import_jsonl(self, path: str, batch_turns: int = IMPORT_BATCH_TURNS) -> int:
+        """Copies every session of a JSONL transcript into the store, about `batch_turns` turns per transaction.
+
+        Returns the number of sessions imported.
+        """
+        sessions, pending, pending_turns = 0, [], 0
+        for transcript in read_jsonl_transcript(path):
+            turns = []
+            for number, record in enumerate(transcript["turns"], 1):
+                record.pop("session_id", None)
+                turns.append((record.pop("turn", number), record))
+            pending.append((transcript["title"], transcript["metadata"], turns))
+            pending_turns += len(turns)
+            if pending_turns >= batch_turns:
+                sessions += self._import_batch(pending)
+                pending, pending_turns = [], 0
+        return sessions + self._import_batch(pending)
+
+    def _import_batch(self, pending: List[Tuple[str, Dict, List[Tuple[int, Dict]]]]) -> int:
+        with self._transaction() as connection:
+            self._insert_turns(connection, [(self._insert_session(connection, title, metadata), turns)
+                                            for title, metadata, turns in pending])
+        return len(pending)
+
+    def _query(self, sql: str, parameters: Sequence) -> Iterator[Dict]:
+        # File stores read on a connection of their own, so a generator left open never holds the writer's lock.
+        own_connection = self.path != ":memory:"
+        connection = self._connect() if own_connection else self._connection
+        try:
+            cursor = connection.execute(sql, parameters)
+            cursor.arraysize = STORE_FETCH_ROWS
+            columns = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            if own_connection:
+                connection.close()
+
+    @staticmethod
+    def _filters(session: Optional[int], session_id, agent: Optional[str], form: Optional[str],
+                 keyword: Optional[str]) -> Tuple[str, str, List, str]:
+        joins, conditions, parameters = "", [], []
+        if keyword is not None:
+            joins = " JOIN keywords k ON k.session = t.session AND k.turn = t.turn"
+            conditions.append("k.keyword = ?")
+            parameters.append(keyword.lower())
+        for column, value in (("t.session", session), ("s.session_id", None if session_id is None else str(session_id)),
+                              ("t.agent", agent), ("s.form", form)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        # Order by the columns of the index SQLite drives the query with, so rows stream without a sort.
+        order = "t.session, t.turn" if agent is not None or keyword is None else "k.session, k.turn"
+        if form is not None and agent is None and keyword is None:
+            order = "s.id, t.turn"
+        return joins, (" WHERE " + " AND ".join(conditions)) if conditions else "", parameters, order
+
+    def iter_turns(self, session: Optional[int] = None, session_id=None, agent: Optional[str] = None,
+                   form: Optional[str] = None, keyword: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Streams the matching turns in conversation order, each with its session's title and form. Filters combine with AND."""
+        joins, where, parameters, order = self._filters(session, session_id, agent, form, keyword)
+        sql = ("SELECT t.session, s.session_id, s.title, s.form, t.turn, t.agent, t.prompt, t.poem, t.extra"
+               f" FROM turns t JOIN sessions s ON s.id = t.session{joins}{where} ORDER BY {order}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        for row in self._query(sql, parameters):
+            extra = row.pop("extra")
+            if extra:
+                row.update(json.loads(extra))
+            yield row
+
+    def iter_poems(self, **filters) -> Iterator[str]:
+        """Streams just the poem texts of `iter_turns(**filters)`."""
+        for row in self.iter_turns(**filters):
+            yield row["poem"]
+
+    def iter_sessions(self, form: Optional[str] = None, agent: Optional[str] = None) -> Iterator[Dict]:
+        """Streams session records ({'id', 'session_id', 'title', 'form', 'agents', 'turns', 'started', ...metadata}) in store order."""
+        conditions, parameters = [], []
+        if form is not None:
+            conditions.append("form = ?")
+            parameters.append(form)
+        if agent is not None:
+            conditions.append("id IN (SELECT DISTINCT session FROM turns WHERE agent = ?)")
+            parameters.append(agent)
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+        for row in self._query(f"SELECT * FROM sessions{where} ORDER BY id", parameters):
+            metadata = row.pop("metadata")
+            if metadata:
+                row.update(json.loads(metadata))
+            yield row
+
+    def session_turns(self, session: int) -> List[Dict]:
+        """One session's turns as a list of {'agent', 'poem', 'prompt', ...} entries, ready for `write_pdf`."""
+        turns = []
+        for row in self.iter_turns(session=session):
+            for key in ("session", "session_id", "title", "form", "turn"):
+                row.pop(key)
+            turns.append(row)
+        return turns
+
+    def keyword_counts(self, limit: int = 20, form: Optional[str] = None, agent: Optional[str] = None) -> List[Tuple[str, int]]:
+        """The `limit` keywords used in the most poems (optionally of one form or agent), most frequent first."""
+        joins, where, parameters = "", "", []
+        if form is not None or agent is not None:
+            joins = " JOIN turns t ON t.session = k.session AND t.turn = k.turn JOIN sessions s ON s.id = k.session"
+            _, where, parameters, _ = self._filters(None, None, agent, form, None)
+        sql = f"SELECT k.keyword, count(*) AS poems FROM keywords k{joins}{where} GROUP BY k.keyword ORDER BY poems DESC, k.keyword LIMIT ?"
+        return [(row["keyword"], row["poems"]) for row in self._query(sql, [*parameters, limit])]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = self._connection.execute(
+                "SELECT (SELECT count(*) FROM sessions), (SELECT count(*) FROM turns), (SELECT count(*) FROM keywords)").fetchone()
+        return dict(zip(("sessions", "turns", "keywords"), counts))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConversationStoreSink(TranscriptSink):
+    """Transcript sink that writes into a `ConversationStore`, committing every `batch_turns` turns and at the end of each session.
+
+    Takes a store or a path; a store opened from a path is closed with the sink.
+    """
+
+    def __init__(self, store_or_path, batch_turns: int = 1):
+        if isinstance(store_or_path, ConversationStore):
+            self.store = store_or_path
+            self._owns_store = False
+        else:
+            self.store = ConversationStore(store_or_path)
+            self._owns_store = True
+        self.path = self.store.path
+        self.batch_turns = max(1, batch_turns)
+        self.turns = 0
+        self._in_session = False
+        self.session = None # Store id of the current (or last) session
+        self._pending = []
+
+    def _write_begin(self, title: str, metadata: Dict):
+        self.session = self.store.begin_session(title, **metadata)
+
+    def _write_turn(self, entry: Dict):
+        self._pending.append((self.turns, entry))
+
+    def _write_end(self):
+        self._commit()
+
+    def _commit(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.store.add_turns(self.session, pending)
+
+    def _flush(self):
+        if len(self._pending) >= self.batch_turns:
+            self._commit()
+
+    def close(self):
+        self.end()
+        if self._owns_store:
+            self.store.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import dialogues into a conversation store and query it.")
+    parser.add_argument("store", help="SQLite conversation store (created if missing).")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="JSONL",
+                        help="Copy the sessions of a JSONL transcript into the store (repeatable).")
+    parser.add_argument("--session-id", default=None, help="Only turns of sessions with this session_id.")
+    parser.add_argument("--agent", default=None, help="Only this agent's turns.")
+    parser.add_argument("--form", default=None, help="Only sessions of this form.")
+    parser.add_argument("--keyword", default=None, help="Only poems containing this word.")
+    parser.add_argument("--limit", type=int, default=None, help="Print at most this many turns.")
+    parser.add_argument("--top-keywords", type=int, default=None, metavar="N", help="Print the N most used keywords instead of turns.")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    with ConversationStore(args.store) as store:
+        for path in args.imports:
+            log_event(logger, INFO, "imported transcript", file=path, sessions=store.import_jsonl(path))
+        if args.top_keywords:
+            for keyword, poems in store.keyword_counts(args.top_keywords, form=args.form, agent=args.agent):
+                print(f"{poems:8d}  {keyword}")
+        elif args.imports and not any((args.session_id, args.agent, args.form, args.keyword, args.limit)):
+            print(" ".join(f"{key}={value}" for key, value in store.stats().items()))
+        else:
+            for row in store.iter_turns(session_id=args.session_id, agent=args.agent, form=args.form,
+                                        keyword=args.keyword, limit=args.limit):
+                print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
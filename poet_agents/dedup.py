@@ -0,0 +1,186 @@
+# Near-Duplicate Detection
+#
+# Keeps agents from echoing a stanza back: every poem an agent hears or writes
+# is reduced to a MinHash signature and filed in LSH buckets, and a new poem
+# is checked against all of them before it is sent.
+#
+#   shingles   the poem's word 3-grams (lower-cased, punctuation stripped,
+#              line breaks ignored); a poem shorter than that is one shingle.
+#   signature  one-permutation MinHash: each shingle is hashed once (BLAKE2b,
+#              so signatures are identical in every process) and lands in one
+#              of SIGNATURE_BINS bins, keeping the minimum per bin. Empty bins
+#              borrow the next filled bin's value (rotation densification).
+#              The fraction of equal bins estimates the Jaccard similarity of
+#              two shingle sets, for the cost of one hash per shingle.
+#   buckets    LSH banding: the signature is cut into LSH_BANDS bands of
+#              SIGNATURE_BINS / LSH_BANDS values and each band is a dict key,
+#              so poems sharing any band are candidates. With 16 bands of 4, a
+#              pair at Jaccard 0.5 shares a band 64% of the time, at 0.7 98%,
+#              at 0.2 2.5%.
+#
+# A query looks up LSH_BANDS dict keys and compares the signatures of the few
+# candidates found, so its cost does not grow with the number of poems stored:
+# about 10 microseconds against 100k prior poems. Signatures are packed into
+# one array (4 bytes per bin); with its bucket entries, each stored poem costs
+# about 2 KB.
+#
+# `PoetryAgent` keeps one index per conversation (the poems it has heard and
+# written since `start_conversation`) and can share a process-wide index
+# across conversations (`get_duplicate_index()`). When a new poem's estimated
+# similarity to a poem of the conversation reaches DUPLICATE_THRESHOLD (or to
+# one in the shared index, SHARED_DUPLICATE_THRESHOLD), the agent writes it
+# again, up to MAX_GENERATION_ATTEMPTS times, and otherwise keeps the least
+# similar attempt. The shared threshold is higher because haiku from unrelated
+# dialogues already overlap: their median best match among 1800 earlier haiku
+# is about 0.4.
+
+import array
+import functools
+import hashlib
+import string
+import threading
+from typing import List, Optional, Tuple
+
+from .telemetry import counters
+
+SHINGLE_WORDS = 3
+SIGNATURE_BINS = 64 # A power of two: the low bits of a shingle hash pick its bin
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.5 # Estimated Jaccard similarity of shingle sets at which a poem counts as an echo
+MAX_GENERATION_ATTEMPTS = 3
+SIGNATURE_CACHE_SIZE = 256
+SHARED_INDEX_MAX_ENTRIES = 100_000 # About 200 MB
+SHARED_DUPLICATE_THRESHOLD = 0.8 # Across conversations only near-verbatim repeats count: short forms share a small vocabulary
+
+_BIN_BITS = SIGNATURE_BINS.bit_length() - 1
+_VALUE_MASK = 0xFFFFFFFF
+_DENSIFY_STEP = 0x9E3779B1 # Added per bin of distance, so a borrowed value differs from its source
+_STRIP_TABLE = str.maketrans('', '', string.punctuation.replace("'", ""))
+
+
+def shingles(poem: str, size: int = SHINGLE_WORDS) -> set:
+    """The poem's distinct word `size`-grams, as space-joined strings."""
+    words = poem.lower().translate(_STRIP_TABLE).split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+@functools.lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def signature(poem: str) -> Optional[array.array]:
+    """The poem's MinHash signature (SIGNATURE_BINS unsigned 32-bit values), or None for a poem without words.
+
+    Memoized, so the listener reuses the writer's signature when both agents share a process. Treat as read-only.
+    """
+    mins = [None] * SIGNATURE_BINS
+    for shingle in shingles(poem):
+        code = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        position, value = code & (SIGNATURE_BINS - 1), (code >> _BIN_BITS) & _VALUE_MASK
+        current = mins[position]
+        if current is None or value < current:
+            mins[position] = value
+    if all(value is None for value in mins):
+        return None
+    # Walk the bins right to left twice around, so every empty bin takes the nearest filled bin to its right.
+    values, borrowed, distance = list(mins), None, 0
+    for index in range(2 * SIGNATURE_BINS - 1, -1, -1):
+        value = mins[index % SIGNATURE_BINS]
+        if value is not None:
+            borrowed, distance = value, 0
+        else:
+            distance += 1
+            if index < SIGNATURE_BINS and borrowed is not None:
+                values[index] = (borrowed + distance * _DENSIFY_STEP) & _VALUE_MASK
+    return array.array("I", values)
+
+
+def similarity(first: array.array, second: array.array) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_BINS
+
+
+class NearDuplicateIndex:
+    """MinHash signatures in LSH buckets. `max_entries` bounds a long-lived index: when full, it is cleared and refilled."""
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD, max_entries: Optional[int] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._signatures = array.array("I") # Entry i occupies bins [i * SIGNATURE_BINS, (i + 1) * SIGNATURE_BINS)
+        self._labels = []
+        self._buckets = [{} for _ in range(LSH_BANDS)] # band key -> entry index, or list of indices once shared
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    @staticmethod
+    def _band_keys(signature: array.array) -> List[int]:
+        rows = SIGNATURE_BINS // LSH_BANDS
+        data = signature.tobytes()
+        width = rows * signature.itemsize
+        return [hash(data[start:start + width]) for start in range(0, len(data), width)]
+
+    def add(self, signature: array.array, label=None) -> int:
+        """Files a signature (with an optional label returned by queries) and returns its entry number."""
+        with self._lock:
+            if self.max_entries is not None and len(self._labels) >= self.max_entries:
+                self._clear()
+            entry = len(self._labels)
+            self._labels.append(label)
+            self._signatures.extend(signature)
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                held = bucket.get(key)
+                if held is None:
+                    bucket[key] = entry
+                elif isinstance(held, list):
+                    held.append(entry)
+                else:
+                    bucket[key] = [held, entry]
+            return entry
+
+    def most_similar(self, signature: array.array) -> Tuple[Optional[object], float]:
+        """(label, similarity) of the closest stored poem sharing an LSH band, or (None, 0.0) if none does."""
+        with self._lock:
+            candidates = set()
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                held = bucket.get(key)
+                if held is None:
+                    continue
+                if isinstance(held, list):
+                    candidates.update(held)
+                else:
+                    candidates.add(held)
+            best, best_similarity = None, 0.0
+            for entry in candidates:
+                start = entry * SIGNATURE_BINS
+                score = similarity(signature, self._signatures[start:start + SIGNATURE_BINS])
+                if score > best_similarity:
+                    best, best_similarity = entry, score
+            return (self._labels[best] if best is not None else None), best_similarity
+
+    def is_duplicate(self, signature: array.array) -> bool:
+        return self.most_similar(signature)[1] >= self.threshold
+
+    def _clear(self):
+        self._signatures = array.array("I")
+        self._labels = []
+        self._buckets = [{} for _ in range(LSH_BANDS)]
+        counters.incr("dedup_index_resets")
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_duplicate_index() -> NearDuplicateIndex:
+    """Returns the process-wide index shared across conversations, creating it on first call."""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = NearDuplicateIndex(SHARED_DUPLICATE_THRESHOLD, SHARED_INDEX_MAX_ENTRIES)
+    return _shared_index
@@ -0,0 +1,135 @@
+# Poetic Form Rules
+#
+# The session-level rules handed to `PoetryAgent.generate_poetry`, keyed by the
+# short name a user types (or passes on the command line). Each entry gives the
+# display name, line count, per-line syllable targets (cycled when shorter than
+# the poem), the rhyme scheme as written in Requirements.md, and the meter.
+# Forms with repeated material say so explicitly:
+#   - "refrains": [source line, line, line, ...] groups; the later lines repeat
+#     the source line word for word (villanelle A1 / A2).
+#   - "rentrement": lines that repeat the opening phrase of line 1 (rondeau R).
+#   - "end_word_rotation": the permutation taking one stanza's end words to the
+#     next (sestina, 6-1-5-2-4-3), and "envoi": [inner, end] word numbers for
+#     the closing lines.
+#
+# `form_plan(rules)` compiles a rules dict once into a `FormPlan`: one
+# `LinePlan` per line with its syllable target and what decides its end (a
+# rhyme group, an end word slot, or a repeat of an earlier line). Plans are
+# memoized by rules object, so every call with the same dict reuses the same
+# plan; treat a rules dict as read-only once it has been used. The agent then
+# writes the poem line by line from the plan, so the cost of a poem grows
+# linearly with its line count and repeated lines cost nothing.
+
+from typing import Dict, List, Optional, Tuple
+
+from .rhyme_index import ending_foot, expand_rhyme_scheme
+
+FORM_RULES = {
+    "haiku": {"name": "Haiku (3 lines, 5-7-5 syllables)", "line_count": 3, "syllables": [5, 7, 5], "rhyme_scheme": None, "meter_description": "Syllabic 5-7-5"},
+    "limerick": {"name": "Limerick (5 lines, AABBA rhyme)", "line_count": 5, "syllables": [8,8,5,5,8], "rhyme_scheme": "AABBA", "meter": "anapestic", "meter_description": "Anapestic trimeter and dimeter"},
+    "sonnet": {"name": "Shakespearean Sonnet (14 lines, ABAB CDCD EFEF GG)", "line_count": 14, "syllables": [10], "rhyme_scheme": "ABAB CDCD EFEF GG", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "petrarchan": {"name": "Petrarchan Sonnet (14 lines, ABBAABBA CDECDE)", "line_count": 14, "syllables": [10], "rhyme_scheme": "ABBAABBA CDECDE", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "villanelle": {"name": "Villanelle (19 lines, ABA x5 + ABAA)", "line_count": 19, "syllables": [10], "rhyme_scheme": "ABA ABA ABA ABA ABA ABAA", "meter": "iambic", "meter_description": "Iambic pentameter",
+                   "refrains": [[1, 6, 12, 18], [3, 9, 15, 19]]},
+    "rondeau": {"name": "Rondeau (15 lines, AABBA AABR AABBAR)", "line_count": 15, "syllables": [8], "rhyme_scheme": "AABBA AABR AABBAR", "meter": "iambic", "meter_description": "Iambic tetrameter",
+                "rentrement": [9, 15]},
+    "ballad": {"name": "Ballad (quatrains, ABCB rhyme)", "line_count": 8, "syllables": [8, 6, 8, 6], "rhyme_scheme": "ABCB", "meter": "iambic", "meter_description": "Iambic tetrameter and trimeter"},
+    "blank_verse": {"name": "Blank Verse (unrhymed iambic pentameter)", "line_count": 10, "syllables": [10], "rhyme_scheme": None, "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "free_verse": {"name": "Free Verse (no fixed meter)", "line_count": 8, "syllables": [7, 9, 5, 11, 6, 8, 10, 4], "rhyme_scheme": None, "meter": None, "meter_description": "No fixed meter"},
+    "sestina": {"name": "Sestina (6 sestets + envoi, end-word rotation)", "line_count": 39, "syllables": [10], "rhyme_scheme": None, "meter": "iambic", "meter_description": "Iambic pentameter",
+                "end_word_rotation": [6, 1, 5, 2, 4, 3], "envoi": [[2, 5], [4, 3], [6, 1]]},
+    "ode": {"name": "Ode (10-line stanza, ABABCDECDE)", "line_count": 10, "syllables": [10], "rhyme_scheme": "ABABCDECDE", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "elegy": {"name": "Elegy (elegiac quatrains, ABAB)", "line_count": 12, "syllables": [10], "rhyme_scheme": "ABAB", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "terza_rima": {"name": "Terza Rima (ABA BCB CDC...)", "line_count": 13, "syllables": [10], "rhyme_scheme": "ABA BCB CDC DED...", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "heroic_couplet": {"name": "Heroic Couplets (AABB...)", "line_count": 8, "syllables": [10], "rhyme_scheme": "AA", "meter": "iambic", "meter_description": "Iambic pentameter"},
+    "clerihew": {"name": "Clerihew (4 lines, AABB)", "line_count": 4, "syllables": [6, 8, 6, 8], "rhyme_scheme": "AABB", "meter": None, "meter_description": "Irregular"}
+}
+
+DEFAULT_FORM = "haiku"
+
+MAX_CACHED_PLANS = 256
+
+
+class LinePlan:
+    """One line of a compiled form: its syllable target and what decides how it ends.
+
+    `repeats` (index of an earlier line, copied whole or, with `fragment`, only
+    its opening phrase) takes precedence; otherwise `end_word` (and optionally
+    `inner_word`) name slots in the poem's end-word list, or `rhyme_group` names
+    a rhyme group. A line with none of these is unrhymed.
+    """
+    __slots__ = ("syllables", "rhyme_group", "repeats", "fragment", "end_word", "inner_word")
+
+    def __init__(self, syllables: int, rhyme_group: Optional[int] = None, repeats: Optional[int] = None,
+                 fragment: bool = False, end_word: Optional[int] = None, inner_word: Optional[int] = None):
+        self.syllables = syllables
+        self.rhyme_group = rhyme_group
+        self.repeats = repeats
+        self.fragment = fragment
+        self.end_word = end_word
+        self.inner_word = inner_word
+
+
+class FormPlan:
+    """A form compiled for generation. `rhyme_groups` lists the group of every rhymed line that is actually written."""
+    __slots__ = ("name", "lines", "syllables", "rhyme_groups", "end_word_count", "foot")
+
+    def __init__(self, name: str, lines: Tuple[LinePlan, ...], syllables: Tuple[int, ...], end_word_count: int, foot: Optional[str]):
+        self.name = name
+        self.lines = lines
+        self.syllables = syllables
+        self.rhyme_groups = tuple(line.rhyme_group for line in lines if line.repeats is None and line.rhyme_group is not None)
+        self.end_word_count = end_word_count
+        self.foot = foot # Rhymed endings must fit this foot (see rhyme_index.py); None leaves them free
+
+    @property
+    def rhymed(self) -> bool:
+        return bool(self.rhyme_groups)
+
+
+def _sestina_slots(rotation: List[int], envoi: List[List[int]], line_count: int) -> List[Tuple[Optional[int], int]]:
+    """(inner word, end word) slot per line: stanzas permuted by `rotation`, then the envoi pairs."""
+    order = list(range(len(rotation)))
+    slots = []
+    while len(slots) + len(order) <= line_count - len(envoi):
+        slots.extend((None, slot) for slot in order)
+        order = [order[position - 1] for position in rotation]
+    slots.extend((inner - 1, end - 1) for inner, end in envoi)
+    return slots[:line_count]
+
+
+def compile_form(rules: Dict) -> FormPlan:
+    """Compiles a rules dict (an entry of FORM_RULES, or a caller's own) into a `FormPlan`."""
+    scheme = rules.get("rhyme_scheme") or ""
+    rotation = rules.get("end_word_rotation")
+    line_count = rules.get("line_count", 4 if scheme or rotation else 3)
+    syllables = tuple(rules.get("syllables") or ([8] if scheme or rotation else [5, 7, 5]))
+
+    repeats = {}
+    for source, *copies in rules.get("refrains") or ():
+        repeats.update((line - 1, (source - 1, False)) for line in copies)
+    repeats.update((line - 1, (0, True)) for line in rules.get("rentrement") or ())
+
+    groups = expand_rhyme_scheme(scheme, line_count) if scheme else [None] * line_count
+    slots = _sestina_slots(rotation, rules.get("envoi") or [], line_count) if rotation else [(None, None)] * line_count
+    lines = []
+    for i in range(line_count):
+        source, fragment = repeats.get(i, (None, False))
+        inner_word, end_word = slots[i] if i < len(slots) else (None, None)
+        lines.append(LinePlan(syllables[i % len(syllables)], rhyme_group=groups[i], repeats=source, fragment=fragment,
+                              end_word=end_word, inner_word=inner_word))
+    return FormPlan(rules.get("name", "Unknown Form"), tuple(lines), syllables, len(rotation) if rotation else 0,
+                    ending_foot(rules))
+
+
+_plans = {} # id(rules) -> (rules, plan); keeping the rules alive means the id cannot be reused while cached
+
+
+def form_plan(rules: Dict) -> FormPlan:
+    """The compiled plan for `rules`, compiled on first use and reused for every later call with the same dict."""
+    entry = _plans.get(id(rules))
+    if entry is None or entry[0] is not rules:
+        if len(_plans) >= MAX_CACHED_PLANS:
+            _plans.clear()
+        entry = _plans[id(rules)] = (rules, compile_form(rules))
+    return entry[1]
@@ -0,0 +1,201 @@
+# Directory Change Notification
+#
+# Lets a receiver sleep until something changes in a message directory instead
+# of waking up on a fixed timer. On Linux, `DirectoryWatcher` uses inotify
+# (through ctypes, no third-party package) and wakes within milliseconds of a
+# file being created, renamed into place, appended to or closed after writing.
+# Everywhere else, or if inotify cannot be set up (watch limit reached,
+# restricted sandbox), it falls back to polling with an adaptive backoff: the
+# first re-checks come quickly, then the interval doubles up to
+# MAX_POLL_INTERVAL so an idle receiver costs almost nothing.
+#
+# Typical use (see `wait_until`): create the watcher *before* checking for the
+# message, so a message that lands between the check and the wait still wakes
+# the receiver. Watchers are kept open and reused (one per thread and
+# directory, a few directories at most) because closing an inotify descriptor
+# can stall for a scheduler tick, which would dominate a sub-millisecond turn.
+# A thread's watchers are closed when the thread ends: its thread-local cache
+# is released then, and every watcher closes its descriptor when collected.
+
+import collections
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import weakref
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+MIN_POLL_INTERVAL = 0.0005 # Seconds; first fallback poll interval
+MAX_POLL_INTERVAL = 0.05   # Seconds; fallback interval never grows beyond this
+CACHED_WATCHERS_PER_THREAD = 8
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000 # Always delivered: the watch is gone (directory deleted or unmounted)
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII") # struct inotify_event: wd, mask, cookie, len (name follows)
+
+_libc = None
+_libc_checked = False
+
+
+def _inotify_libc():
+    """The C library if it exposes inotify, else None. Looked up once."""
+    global _libc, _libc_checked
+    if not _libc_checked:
+        _libc_checked = True
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes # Imported on first wait, not at startup
+                import ctypes.util
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (ImportError, OSError, AttributeError):
+                _libc = None
+    return _libc
+
+
+def inotify_available() -> bool:
+    return _inotify_libc() is not None
+
+
+class DirectoryWatcher:
+    """Blocks in `wait()` until the directory changes (inotify) or the next backoff poll is due."""
+
+    def __init__(self, path: str):
+        self.path = path or "."
+        self.fd = None
+        self.identity = _directory_identity(self.path)
+        self.dead = False
+        self._poll_interval = MIN_POLL_INTERVAL
+        self._poller = None
+        self._finalizer = None
+        libc = _inotify_libc()
+        if libc is not None and self.identity is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(self.path), WATCH_MASK) >= 0:
+                    self.fd = fd
+                    self._finalizer = weakref.finalize(self, os.close, fd) # Closes the descriptor if close() never runs
+                    self._poller = select.poll()
+                    self._poller.register(fd, select.POLLIN)
+                else:
+                    os.close(fd)
+
+    def reset_backoff(self):
+        self._poll_interval = MIN_POLL_INTERVAL
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self.fd is not None
+
+    def is_alive(self) -> bool:
+        """False once the watched directory has been removed (drains any queued events to find out)."""
+        if self.fd is not None and not self.dead and self._poller.poll(0):
+            self._drain()
+        return not self.dead and self.identity is not None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleeps until a change (True) or until `timeout` / the current poll interval passes (False)."""
+        if self.fd is None or self.dead:
+            interval = self._poll_interval if timeout is None else min(self._poll_interval, timeout)
+            time.sleep(max(interval, 0))
+            self._poll_interval = min(self._poll_interval * 2, MAX_POLL_INTERVAL)
+            return False
+        ready = self._poller.poll(None if timeout is None else max(timeout, 0) * 1000)
+        if not ready:
+            return False
+        self._drain()
+        return True
+
+    def _drain(self):
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                return
+            position = 0
+            while position + EVENT_HEADER.size <= len(data):
+                _, mask, _, name_length = EVENT_HEADER.unpack_from(data, position)
+                if mask & IN_IGNORED:
+                    self.dead = True
+                position += EVENT_HEADER.size + name_length
+
+    def close(self):
+        if self.fd is not None:
+            self._finalizer()
+            self.fd = None
+            self._poller = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _directory_identity(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+_thread_watchers = threading.local()
+
+
+def get_watcher(directory: str) -> DirectoryWatcher:
+    """This thread's open watcher for `directory`; the least recently used one is closed past the cache size."""
+    directory = os.path.abspath(directory or ".")
+    cache = getattr(_thread_watchers, "cache", None)
+    if cache is None:
+        cache = _thread_watchers.cache = collections.OrderedDict()
+    watcher = cache.get(directory)
+    if watcher is not None:
+        if watcher.is_alive() and watcher.identity == _directory_identity(directory):
+            cache.move_to_end(directory)
+            return watcher
+        watcher.close() # Directory was removed or recreated since: the old watch is dead
+    watcher = cache[directory] = DirectoryWatcher(directory)
+    while len(cache) > CACHED_WATCHERS_PER_THREAD:
+        cache.popitem(last=False)[1].close()
+    return watcher
+
+
+def wait_until(check: Callable[[], Optional[T]], directory: str, timeout: Optional[float]) -> Optional[T]:
+    """Calls `check` until it returns something other than None, sleeping on changes to `directory` in between.
+
+    Returns None once `timeout` seconds have passed (None waits forever).
+    """
+    watcher = get_watcher(directory)
+    watcher.reset_backoff()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return None
+        if watcher.dead:
+            watcher = get_watcher(directory)
+        watcher.wait(remaining)
@@ -0,0 +1,442 @@
+# HTTP Transport
+#
+# Carries the A2A envelope (see message_structure.py) over HTTP/1.1, so agents
+# can run as separate processes or on separate hosts. Only the standard library
+# is used, and everything works on loopback with no outside services.
+#
+#   AgentServer    A small threaded HTTP server holding one mailbox per
+#                  recipient:
+#                    POST /messages              one envelope or a JSON list
+#                                                of envelopes (a batch)
+#                    GET  /messages/<id>?max=N&wait=S&take=T
+#                                                up to N (at least 1) waiting
+#                                                envelopes and the lease that
+#                                                holds them; with `wait`, holds
+#                                                the request open (long poll)
+#                                                up to S seconds until one
+#                                                arrives
+#                    DELETE /leases/<lease>      acknowledges a take
+#                  A take only leases its envelopes: they leave the mailbox
+#                  for good when the client acknowledges them, and go back to
+#                  the front of it if no acknowledgement arrives within
+#                  LEASE_SECONDS, so a response lost on the way is delivered
+#                  again instead of dropped. The client names each take (T
+#                  becomes the lease id), and a take repeated while its lease
+#                  is held returns the same envelopes, so retrying a take
+#                  whose reply was lost neither skips nor reorders messages.
+#                  Long polls also wake when a lease expires.
+#   HttpTransport  The client side. It keeps a small pool of keep-alive
+#                  connections per server, so a turn costs one request on an
+#                  open socket rather than a TCP handshake. `send_many` posts
+#                  several envelopes in one request. `routes` maps recipients
+#                  to servers; anyone else uses `server_url`. `Message`
+#                  objects are posted as their JSON dictionaries (the wire
+#                  format stays JSON), and received envelopes come back as
+#                  `Message` objects, like every other transport's. A
+#                  request is only sent again when the first attempt never
+#                  reached the server, or when repeating it is harmless (a
+#                  take or an acknowledgement), so a post is never delivered
+#                  twice. After a failed take, `receive_blocking` backs off
+#                  before asking again, up to its deadline.
+#
+# Command line (run a server in its own process):
+#   python -m poet_agents.http_transport --host 127.0.0.1 --port 8765
+
+import argparse
+import collections
+import http.client
+import json
+import queue
+import select
+import socket
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from .message_structure import Message
+from .telemetry import DEBUG, ERROR, INFO, WARNING, configure_logging, counters, get_logger, log_event
+from .transport import Transport
+
+logger = get_logger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_REQUEST_TIMEOUT = 30.0 # Seconds, on top of any long-poll wait
+MAX_LONG_POLL = 60.0
+LEASE_SECONDS = 30.0 # Taken envelopes not acknowledged within this go back to their mailbox
+MAX_TAKE_ID_LENGTH = 64
+MIN_RETRY_DELAY = 0.05 # Seconds before asking an unreachable server again, doubling up to MAX_RETRY_DELAY
+MAX_RETRY_DELAY = 2.0
+
+
+class _Mailboxes:
+    """Thread-safe per-recipient queues with blocking, leased takes."""
+
+    def __init__(self, lease_seconds: float = LEASE_SECONDS):
+        self._queues = collections.defaultdict(collections.deque)
+        self._changed = threading.Condition()
+        self._leases = {} # Lease id -> (recipient_id, envelopes, expiry), oldest first
+        self.lease_seconds = lease_seconds
+
+    def put_many(self, messages: List[Dict]):
+        with self._changed:
+            for message in messages:
+                self._queues[message["recipient_id"]].append(message)
+            self._changed.notify_all()
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        for lease, (recipient_id, messages, expiry) in list(self._leases.items()):
+            if expiry > now:
+                break
+            del self._leases[lease]
+            self._queues[recipient_id].extendleft(reversed(messages)) # Back in front, in their original order
+            counters.incr("http_leases_expired")
+
+    def take(self, recipient_id: str, max_messages: Optional[int], wait: float,
+             lease: Optional[str] = None) -> Tuple[Optional[str], List[Dict]]:
+        """Leases up to `max_messages` waiting envelopes. Returns (lease id, envelopes); the id is None if there are none.
+
+        `lease` names the take. If that lease is still held (the take is a retry), its envelopes are returned again.
+        """
+        with self._changed:
+            held = self._leases.get(lease) if lease is not None else None
+            if held is not None and held[0] == recipient_id:
+                return lease, list(held[1])
+            waiting = self._queues[recipient_id]
+            deadline = time.monotonic() + max(wait, 0.0)
+            while True:
+                self._requeue_expired()
+                remaining = deadline - time.monotonic()
+                if waiting or remaining <= 0:
+                    break
+                # Puts wake the wait; so must the oldest lease's expiry, which may hand envelopes back to this mailbox.
+                oldest = next(iter(self._leases.values()), None)
+                self._changed.wait(remaining if oldest is None else min(remaining, max(oldest[2] - time.monotonic(), 0.0)))
+            count = len(waiting) if max_messages is None else min(max_messages, len(waiting))
+            if not count:
+                return None, []
+            messages = [waiting.popleft() for _ in range(count)]
+            lease = lease or uuid.uuid4().hex
+            self._leases[lease] = (recipient_id, messages, time.monotonic() + self.lease_seconds)
+            return lease, messages
+
+    def acknowledge(self, lease: str) -> bool:
+        """Drops a lease's envelopes for good. False if the lease is unknown (already acknowledged, or expired)."""
+        with self._changed:
+            return self._leases.pop(lease, None) is not None
+
+
+class _AgentRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive: every response carries Content-Length
+    server_version = "PoetAgents/1.0"
+    disable_nagle_algorithm = True # Headers and body are separate writes; don't let delayed ACKs stall them
+
+    def setup(self):
+        super().setup()
+        with self.server.connections_lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.connection)
+        super().finish()
+
+    def _reply(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/messages":
+            return self._reply(404, {"error": "unknown path"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._reply(400, {"error": f"invalid JSON: {e}"})
+        messages = body if isinstance(body, list) else [body]
+        if not all(isinstance(message, dict) and message.get("recipient_id") for message in messages):
+            return self._reply(400, {"error": "every envelope needs a recipient_id"})
+        self.server.mailboxes.put_many(messages)
+        self._reply(200, {"accepted": len(messages)})
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        prefix = "/messages/"
+        if not url.path.startswith(prefix) or len(url.path) == len(prefix):
+            return self._reply(404, {"error": "unknown path"})
+        recipient_id = urllib.parse.unquote(url.path[len(prefix):])
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            max_messages = int(query["max"][0]) if "max" in query else None
+            wait = min(float(query.get("wait", ["0"])[0]), MAX_LONG_POLL)
+        except ValueError:
+            return self._reply(400, {"error": "max and wait must be numbers"})
+        if max_messages is not None and max_messages < 1:
+            return self._reply(400, {"error": "max must be at least 1"})
+        take_id = query.get("take", [None])[0]
+        if take_id is not None and not 0 < len(take_id) <= MAX_TAKE_ID_LENGTH:
+            return self._reply(400, {"error": f"take must be 1 to {MAX_TAKE_ID_LENGTH} characters"})
+        lease, messages = self.server.mailboxes.take(recipient_id, max_messages, wait, take_id)
+        self._reply(200, {"lease": lease, "messages": messages})
+
+    def do_DELETE(self):
+        prefix = "/leases/"
+        if not self.path.startswith(prefix) or len(self.path) == len(prefix):
+            return self._reply(404, {"error": "unknown path"})
+        self._reply(200, {"acknowledged": self.server.mailboxes.acknowledge(urllib.parse.unquote(self.path[len(prefix):]))})
+
+    def log_message(self, format, *args):
+        log_event(logger, DEBUG, "http request", client=self.client_address[0], request=format % args)
+
+
+class AgentServer:
+    """Hosts mailboxes for any number of agents. `port=0` picks a free port (see `url`)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), _AgentRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mailboxes = _Mailboxes()
+        self.httpd.connections = set() # Open keep-alive sockets, closed by stop()
+        self.httpd.connections_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "AgentServer":
+        """Serves on a background thread and returns immediately."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="agent-server", daemon=True)
+        self._thread.start()
+        log_event(logger, INFO, "agent server listening", url=self.url)
+        return self
+
+    def serve_forever(self):
+        log_event(logger, INFO, "agent server listening", url=self.url)
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Stops accepting and drops open keep-alive connections, so clients notice the server is gone."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        with self.httpd.connections_lock:
+            for connection in self.httpd.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _ConnectionPool:
+    """Idle keep-alive connections to one server, reused most-recently-returned first."""
+
+    def __init__(self, host: str, port: int, size: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def get(self) -> http.client.HTTPConnection:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                counters.incr("http_connections_opened")
+                return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            if connection.sock is None or not select.select([connection.sock], [], [], 0)[0]:
+                return connection
+            connection.close() # Readable while idle: the server closed it (or sent something unasked for)
+
+    def put(self, connection: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HttpTransport(Transport):
+    """Client for `AgentServer`s with pooled keep-alive connections and batched sends."""
+
+    name = "http"
+
+    def __init__(self, server_url: str, routes: Optional[Dict[str, str]] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.server_url = server_url
+        self.routes = dict(routes or {})
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, recipient_id: str) -> _ConnectionPool:
+        url = urllib.parse.urlsplit(self.routes.get(recipient_id, self.server_url))
+        key = (url.hostname, url.port or 80)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _ConnectionPool(key[0], key[1], self.pool_size, self.timeout)
+            return pool
+
+    def _request(self, pool: _ConnectionPool, method: str, path: str, body=None, extra_timeout: float = 0.0):
+        data = None if body is None else json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (1, 2):
+            connection = pool.get()
+            sent = False
+            try:
+                connection.timeout = self.timeout + extra_timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(connection.timeout)
+                connection.request(method, path, body=data, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                payload = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                # Retry once on a fresh connection, but only if the server cannot have acted on the first
+                # attempt: it never got the request, or repeating it is harmless (a named take returns the
+                # same lease, and acknowledging twice changes nothing).
+                if attempt == 2 or (sent and method not in ("GET", "DELETE")):
+                    raise
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            pool.put(connection)
+            counters.incr("http_requests")
+            return response.status, json.loads(payload) if payload else None
+
+    def send(self, message: Dict) -> bool:
+        return self.send_many([message]) == 1
+
+    def send_many(self, messages: List[Dict]) -> int:
+        """Posts `messages` in one request per destination server. Returns how many were accepted."""
+        by_pool = collections.defaultdict(list)
+        for message in messages:
+            by_pool[self._pool(message["recipient_id"])].append(message.to_dict() if isinstance(message, Message) else message)
+        accepted = 0
+        for pool, batch in by_pool.items():
+            try:
+                status, reply = self._request(pool, "POST", "/messages", batch)
+            except (OSError, http.client.HTTPException) as e:
+                log_event(logger, ERROR, "could not post messages", server=f"{pool.host}:{pool.port}", count=len(batch), error=e)
+                continue
+            if status != 200:
+                log_event(logger, ERROR, "server rejected messages", server=f"{pool.host}:{pool.port}", status=status, reply=reply)
+                continue
+            accepted += reply["accepted"]
+        return accepted
+
+    def _take(self, recipient_id: str, max_messages: Optional[int], wait: float) -> Optional[List[Message]]:
+        """Takes and acknowledges up to `max_messages` envelopes. None if the server could not be asked."""
+        query = {} if max_messages is None else {"max": max_messages}
+        query["take"] = uuid.uuid4().hex # Names the take, so a retry gets the same envelopes back
+        if wait > 0:
+            query["wait"] = f"{wait:.3f}"
+        path = "/messages/" + urllib.parse.quote(recipient_id, safe="")
+        if query:
+            path += "?" + urllib.parse.urlencode(query)
+        pool = self._pool(recipient_id)
+        try:
+            status, reply = self._request(pool, "GET", path, extra_timeout=wait)
+        except (OSError, http.client.HTTPException) as e:
+            log_event(logger, ERROR, "could not fetch messages", server=f"{pool.host}:{pool.port}", recipient=recipient_id, error=e)
+            return None
+        if status != 200:
+            log_event(logger, ERROR, "server refused fetch", server=f"{pool.host}:{pool.port}", status=status, reply=reply)
+            return None
+        messages = []
+        for envelope in reply["messages"]:
+            try:
+                messages.append(Message.from_dict(envelope))
+            except (TypeError, ValueError) as e: # Acknowledged below all the same, so it is not delivered again
+                log_event(logger, ERROR, "dropped malformed message", recipient=recipient_id, error=e)
+        if reply["lease"] is not None:
+            self._acknowledge(pool, reply["lease"])
+        return messages
+
+    def _acknowledge(self, pool: _ConnectionPool, lease: str):
+        try:
+            status, reply = self._request(pool, "DELETE", "/leases/" + urllib.parse.quote(lease, safe=""))
+        except (OSError, http.client.HTTPException) as e:
+            status, reply = None, str(e)
+        if status != 200:
+            # The server will hand these messages out again once the lease expires.
+            log_event(logger, ERROR, "could not acknowledge messages", server=f"{pool.host}:{pool.port}", lease=lease, reply=reply)
+        elif not reply["acknowledged"]:
+            # Either a retried acknowledgement whose first attempt got through, or the lease expired first.
+            log_event(logger, WARNING, "lease unknown to the server", server=f"{pool.host}:{pool.port}", lease=lease)
+
+    def receive(self, recipient_id: str) -> Optional[Message]:
+        messages = self._take(recipient_id, 1, 0.0)
+        return messages[0] if messages else None
+
+    def receive_many(self, recipient_id: str, max_messages: Optional[int] = None) -> List[Message]:
+        return self._take(recipient_id, max_messages, 0.0) or []
+
+    def receive_blocking(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Message]:
+        # Long-poll in slices so `timeout=None` (wait forever) never exceeds the server's cap.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        retry_delay = MIN_RETRY_DELAY
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            messages = self._take(recipient_id, 1, MAX_LONG_POLL if remaining is None else min(remaining, MAX_LONG_POLL))
+            if messages:
+                return messages[0]
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            if messages is None: # The server could not be asked: back off instead of asking again at once
+                time.sleep(retry_delay if remaining is None else min(retry_delay, remaining))
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+            else:
+                retry_delay = MIN_RETRY_DELAY
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run an agent mailbox server for the HTTP transport.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: loopback only).")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (0 picks a free one).")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    server = AgentServer(args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+# Shared Lexicon
+#
+# The word lists and line patterns every agent uses, built once per process
+# and shared read-only by all agents instead of being rebuilt per agent or
+# per call:
+#   - STOPWORDS: words ignored when picking keywords and reference phrases.
+#   - PERSONA_VOCABULARY: each persona's filler words (1- and 2-syllable).
+#   - HAIKU_PATTERNS / HAIKU_FALLBACK_PATTERNS: haiku line templates, with KW1
+#     and KW2 standing in for the prompt keywords.
+#   - RELATED_THEMES, INTERPRETATION_TEMPLATES, PERSONA_LINE_ENDINGS: the
+#     tables `interpret_poetry` and line finishing draw from.
+#   - OPENING_PROMPTS: themes a dialogue's first poem (and title) is drawn from.
+#
+# Everything here is immutable (frozensets, tuples, read-only mappings), so a
+# population of agents can share it safely across threads. `persona_buckets`
+# and `haiku_templates` memoize the derived structures the line solver needs;
+# `themed_buckets` widens a persona's buckets with the corpus neighbours of
+# the poem's keywords when a word association index is available (see
+# word_assoc.py).
+
+import functools
+import types
+from typing import Dict, Tuple
+
+from .line_solver import FILL, bucket_by_syllables
+from .syllable_index import get_syllable_index
+
+ALPHA = "alpha"
+BETA = "beta"
+
+KW1 = "\x00kw1" # Pattern placeholders, replaced by the prompt keywords
+KW2 = "\x00kw2"
+
+STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had",
+    "do", "does", "did", "will", "would", "should", "can", "could", "may", "might", "must",
+    "and", "but", "or", "nor", "for", "so", "yet", "if", "then", "else", "when", "where",
+    "why", "how", "what", "which", "who", "whom", "whose", "of", "at", "by", "from", "to",
+    "in", "out", "on", "off", "over", "under", "again", "further", "once", "here", "there",
+    "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no",
+    "not", "only", "own", "same", "than", "too", "very", "s", "t", "just", "don",
+    "shouldve", "now", "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "couldn",
+    "didn", "doesn", "hadn", "hasn", "haven", "isn", "ma", "mightn", "mustn", "needn",
+    "shan", "shouldn", "wasn", "weren", "won", "wouldn", "i", "me", "my", "myself",
+    "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves",
+    "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself",
+    "they", "them", "their", "theirs", "themselves", "prompt", "kw1", "kw2",
+    "reference_phrase", "alpha", "beta","noted", "turn", "core", "argument", "attempt",
+    "proceed", "foundation", "seed", "logic", "creed", "elaborates", "need", "leads",
+    "reflections", "confines", "unblocked", "thesis", "interlocked", "concludes", "unlock",
+    "spun", "dream", "sun", "fun", "muses", "run", "alight", "stray", "yesterday", "spirit",
+    "wanders", "play", "bloomed", "shimmer", "gloom", "fancies", "roam", "home"
+})
+
+PERSONA_VOCABULARY = types.MappingProxyType({
+    ALPHA: ("wise", "deep", "clear", "true", "strong", "form", "thus", "one", "all", "past", "vast", "still", "mark", "fact",
+            "reason", "logic", "future", "structure", "order", "wisdom", "pattern", "essence", "concept"),
+    BETA: ("soft", "light", "hush", "mist", "far", "dim", "soul", "dream", "now", "deep", "calm", "sky", "moon", "star",
+           "hidden", "secret", "spirit", "wonder", "magic", "echo", "flowing", "drifting", "fading"),
+})
+
+HAIKU_PATTERNS = types.MappingProxyType({
+    ALPHA: ((KW1, FILL, KW2), (FILL, KW1, KW2), (KW1, "is", KW2, FILL)),
+    BETA: ((FILL, KW1, KW2), (KW1, "like", FILL, KW2), ("Ah,", KW1, FILL, KW2)),
+})
+# Used in turn when the keywords alone overflow the target: keep kw1, then fill only.
+HAIKU_FALLBACK_PATTERNS = (((KW1, FILL),), ((FILL,),))
+
+PERSONA_LINE_ENDINGS = types.MappingProxyType({ALPHA: (".",), BETA: ("...", ".", "!")})
+
+RELATED_THEMES = types.MappingProxyType({
+    "stars": "sky", "dream": "sleep", "night": "day", "light": "dark",
+    "love": "heart", "time": "eternity", "ocean": "sea", "cosmic": "universe",
+    "robot": "future", "song": "melody", "lonely": "solitude", "space": "void"
+})
+
+INTERPRETATION_TEMPLATES = (
+    "Delve into the connection between {kw1} and {kw2}.",
+    "Imagine {kw1} as a secret held by {kw2}—what unfolds?",
+    "A reflective dialogue: {kw1} converses with {kw2}.",
+    "Explore the hidden meaning of {kw1}'s journey towards {kw2}.",
+)
+
+OPENING_PROMPTS = (
+    "themes of cosmic wonder and stellar destiny",
+    "the silent wisdom of ancient mountains and hidden valleys",
+    "a quest for the ephemeral city of echoes and lost dreams",
+    "the rhythmic dance of ocean tides under a cryptic moon",
+    "secrets whispered by the winds on a desolate plain",
+)
+
+
+def persona_for(agent_name: str) -> str:
+    """Agents named "alpha" (any case) write as Alpha; everyone else writes as Beta."""
+    return ALPHA if agent_name.lower() == ALPHA else BETA
+
+
+_persona_buckets = {}
+
+
+def persona_buckets(persona: str) -> Dict[int, Tuple[str, ...]]:
+    """The persona's vocabulary grouped by syllable count. Built on first use (it needs the syllable index)."""
+    buckets = _persona_buckets.get(persona)
+    if buckets is None:
+        grouped = bucket_by_syllables(PERSONA_VOCABULARY[persona], get_syllable_index().syllables)
+        buckets = _persona_buckets[persona] = types.MappingProxyType({syl: tuple(words) for syl, words in grouped.items()})
+    return buckets
+
+
+THEME_EXPANSION_WORDS = 6 # Corpus neighbours of each keyword added to the filler vocabulary
+THEME_EXPANSION_MAX_SYLLABLES = 2 # Same range as the persona vocabularies
+
+
+@functools.lru_cache(maxsize=4096)
+def themed_buckets(persona: str, associations, kw1: str, kw2: str) -> Dict[int, Tuple[str, ...]]:
+    """The persona's buckets plus the strongest neighbours of both keywords in `associations` (a WordAssociations)."""
+    buckets = persona_buckets(persona)
+    known = set(PERSONA_VOCABULARY[persona])
+    extra = [word for keyword in (kw1, kw2) for word in associations.neighbours(keyword, THEME_EXPANSION_WORDS)
+             if word not in known and word not in STOPWORDS and word not in (kw1, kw2)]
+    if not extra:
+        return buckets
+    grouped = bucket_by_syllables(extra, get_syllable_index().syllables)
+    merged = dict(buckets)
+    for syl, words in grouped.items():
+        if 1 <= syl <= THEME_EXPANSION_MAX_SYLLABLES:
+            merged[syl] = merged.get(syl, ()) + tuple(words)
+    return types.MappingProxyType(merged)
+
+
+def _bind(patterns, kw1: str, kw2: str):
+    return tuple(tuple(kw1 if word is KW1 else kw2 if word is KW2 else word for word in pattern) for pattern in patterns)
+
+
+@functools.lru_cache(maxsize=4096)
+def haiku_templates(persona: str, kw1: str, kw2: str):
+    """(templates, fallback template groups) for a persona and keyword pair; shared by every line and agent."""
+    return _bind(HAIKU_PATTERNS[persona], kw1, kw2), tuple(_bind(group, kw1, kw2) for group in HAIKU_FALLBACK_PATTERNS)
@@ -0,0 +1,112 @@
+# Exact Syllable-Target Line Solver
+#
+# Replaces the old random add/pop hill-climbing in `_generate_haiku_line`.
+# A line is described by a template: a list of fixed words (keywords,
+# connectives) with a single FILL slot. The fixed words' syllables are summed,
+# and the remainder is filled from the persona vocabulary, bucketed by
+# syllable count, with a small bounded-knapsack DP. Each vocabulary word is
+# used at most once per line, and among all exact solutions the one with the
+# fewest filler words is chosen. The DP is O(buckets * target * bucket size),
+# so a line costs the same handful of operations every time and only fails
+# when no exact solution exists at all.
+
+import random
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .telemetry import counters
+from .tracing import span, tracer
+
+FILL = object()  # Placeholder for the filler slot in a line template
+
+
+def bucket_by_syllables(words: Sequence[str], count_syllables: Callable[[str], int]) -> Dict[int, List[str]]:
+    """Groups words by syllable count, dropping duplicates while keeping order."""
+    buckets = {}
+    seen = set()
+    for word in words:
+        if word in seen:
+            continue
+        seen.add(word)
+        buckets.setdefault(count_syllables(word), []).append(word)
+    return buckets
+
+
+def solve_fill_counts(buckets: Dict[int, List[str]], target: int) -> Optional[Dict[int, int]]:
+    """Returns how many words to take from each bucket to hit `target` exactly.
+
+    Bounded knapsack: bucket k may contribute at most len(buckets[k]) words.
+    Minimizes the number of words used. Returns None if `target` is unreachable.
+    """
+    if target < 0:
+        return None
+    # best[s] = (word_count, {syllables: words_taken}) for the cheapest way to reach s
+    best = [None] * (target + 1)
+    best[0] = (0, {})
+    for syl in sorted(buckets):
+        if syl <= 0:
+            continue
+        available = len(buckets[syl])
+        next_best = list(best)
+        for reached in range(target + 1):
+            if best[reached] is None:
+                continue
+            used, taken = best[reached]
+            for n in range(1, available + 1):
+                total = reached + n * syl
+                if total > target:
+                    break
+                if next_best[total] is None or used + n < next_best[total][0]:
+                    next_best[total] = (used + n, {**taken, syl: n})
+        best = next_best
+    return best[target][1] if best[target] is not None else None
+
+
+def fill_template(template: Sequence, buckets: Dict[int, List[str]], target: int,
+                  count_syllables: Callable[[str], int], rng) -> Optional[List[str]]:
+    """Fills one template's FILL slot to exactly `target` syllables. Returns the words, or None if it cannot."""
+    fixed_syllables = 0
+    clashes = None
+    for word in template:
+        if word is FILL:
+            continue
+        syllables = count_syllables(word)
+        fixed_syllables += syllables
+        if word in buckets.get(syllables, ()):
+            clashes = (clashes or set()) | {word}
+    # A keyword that is also a vocabulary word must not be repeated as filler
+    available = buckets if clashes is None else {syl: [word for word in words if word not in clashes] for syl, words in buckets.items()}
+    fill_counts = solve_fill_counts(available, target - fixed_syllables)
+    if fill_counts is None:
+        return None
+    filler = []
+    for syl, n in fill_counts.items():
+        filler.extend(rng.sample(available[syl], n))
+    rng.shuffle(filler)
+    line = []
+    for word in template:
+        if word is FILL:
+            line.extend(filler)
+        else:
+            line.append(word)
+    return line
+
+
+def solve_line(templates: Sequence[Sequence], buckets: Dict[int, List[str]], target: int,
+               count_syllables: Callable[[str], int], rng: Optional[random.Random] = None) -> Optional[List[str]]:
+    """Fills the first feasible template (tried in random order) to exactly `target` syllables.
+
+    Returns the list of words, or None if no template can be completed.
+    """
+    rng = rng or random
+    order = list(range(len(templates)))
+    rng.shuffle(order)
+    for idx in order:
+        counters.incr("line_attempts")
+        if tracer.enabled: # Checked here: even a disabled span costs more than this loop can afford
+            with span("line_attempt", template=idx):
+                line = fill_template(templates[idx], buckets, target, count_syllables, rng)
+        else:
+            line = fill_template(templates[idx], buckets, target, count_syllables, rng)
+        if line is not None:
+            return line
+    return None
@@ -0,0 +1,258 @@
+# Append-Only Mailbox Transport
+#
+# Each recipient owns a JSON Lines log, `mailbox_<id>.log`, in the mailbox
+# directory. Senders append one compact JSON record per message (or, with
+# `codec="binary"`, one length-prefixed binary record; see message_codec.py;
+# every process sharing a mailbox directory must use the same codec); nothing is
+# ever overwritten, so a second message sent before the first is read is
+# simply the next line rather than a lost file. The recipient keeps a
+# consumer offset (the byte position just past the last message it took) in
+# `mailbox_<id>.offset`, a small fixed-width record rewritten in place, so a
+# restarted consumer resumes exactly where it stopped.
+#
+# A single read from the offset to the end of the log yields every message
+# that has arrived; `receive_many` hands them all over at once and commits
+# one offset. Only complete lines are consumed, so a reader never sees half of
+# a concurrent write.
+#
+# The consumed prefix of a log is reclaimed by compaction on a background
+# thread: once the offset passes `compact_threshold` bytes and covers at least
+# half the file, the unread tail is copied to a new file that atomically
+# replaces the log, and the offset restarts at 0. The offset record also
+# stores the log's inode, so if the process dies between the swap and the
+# offset update, the stale offset is detected and reset instead of skipping
+# messages.
+#
+# Senders and the compactor coordinate through `fcntl.flock` on
+# `mailbox_<id>.lock` (shared for appends, exclusive for compaction), which
+# also works across processes. Where `fcntl` is unavailable, compaction is
+# disabled and the logs only grow. Each mailbox assumes a single consumer.
+
+import collections
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Union
+
+from .fswatch import wait_until
+from .message_codec import MessageCodec, get_codec
+from .telemetry import DEBUG, ERROR, WARNING, counters, get_logger, log_event
+from .transport import Transport
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+OFFSET_RECORD_SIZE = 64
+DEFAULT_COMPACT_THRESHOLD = 1 << 20 # Bytes of consumed log before compaction is considered
+
+
+class _FileLock:
+    """`flock` on a lock file: shared for appenders, exclusive for the compactor. No-op without fcntl."""
+
+    def __init__(self, path: str, exclusive: bool):
+        self.path = path
+        self.exclusive = exclusive
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+class MailboxTransport(Transport):
+    """Durable, lossless per-recipient message logs with batched reads and background compaction."""
+
+    name = "mailbox"
+
+    def __init__(self, mailbox_dir: str, compact_threshold: Optional[int] = DEFAULT_COMPACT_THRESHOLD, fsync: bool = False,
+                 codec: Union[str, MessageCodec, None] = None):
+        self.mailbox_dir = mailbox_dir
+        self.codec = get_codec(codec)
+        self.compact_threshold = compact_threshold if fcntl is not None else None
+        self.fsync = fsync
+        os.makedirs(mailbox_dir, exist_ok=True)
+        self._consumers = {} # recipient_id -> _Consumer
+        self._lock = threading.Lock()
+        self._compaction_queue = None
+        self._compactor = None
+
+    # --- Paths -------------------------------------------------------------
+
+    def _path(self, recipient_id: str, suffix: str) -> str:
+        return os.path.join(self.mailbox_dir, f"mailbox_{recipient_id}.{suffix}")
+
+    # --- Sending -----------------------------------------------------------
+
+    def send(self, message: Dict) -> bool:
+        recipient_id = message["recipient_id"]
+        record = self.codec.frame(self.codec.encode(message))
+        try:
+            with _FileLock(self._path(recipient_id, "lock"), exclusive=False):
+                fd = os.open(self._path(recipient_id, "log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, record) # One O_APPEND write per record: appends never interleave
+                    if self.fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            log_event(logger, ERROR, "could not append to mailbox", recipient=recipient_id, error=e)
+            return False
+        return True
+
+    # --- Receiving ---------------------------------------------------------
+
+    def _consumer(self, recipient_id: str) -> "_Consumer":
+        with self._lock:
+            consumer = self._consumers.get(recipient_id)
+            if consumer is None:
+                consumer = self._consumers[recipient_id] = _Consumer(self._path(recipient_id, "log"), self._path(recipient_id, "offset"), self.codec)
+            return consumer
+
+    def receive(self, recipient_id: str) -> Optional[Dict]:
+        messages = self.receive_many(recipient_id, max_messages=1)
+        return messages[0] if messages else None
+
+    def receive_many(self, recipient_id: str, max_messages: Optional[int] = None) -> List[Dict]:
+        """Takes up to `max_messages` (default: all) waiting messages, in arrival order, committing one offset."""
+        consumer = self._consumer(recipient_id)
+        with consumer.lock:
+            if not consumer.pending:
+                consumer.read_new()
+            taken = []
+            while consumer.pending and (max_messages is None or len(taken) < max_messages):
+                message, end_offset = consumer.pending.popleft()
+                taken.append(message)
+                consumer.committed = end_offset
+            if taken:
+                consumer.write_offset()
+                counters.incr("mailbox_batches")
+            should_compact = (self.compact_threshold is not None and not consumer.pending
+                              and consumer.committed >= self.compact_threshold
+                              and consumer.committed * 2 >= consumer.read_position)
+        if should_compact:
+            self._schedule_compaction(recipient_id)
+        return taken
+
+    def receive_blocking(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        return wait_until(lambda: self.receive(recipient_id), self.mailbox_dir, timeout)
+
+    # --- Compaction --------------------------------------------------------
+
+    def _schedule_compaction(self, recipient_id: str):
+        with self._lock:
+            if self._compactor is None:
+                self._compaction_queue = queue.Queue()
+                self._compactor = threading.Thread(target=self._compaction_loop, name="mailbox-compactor", daemon=True)
+                self._compactor.start()
+        self._compaction_queue.put(recipient_id)
+
+    def _compaction_loop(self):
+        while True:
+            recipient_id = self._compaction_queue.get()
+            if recipient_id is None:
+                return
+            try:
+                self.compact(recipient_id)
+            except OSError as e:
+                log_event(logger, WARNING, "mailbox compaction failed", recipient=recipient_id, error=e)
+
+    def compact(self, recipient_id: str) -> int:
+        """Drops the consumed prefix of a mailbox log. Returns the number of bytes reclaimed."""
+        consumer = self._consumer(recipient_id)
+        log_path = self._path(recipient_id, "log")
+        with _FileLock(self._path(recipient_id, "lock"), exclusive=True), consumer.lock:
+            reclaimed = consumer.committed
+            if reclaimed == 0:
+                return 0
+            with open(log_path, "rb") as f:
+                f.seek(reclaimed)
+                tail = f.read()
+            tmp_path = log_path + ".compact"
+            with open(tmp_path, "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, log_path)
+            # Messages read but not yet handed out keep their place relative to the new file start.
+            consumer.pending = collections.deque((message, end - reclaimed) for message, end in consumer.pending)
+            consumer.committed = 0
+            consumer.read_position -= reclaimed
+            consumer.write_offset()
+        counters.incr("mailbox_compactions")
+        log_event(logger, DEBUG, "compacted mailbox", recipient=recipient_id, reclaimed_bytes=reclaimed)
+        return reclaimed
+
+    def close(self):
+        if self._compactor is not None:
+            self._compaction_queue.put(None)
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            for consumer in self._consumers.values():
+                consumer.close()
+            self._consumers.clear()
+
+
+class _Consumer:
+    """Read side of one mailbox: committed offset, read-ahead position and parsed-but-unconsumed messages."""
+
+    def __init__(self, log_path: str, offset_path: str, codec: MessageCodec):
+        self.log_path = log_path
+        self.codec = codec
+        self.offset_fd = os.open(offset_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.lock = threading.Lock()
+        self.pending = collections.deque() # (message, offset just past it)
+        self.committed, stored_inode = self._read_offset()
+        if stored_inode is not None and stored_inode != self._log_inode():
+            self.committed = 0 # Log was compacted after the offset was written
+        self.read_position = self.committed
+
+    def _log_inode(self) -> Optional[int]:
+        try:
+            return os.stat(self.log_path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _read_offset(self):
+        record = os.pread(self.offset_fd, OFFSET_RECORD_SIZE, 0).decode("ascii", "ignore").split()
+        if len(record) != 2:
+            return 0, None
+        offset, inode = int(record[0]), int(record[1])
+        return offset, (inode or None)
+
+    def write_offset(self):
+        record = f"{self.committed} {self._log_inode() or 0}\n".encode("ascii").ljust(OFFSET_RECORD_SIZE)
+        os.pwrite(self.offset_fd, record, 0)
+
+    def read_new(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self.read_position)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        records = self.codec.split_frames(data) # Complete records only; a partial one is still being written
+        if not records:
+            return
+        for record, end in records:
+            try:
+                self.pending.append((self.codec.decode(record), self.read_position + end))
+            except (ValueError, TypeError) as e:
+                log_event(logger, ERROR, "skipping corrupt mailbox record", file=self.log_path, error=e)
+        self.read_position += records[-1][1]
+
+    def close(self):
+        os.close(self.offset_fd)
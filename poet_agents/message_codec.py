@@ -0,0 +1,179 @@
+# Message Codecs
+#
+# Turn A2A envelopes (a `Message`, or a plain dict in the shape described in
+# message_structure.py) into bytes and back. The transports that serialize
+# messages (file, mailbox) take a `codec=` argument, by name or as an object:
+#
+#   json    compact UTF-8 JSON, no indentation. Any JSON reader can inspect
+#           it; a structured payload is a nested object.
+#   binary  a small header of field lengths followed by the raw UTF-8 fields:
+#           no keys, quotes or escapes to write, and no parser to run on the
+#           way back, only slicing.
+#
+# Both validate on the way in and decode to a `Message`. Binary layout
+# (little-endian):
+#
+#   u8    format version (BINARY_VERSION)
+#   u8    payload kind: 0 text, 1 PoemPayload
+#   u8    flags: 1 prompt present, 2 reference present, 4 extra fields present
+#   u32*  byte length of each field that follows, in order
+#   ...   sender_id, recipient_id, message_type, timestamp, then the payload
+#         (text, or poem [+ prompt] [+ reference]), then [extra as JSON]
+#
+# A codec also frames records for append-only logs: `frame(data)` wraps one
+# encoded message and `split_frames(buffer)` finds the complete records in a
+# buffer. JSON records end with a newline (JSON Lines); binary records carry
+# a u32 length prefix.
+#
+# To add an encoding, subclass `MessageCodec` and register an instance in
+# CODECS.
+
+import json
+import struct
+from typing import Dict, List, Tuple, Union
+
+from .message_structure import Message, PoemPayload
+
+BINARY_VERSION = 1
+PAYLOAD_TEXT, PAYLOAD_POEM = 0, 1
+HAS_PROMPT, HAS_REFERENCE, HAS_EXTRA = 1, 2, 4
+ENVELOPE_FIELD_COUNT = 4 # sender_id, recipient_id, message_type, timestamp
+
+_FRAME_LENGTH = struct.Struct("<I")
+_HEADERS = {} # field count -> Struct for the version/kind/flags bytes and the field lengths
+
+
+def _header(field_count: int) -> struct.Struct:
+    header = _HEADERS.get(field_count)
+    if header is None:
+        header = _HEADERS[field_count] = struct.Struct(f"<BBB{field_count}I")
+    return header
+
+
+def _as_message(message: Union[Message, Dict]) -> Message:
+    return message if isinstance(message, Message) else Message.from_dict(message)
+
+
+class MessageCodec:
+    """Interface for message encodings."""
+
+    name = "codec"
+
+    def encode(self, message: Union[Message, Dict]) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Message:
+        """Parses one encoded message. Raises ValueError (or TypeError) for malformed data."""
+        raise NotImplementedError
+
+    def frame(self, data: bytes) -> bytes:
+        """`data` as one self-delimiting record for an append-only log."""
+        raise NotImplementedError
+
+    def split_frames(self, buffer: bytes) -> List[Tuple[bytes, int]]:
+        """The complete records at the start of `buffer`, each with the offset just past it."""
+        raise NotImplementedError
+
+
+class JsonCodec(MessageCodec):
+    name = "json"
+
+    def encode(self, message: Union[Message, Dict]) -> bytes:
+        if isinstance(message, Message):
+            data = message.to_dict()
+        else:
+            Message.from_dict(message) # Validates the dictionary; it is then written as given
+            data = message
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Message:
+        return Message.from_dict(json.loads(data))
+
+    def frame(self, data: bytes) -> bytes:
+        return data + b"\n" # Compact JSON escapes newlines inside strings, so a record is one line
+
+    def split_frames(self, buffer: bytes) -> List[Tuple[bytes, int]]:
+        records, position = [], 0
+        end = buffer.rfind(b"\n") # Anything after the last newline is a record still being written
+        for line in buffer[:end + 1].splitlines(keepends=True):
+            position += len(line)
+            records.append((line, position))
+        return records
+
+
+class BinaryCodec(MessageCodec):
+    name = "binary"
+
+    def encode(self, message: Union[Message, Dict]) -> bytes:
+        message = _as_message(message)
+        payload = message.payload
+        fields = [message.sender_id, message.recipient_id, message.message_type, message.timestamp]
+        flags = 0
+        if isinstance(payload, str):
+            kind = PAYLOAD_TEXT
+            fields.append(payload)
+        else:
+            kind = PAYLOAD_POEM
+            fields.append(payload.poem)
+            if payload.prompt is not None:
+                flags |= HAS_PROMPT
+                fields.append(payload.prompt)
+            if payload.reference is not None:
+                flags |= HAS_REFERENCE
+                fields.append(payload.reference)
+        if message.extra:
+            flags |= HAS_EXTRA
+            fields.append(json.dumps(message.extra, ensure_ascii=False, separators=(",", ":")))
+        encoded = [field.encode("utf-8", "surrogatepass") for field in fields]
+        return _header(len(encoded)).pack(BINARY_VERSION, kind, flags, *map(len, encoded)) + b"".join(encoded)
+
+    def decode(self, data: bytes) -> Message:
+        if len(data) < 3 or data[0] != BINARY_VERSION or data[1] not in (PAYLOAD_TEXT, PAYLOAD_POEM):
+            raise ValueError("not a binary message of a known version")
+        kind, flags = data[1], data[2]
+        if flags & ~(HAS_PROMPT | HAS_REFERENCE | HAS_EXTRA) or (kind == PAYLOAD_TEXT and flags & (HAS_PROMPT | HAS_REFERENCE)):
+            raise ValueError("binary message has invalid flags")
+        header = _header(ENVELOPE_FIELD_COUNT + 1 + bin(flags).count("1"))
+        if len(data) < header.size:
+            raise ValueError("truncated binary message header")
+        fields, position = [], header.size
+        for length in header.unpack_from(data)[3:]:
+            end = position + length
+            fields.append(data[position:end].decode("utf-8", "surrogatepass"))
+            position = end
+        if position != len(data):
+            raise ValueError("binary message length does not match its header")
+        sender_id, recipient_id, message_type, timestamp, body, *rest = fields
+        if kind == PAYLOAD_POEM:
+            prompt = rest.pop(0) if flags & HAS_PROMPT else None
+            reference = rest.pop(0) if flags & HAS_REFERENCE else None
+            body = PoemPayload(body, prompt, reference)
+        extra = json.loads(rest[0]) if flags & HAS_EXTRA else None
+        return Message(sender_id, recipient_id, message_type, body, timestamp, extra)
+
+    def frame(self, data: bytes) -> bytes:
+        return _FRAME_LENGTH.pack(len(data)) + data
+
+    def split_frames(self, buffer: bytes) -> List[Tuple[bytes, int]]:
+        records, position = [], 0
+        while position + _FRAME_LENGTH.size <= len(buffer):
+            end = position + _FRAME_LENGTH.size + _FRAME_LENGTH.unpack_from(buffer, position)[0]
+            if end > len(buffer):
+                break # Record still being written
+            records.append((buffer[position + _FRAME_LENGTH.size:end], end))
+            position = end
+        return records
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), BinaryCodec())}
+DEFAULT_CODEC = "json"
+
+
+def get_codec(codec: Union[str, MessageCodec, None] = None) -> MessageCodec:
+    """Resolves a codec name (or None for the default) to a codec; codec objects are returned unchanged."""
+    if isinstance(codec, MessageCodec):
+        return codec
+    try:
+        return CODECS[codec or DEFAULT_CODEC]
+    except KeyError:
+        raise ValueError(f"unknown message codec {codec!r}; choose from {', '.join(sorted(CODECS))}") from None
@@ -4,6 +4,11 @@
 # The structure is designed to be simple and clear, facilitating simulated communication.
 # In a real-world scenario, these messages would likely be serialized (e.g., to JSON)
 # and transmitted over a network or messaging queue.
+# http_transport.py does exactly that: it posts these envelopes as JSON to an
+# AgentServer so agents can run in separate processes or on separate hosts.
+
+import datetime
+from typing import Any, Dict, Optional, Union
 
 # Example A2A Message Structure (Simulated)
 # This dictionary represents the structure of a message exchanged between agents.
@@ -50,9 +55,135 @@ example_message = {
 #   This helps in ordering messages, logging, and debugging.
 #   Example: "2023-10-27T10:00:00Z"
 
-# Note: For more complex scenarios, the payload could be a dictionary itself,
-# containing multiple pieces of information. However, for this project,
-# a string payload for poetry or interpretation text is sufficient for now.
+# Note: For more complex scenarios, the payload can be structured: a
+# `PoemPayload` carries the poem together with the prompt it answers and the
+# phrase it references. Plain string payloads remain the default.
+#
+# `Message` below is the typed form of this envelope: fixed slots, validated
+# at construction, with dict-style read access (`message["payload"]`,
+# `message.get(...)`) so code written against the dictionaries keeps working.
+# Fields beyond the five above travel in `extra`. Codecs that turn messages
+# into bytes for the transports live in message_codec.py.
+
+MESSAGE_FIELDS = ("sender_id", "recipient_id", "message_type", "payload", "timestamp")
+MAX_ID_LENGTH = 256 # Characters in sender_id, recipient_id and message_type
+
+
+def utc_timestamp() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+class PoemPayload:
+    """A structured payload: the poem, plus the prompt it answers and the phrase it references (both optional)."""
+    __slots__ = ("poem", "prompt", "reference")
+
+    def __init__(self, poem: str, prompt: Optional[str] = None, reference: Optional[str] = None):
+        if not isinstance(poem, str):
+            raise TypeError(f"poem must be a str, not {type(poem).__name__}")
+        for name, value in (("prompt", prompt), ("reference", reference)):
+            if value is not None and not isinstance(value, str):
+                raise TypeError(f"{name} must be a str or None, not {type(value).__name__}")
+        self.poem = poem
+        self.prompt = prompt
+        self.reference = reference
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return {"poem": self.poem, "prompt": self.prompt, "reference": self.reference}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PoemPayload":
+        return cls(data.get("poem"), data.get("prompt"), data.get("reference"))
+
+    def __str__(self) -> str:
+        return self.poem
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PoemPayload) and (self.poem, self.prompt, self.reference) == (other.poem, other.prompt, other.reference)
+
+    def __hash__(self) -> int:
+        return hash((self.poem, self.prompt, self.reference))
+
+    def __repr__(self) -> str:
+        return f"PoemPayload(poem={self.poem!r}, prompt={self.prompt!r}, reference={self.reference!r})"
+
+
+class Message:
+    """A validated A2A envelope. Raises TypeError or ValueError for a malformed field."""
+    __slots__ = MESSAGE_FIELDS + ("extra",)
+
+    def __init__(self, sender_id: str, recipient_id: str, message_type: str, payload: Union[str, PoemPayload],
+                 timestamp: Optional[str] = None, extra: Optional[Dict[str, Any]] = None):
+        if not (type(sender_id) is str and type(recipient_id) is str and type(message_type) is str
+                and 0 < len(sender_id) <= MAX_ID_LENGTH and 0 < len(recipient_id) <= MAX_ID_LENGTH
+                and 0 < len(message_type) <= MAX_ID_LENGTH): # One combined check on the common path
+            for name, value in (("sender_id", sender_id), ("recipient_id", recipient_id), ("message_type", message_type)):
+                if not isinstance(value, str):
+                    raise TypeError(f"{name} must be a str, not {type(value).__name__}")
+                if not value or len(value) > MAX_ID_LENGTH:
+                    raise ValueError(f"{name} must be 1 to {MAX_ID_LENGTH} characters")
+        if not isinstance(payload, (str, PoemPayload)):
+            raise TypeError(f"payload must be a str or PoemPayload, not {type(payload).__name__}")
+        if timestamp is None:
+            timestamp = utc_timestamp()
+        elif not isinstance(timestamp, str):
+            raise TypeError(f"timestamp must be an ISO 8601 str, not {type(timestamp).__name__}")
+        if extra and not set(extra).isdisjoint(MESSAGE_FIELDS):
+            raise ValueError("extra fields must not repeat the envelope fields")
+        self.sender_id = sender_id
+        self.recipient_id = recipient_id
+        self.message_type = message_type
+        self.payload = payload
+        self.timestamp = timestamp
+        self.extra = extra or None
+
+    @property
+    def text(self) -> str:
+        """The payload as text (the poem, for a structured payload)."""
+        return self.payload if isinstance(self.payload, str) else self.payload.poem
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The envelope as a plain dictionary; a structured payload becomes a nested dictionary."""
+        payload = self.payload if isinstance(self.payload, str) else self.payload.to_dict()
+        data = {"sender_id": self.sender_id, "recipient_id": self.recipient_id, "message_type": self.message_type,
+                "payload": payload, "timestamp": self.timestamp}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        """Validates a dictionary envelope (as read from JSON). Missing fields raise ValueError."""
+        missing = [name for name in MESSAGE_FIELDS[:4] if name not in data]
+        if missing:
+            raise ValueError(f"message is missing {', '.join(missing)}")
+        payload = data["payload"]
+        if isinstance(payload, dict):
+            payload = PoemPayload.from_dict(payload)
+        extra = {key: value for key, value in data.items() if key not in MESSAGE_FIELDS}
+        return cls(data["sender_id"], data["recipient_id"], data["message_type"], payload, data.get("timestamp"), extra)
+
+    def __getitem__(self, key: str):
+        if key in MESSAGE_FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in MESSAGE_FIELDS or bool(self.extra and key in self.extra)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Message) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (f"Message(sender_id={self.sender_id!r}, recipient_id={self.recipient_id!r}, "
+                f"message_type={self.message_type!r}, payload={self.payload!r}, timestamp={self.timestamp!r})")
 
 if __name__ == '__main__':
     print("This file defines the A2A message structure.")
@@ -61,13 +192,12 @@ if __name__ == '__main__':
     print(json.dumps(example_message, indent=4))
 
     # Example of how a message might be constructed:
-    import datetime
-    new_message = {
-        "sender_id": "agent_turner_ai",
-        "recipient_id": "agent_critic_bot",
-        "message_type": "poetry_submission",
-        "payload": "The wind whispers secrets through the ancient trees,\nA timeless story on the gentle breeze.",
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z" # Adding 'Z' for UTC
-    }
+    new_message = Message(
+        sender_id="agent_turner_ai",
+        recipient_id="agent_critic_bot",
+        message_type="poetry_submission",
+        payload=PoemPayload("The wind whispers secrets through the ancient trees,\nA timeless story on the gentle breeze.",
+                            prompt="the voice of old forests"),
+    ) # The timestamp defaults to now, in UTC
     print("\nNewly Constructed Message Example:")
-    print(json.dumps(new_message, indent=4))
+    print(json.dumps(new_message.to_dict(), indent=4))
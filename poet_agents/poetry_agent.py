@@ -1,260 +1,432 @@
-import json
-import datetime
-import os
+import hashlib
 import collections
+import itertools
 import string
-import subprocess
-import sys
 import random
-from typing import Union, Dict
+from typing import Union, Dict, Iterable, List
 
 from .style_guide import frederick_turner_style
-
-PRONOUNCING_AVAILABLE = False
-try:
-    import pronouncing
-    PRONOUNCING_AVAILABLE = True
-    print("Pronouncing library imported successfully.")
-except ImportError:
-    print("Pronouncing library not found. Attempting to install...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pronouncing"])
-        print("Pronouncing library installation attempted. Re-importing...")
-        import site
-        from importlib import reload
-        reload(site)
-        import pronouncing
-        PRONOUNCING_AVAILABLE = True
-        print("Pronouncing library imported successfully after installation attempt.")
-    except Exception as e:
-        print(f"Could not install or import Pronouncing library after attempt: {e}. Dynamic rhyming/syllable counting will be disabled.")
+from .lexicon import (ALPHA, INTERPRETATION_TEMPLATES, PERSONA_LINE_ENDINGS, PERSONA_VOCABULARY, RELATED_THEMES, STOPWORDS,
+                      haiku_templates, persona_buckets, persona_for, themed_buckets)
+from .dedup import MAX_GENERATION_ATTEMPTS, NearDuplicateIndex, signature
+from .forms import FormPlan, form_plan
+from .line_solver import FILL, solve_line
+from .message_structure import Message, PoemPayload
+from .result_cache import ResultCache
+from .rhyme_index import ANCHOR_FOOT, fits_foot, get_rhyme_index
+from .syllable_index import get_syllable_index
+from .telemetry import DEBUG, INFO, TRACE, WARNING, counters, get_logger, log_event
+from .theme_model import ThemeModel
+from .tracing import span
+from .transport import FileTransport, Transport
+from .word_assoc import WordAssociations, get_word_associations
+
+logger = get_logger(__name__)
+
+# Joins batch items so they can be lower-cased and cleaned in one pass. It is whitespace and not
+# punctuation, so cleaning leaves it intact; occurrences inside an item are turned into spaces first,
+# which tokenizes identically.
+BATCH_SEPARATOR = "\x1e"
+PUNCTUATION_STRIP_TABLE = str.maketrans('', '', string.punctuation.replace("'", ""))
+RESUME_BATCH_POEMS = 256 # Stored poems normalized per pass when resuming a conversation
 
 class PoetryAgent:
-    def __init__(self, agent_name: str):
+    # Agents only hold per-agent state; word lists and patterns live in the shared lexicon.
+    __slots__ = ("agent_name", "persona", "message_dir", "transport", "rng", "generation_counter",
+                 "last_prompt_generated_by_me", "syllable_index", "rhyme_index", "_theme_model", "result_cache",
+                 "_conversation_digest", "_conversation_poems", "duplicate_index", "word_associations")
+
+    common_words_filter = STOPWORDS
+
+    def __init__(self, agent_name: str, message_dir: str = None, transport: Transport = None, seed: int = None,
+                 result_cache: ResultCache = None, duplicate_index: NearDuplicateIndex = None,
+                 word_associations: WordAssociations = None):
         self.agent_name = agent_name
+        self.persona = persona_for(agent_name)
+        self.message_dir = message_dir # Directory holding message_to_<id>.json files; None means the working directory
+        self.transport = transport if transport is not None else FileTransport(message_dir)
+        self.rng = random.Random(seed) if seed is not None else random # Per-agent generator when seeded, else the shared one
         self.generation_counter = 0
         self.last_prompt_generated_by_me = None
-        self.templates = {}
-
-        self.common_words_filter = {
-            "a", "an", "the", "is", "are", "was", "were", "be", "been", "being", "have", "has", "had",
-            "do", "does", "did", "will", "would", "should", "can", "could", "may", "might", "must",
-            "and", "but", "or", "nor", "for", "so", "yet", "if", "then", "else", "when", "where",
-            "why", "how", "what", "which", "who", "whom", "whose", "of", "at", "by", "from", "to",
-            "in", "out", "on", "off", "over", "under", "again", "further", "once", "here", "there",
-            "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no",
-            "not", "only", "own", "same", "than", "too", "very", "s", "t", "just", "don",
-            "shouldve", "now", "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "couldn",
-            "didn", "doesn", "hadn", "hasn", "haven", "isn", "ma", "mightn", "mustn", "needn",
-            "shan", "shouldn", "wasn", "weren", "won", "wouldn", "i", "me", "my", "myself",
-            "we", "our", "ours", "ourselves", "you", "your", "yours", "yourself", "yourselves",
-            "he", "him", "his", "himself", "she", "her", "hers", "herself", "it", "its", "itself",
-            "they", "them", "their", "theirs", "themselves", "prompt", "kw1", "kw2",
-            "reference_phrase", "alpha", "beta","noted", "turn", "core", "argument", "attempt",
-            "proceed", "foundation", "seed", "logic", "creed", "elaborates", "need", "leads",
-            "reflections", "confines", "unblocked", "thesis", "interlocked", "concludes", "unlock",
-            "spun", "dream", "sun", "fun", "muses", "run", "alight", "stray", "yesterday", "spirit",
-            "wanders", "play", "bloomed", "shimmer", "gloom", "fancies", "roam", "home"
-        }
+        self.syllable_index = get_syllable_index()
+        self.rhyme_index = get_rhyme_index()
+        self._theme_model = None
+        self.result_cache = result_cache # Optional memoization of generate/interpret (see result_cache.py)
+        self._conversation_digest = None # Identifies the poems interpreted so far; part of cached interpretation keys
+        self._conversation_poems = None # Signatures of the poems heard and written in this conversation (see dedup.py)
+        self.duplicate_index = duplicate_index # Optional index shared across conversations; written poems are added to it
+        # Corpus word associations (see word_assoc.py); None when no index has been built
+        self.word_associations = word_associations if word_associations is not None else get_word_associations()
+
+    @property
+    def theme_model(self) -> ThemeModel:
+        """Themes of the conversation so far, updated as each poem is interpreted. Created on first use."""
+        if self._theme_model is None:
+            self._theme_model = ThemeModel()
+        return self._theme_model
 
     def _count_syllables_for_word(self, word: str) -> int:
+        # Served from the shared CMUdict-backed index; out-of-dictionary words are
+        # estimated with the vowel-group heuristic once and then cached.
         if not word: return 0
-        if not PRONOUNCING_AVAILABLE:
-            num_vowels = sum(1 for char_in_word in word.lower() if char_in_word in "aeiou")
-            syl_count = max(1, num_vowels) if num_vowels > 0 else (1 if len(word) > 0 else 0)
-            print(f"    [Syllable Fallback - No Pronouncing] Word '{word}': Approx syllables: {syl_count}")
-            return syl_count
-        try:
-            word_lower = word.lower()
-            cleaned_word = word_lower.strip(string.punctuation)
-            if not cleaned_word: return 0
-
-            counts = pronouncing.syllable_count(cleaned_word)
-            if counts > 0:
-                # print(f"    [Syllable CMUdict] Word '{cleaned_word}': Syllables: {counts}")
-                return counts
-
-            print(f"    [Syllable Fallback] Word '{cleaned_word}' not in CMUdict. Using vowel group count.")
-            num_vowels = 0
-            last_char_was_vowel = False
-            for char_val in cleaned_word:
-                is_vowel = char_val in "aeiouy"
-                if is_vowel and not last_char_was_vowel: num_vowels += 1
-                last_char_was_vowel = is_vowel
-
-            if len(cleaned_word) > 2 and cleaned_word.endswith("e") and not cleaned_word.endswith("le") and num_vowels > 1:
-                if cleaned_word[-2] not in "aeiouy":
-                     if not (cleaned_word.endswith("es") and len(cleaned_word) > 3 and cleaned_word[-3] not in "aeiouy"):
-                        if not (cleaned_word.endswith("le") and len(cleaned_word) > 2 and cleaned_word[-3] not in "aeiouy"):
-                            num_vowels -=1
-
-            final_syl_count = max(1, num_vowels) if cleaned_word else 0
-            print(f"    [Syllable Fallback] Approx syllables for '{cleaned_word}': {final_syl_count}")
-            return final_syl_count
-        except Exception as e:
-            print(f"    [Syllable Error] Error counting syllables for '{word}': {e}. Defaulting to 1.")
-            return 1
+        return self.syllable_index.syllables(word)
 
     def _count_syllables_in_line(self, line_words: list) -> int:
         if not line_words: return 0
-        total_syllables = 0
-        for word in line_words:
-            syl = self._count_syllables_for_word(word)
-            total_syllables += syl
-        print(f"    [Line Syllable Count] For line: '{' '.join(line_words)}', CALC SYL: {total_syllables}")
+        total_syllables = self.syllable_index.line_syllables(line_words)
+        if logger.isEnabledFor(TRACE):
+            log_event(logger, TRACE, "line syllable count", agent=self.agent_name, line=" ".join(line_words), syllables=total_syllables)
         return total_syllables
 
-    def _generate_haiku_line(self, theme_prompt: str, kw1: str, kw2: str, target_syl: int, line_number: int) -> str:
-        if not PRONOUNCING_AVAILABLE:
-            return "(Syllable counting unavailable)"
+    def _persona_vocabulary(self) -> tuple:
+        return PERSONA_VOCABULARY[self.persona]
+
+    def _persona_buckets(self) -> dict:
+        return persona_buckets(self.persona)
 
-        line_attempts = 0
-        max_attempts = 30
+    def _finish_line(self, line_words: list) -> str:
+        line_str = " ".join(line_words).capitalize()
+        endings = PERSONA_LINE_ENDINGS[self.persona]
+        return line_str + (endings[0] if len(endings) == 1 else self.rng.choice(endings))
 
-        alpha_1syl_words = ["wise", "deep", "clear", "true", "strong", "form", "thus", "one", "all", "past", "vast", "still", "mark", "fact"]
-        alpha_2syl_words = ["reason", "logic", "future", "structure", "order", "wisdom", "pattern", "essence", "concept"]
-        beta_1syl_words = ["soft", "light", "hush", "mist", "far", "dim", "soul", "dream", "now", "deep", "calm", "sky", "moon", "star"]
-        beta_2syl_words = ["hidden", "secret", "spirit", "wonder", "magic", "echo", "flowing", "drifting", "fading"]
+    def _themed_buckets(self, kw1: str, kw2: str, buckets: dict = None) -> dict:
+        # Filler words for haiku lines: the persona's, widened with the keywords' corpus neighbours when there is an index.
+        if self.word_associations is not None:
+            return themed_buckets(self.persona, self.word_associations, kw1 or "theme", kw2 or "idea")
+        return buckets if buckets is not None else self._persona_buckets()
 
-        persona_1syl = alpha_1syl_words if self.agent_name.lower() == 'alpha' else beta_1syl_words
-        persona_2syl = alpha_2syl_words if self.agent_name.lower() == 'alpha' else beta_2syl_words
-        # persona_3syl not used in this simplified adjustment logic but kept for potential future
+    def _generate_haiku_line(self, theme_prompt: str, kw1: str, kw2: str, target_syl: int, line_number: int, buckets: dict = None) -> str:
+        if buckets is None: buckets = self._themed_buckets(kw1, kw2)
 
         safe_kw1 = kw1 if kw1 else "theme"
         safe_kw2 = kw2 if kw2 else "idea"
 
-        patterns = []
-        if self.agent_name.lower() == 'alpha':
-            patterns = [[safe_kw1, random.choice(persona_1syl), safe_kw2], [random.choice(persona_2syl), safe_kw1], [safe_kw1, "is", safe_kw2]]
+        # Degrade gracefully when the keywords alone overflow the target: keep kw1, then fill only.
+        templates, fallback_templates = haiku_templates(self.persona, safe_kw1, safe_kw2)
+
+        line_words = solve_line(templates, buckets, target_syl, self._count_syllables_for_word, rng=self.rng)
+        for fallback in fallback_templates:
+            if line_words is not None: break
+            line_words = solve_line(fallback, buckets, target_syl, self._count_syllables_for_word, rng=self.rng)
+
+        if line_words is None:
+            final_line_str = " ".join([safe_kw1, safe_kw2])
+            final_syllables = self._count_syllables_in_line([safe_kw1, safe_kw2])
+            counters.incr("lines_generated"); counters.incr("lines_failed")
+            log_event(logger, WARNING, "line failed: no exact solution", agent=self.agent_name, line_number=line_number,
+                      target=target_syl, got=final_syllables, best_attempt=final_line_str)
+            return f"({final_line_str} - {target_syl} syl target not met; got {final_syllables})"
+
+        final_line_str = self._finish_line(line_words)
+        counters.incr("lines_generated")
+        log_event(logger, DEBUG, "line generated", agent=self.agent_name, line_number=line_number, target=target_syl, line=final_line_str)
+        return final_line_str
+
+    def _fits_ending(self, word: str, foot: str) -> bool:
+        # Words outside CMUdict have no known stress; they are let through rather than judged.
+        stress = self.syllable_index.stress(word) if foot else None
+        return stress is None or fits_foot(stress, foot)
+
+    def _choose_rhyme_endings(self, groups: list, kw1: str, kw2: str, foot: str = None) -> dict:
+        # One list of end words per rhyme group. The prompt keywords and persona words anchor
+        # groups where they can; otherwise a rhyme class is drawn from the index. Every lookup
+        # is a dictionary access, so cost grows with the number of groups, not the dictionary.
+        group_sizes = collections.Counter(groups)
+        persona_words = self._persona_vocabulary()
+        preferred = [kw1, kw2] + self.rng.sample(persona_words, len(persona_words))
+        used_parts, used_words = set(), set()
+        endings = {}
+        for group in dict.fromkeys(groups):
+            needed = group_sizes[group]
+            chosen = None
+            for word in preferred:
+                if word in used_words or not self._fits_ending(word, foot): continue
+                if needed == 1:
+                    chosen = [word]; break
+                part = self.rhyme_index.rhyme_part(word)
+                if part is None or part in used_parts: continue
+                pool = self.rhyme_index.endings(part, foot)
+                partners = [w for w in self.rng.sample(pool, min(len(pool), needed + 4)) if w != word and w not in used_words]
+                if len(partners) >= needed - 1:
+                    chosen = [word] + partners[:needed - 1]; used_parts.add(part); break
+            if chosen is None:
+                part = self.rhyme_index.random_anchor_part(rng=self.rng, exclude=used_parts, foot=foot or ANCHOR_FOOT)
+                pool = self.rhyme_index.endings(part, foot or ANCHOR_FOOT) if part else ()
+                partners = [w for w in self.rng.sample(pool, min(len(pool), needed + 4)) if w not in used_words]
+                if len(partners) >= needed:
+                    chosen = partners[:needed]; used_parts.add(part)
+            if chosen is None: # Degraded mode (no CMUdict): unrhymed persona endings
+                chosen = [self.rng.choice(persona_words) for _ in range(needed)]
+            used_words.update(chosen)
+            endings[group] = chosen
+        return endings
+
+    def _generate_rhymed_line(self, kw1: str, kw2: str, end_word: str, target_syl: int, line_number: int, buckets: dict = None) -> str:
+        if buckets is None: buckets = self._persona_buckets()
+        body_kws = [kw for kw in (kw1, kw2) if kw and kw != end_word]
+        if self.persona == ALPHA:
+            templates = [[kw, FILL, end_word] for kw in body_kws]
         else: # Beta
-            patterns = [[random.choice(persona_1syl), safe_kw1, safe_kw2], [safe_kw1, "like", random.choice(beta_2syl_words)], ["Ah,", safe_kw1]]
-
-        current_line_words = [str(w) for w in random.choice(patterns) if w is not None and str(w).strip()]
-        if not current_line_words: current_line_words = [safe_kw1]
-
-        best_attempt_words = list(current_line_words)
-        best_attempt_syllables = self._count_syllables_in_line(best_attempt_words)
-
-        while line_attempts < max_attempts:
-            line_attempts += 1
-            current_line_words = [str(w) for w in current_line_words if w and str(w).strip()]
-            if not current_line_words: current_line_words = [random.choice(persona_1syl)] if persona_1syl else [safe_kw1]
-
-            current_syllables = self._count_syllables_in_line(current_line_words)
-
-            print(f"    Haiku Line Gen Attempt {line_attempts}: '{' '.join(current_line_words)}' - Calculated Syllables: {current_syllables} (Target: {target_syl})")
-
-            if current_syllables == target_syl:
-                final_line_str = " ".join(current_line_words)
-                if self.agent_name.lower() == 'alpha': final_line_str = final_line_str.capitalize() + "."
-                else: final_line_str = final_line_str.capitalize() + random.choice(["...", ".", "!"])
-                print(f"[{self.agent_name}] Line {line_number} ({target_syl} syl): SUCCEEDED. Line: '{final_line_str}' (Syllables: {current_syllables})")
-                return final_line_str
-
-            if abs(current_syllables - target_syl) < abs(best_attempt_syllables - target_syl):
-                best_attempt_words = list(current_line_words); best_attempt_syllables = current_syllables
-            elif abs(current_syllables - target_syl) == abs(best_attempt_syllables - target_syl) and current_syllables > best_attempt_syllables :
-                best_attempt_words = list(current_line_words); best_attempt_syllables = current_syllables
-
-            diff = target_syl - current_syllables
-            if diff > 0:
-                word_to_add = None
-                if diff >= 2 and persona_2syl: word_to_add = random.choice(persona_2syl)
-                elif persona_1syl: word_to_add = random.choice(persona_1syl)
-                if word_to_add: current_line_words.append(word_to_add)
-                else: current_line_words.append(random.choice(["on", "is"]))
-            elif diff < 0:
-                if len(current_line_words) > 1:
-                    if current_line_words[-1] not in [safe_kw1, safe_kw2] or len(current_line_words) > 2 : current_line_words.pop()
-                    else: current_line_words.pop(0)
-                elif len(current_line_words) == 1: current_line_words = [random.choice(persona_1syl)] if persona_1syl else ["go"]
-
-        final_line_str = " ".join(best_attempt_words)
-        final_syllables = best_attempt_syllables
-        if final_syllables != target_syl : # Recalculate if loop ended by max_attempts
-             final_syllables = self._count_syllables_in_line(best_attempt_words)
-
-        print(f"[{self.agent_name}] Line {line_number} ({target_syl} syl): FAILED. Best attempt: '{final_line_str}' (Syllables: {final_syllables})")
-        return f"({final_line_str} - {target_syl} syl target not met; got {final_syllables})"
+            templates = [[FILL, kw, end_word] for kw in body_kws]
+        line_words = solve_line(templates, buckets, target_syl, self._count_syllables_for_word, rng=self.rng)
+        if line_words is None:
+            line_words = solve_line([[FILL, end_word]], buckets, target_syl, self._count_syllables_for_word, rng=self.rng)
+        if line_words is None:
+            final_syllables = self._count_syllables_for_word(end_word)
+            counters.incr("lines_generated"); counters.incr("lines_failed")
+            log_event(logger, WARNING, "line failed: no exact solution", agent=self.agent_name, line_number=line_number,
+                      target=target_syl, got=final_syllables, end_word=end_word)
+            return f"({end_word} - {target_syl} syl target not met; got {final_syllables})"
+        counters.incr("lines_generated")
+        final_line_str = self._finish_line(line_words)
+        log_event(logger, DEBUG, "line generated", agent=self.agent_name, line_number=line_number, target=target_syl, line=final_line_str)
+        return final_line_str
+
+    def _choose_end_words(self, count: int, kw1: str, kw2: str) -> list:
+        # Distinct, unrhymed end words (sestina): the prompt keywords first, then persona words.
+        persona_words = self._persona_vocabulary()
+        candidates = [kw1, kw2] + self.rng.sample(persona_words, len(persona_words))
+        return list(dict.fromkeys(word for word in candidates if word))[:count]
+
+    def _repeat_line(self, line: str, fragment: bool) -> str:
+        if not fragment:
+            return line
+        words = line.rstrip(".!").split() # Opening phrase only (rondeau rentrement)
+        return self._finish_line(words[:max(1, (len(words) + 1) // 2)])
+
+    def _generate_planned_poem(self, plan: FormPlan, actual_prompt: str, kw1: str, kw2: str, buckets: dict = None) -> list:
+        # One pass over the compiled plan: every line is solved once, repeated lines are copied.
+        if plan.rhymed and not self.rhyme_index.available:
+            log_event(logger, WARNING, "rhyme index unavailable; lines will be unrhymed", agent=self.agent_name)
+        endings = self._choose_rhyme_endings(list(plan.rhyme_groups), kw1, kw2, plan.foot) if plan.rhymed else {}
+        end_words = self._choose_end_words(plan.end_word_count, kw1, kw2) if plan.end_word_count else ()
+        next_in_group = collections.Counter()
+        if buckets is None: buckets = self._persona_buckets()
+        haiku_buckets = self._themed_buckets(kw1, kw2, buckets) # Once per poem: the keywords are the same on every line
+        poem_lines = []
+        for number, line in enumerate(plan.lines, 1):
+            if line.repeats is not None:
+                poem_lines.append(self._repeat_line(poem_lines[line.repeats], line.fragment))
+            elif line.end_word is not None:
+                inner_word = end_words[line.inner_word] if line.inner_word is not None else None
+                poem_lines.append(self._generate_rhymed_line(inner_word or kw1, None if inner_word else kw2, end_words[line.end_word],
+                                                             line.syllables, line_number=number, buckets=buckets))
+            elif line.rhyme_group is not None:
+                end_word = endings[line.rhyme_group][next_in_group[line.rhyme_group]]
+                next_in_group[line.rhyme_group] += 1
+                poem_lines.append(self._generate_rhymed_line(kw1, kw2, end_word, line.syllables, line_number=number, buckets=buckets))
+            else:
+                poem_lines.append(self._generate_haiku_line(actual_prompt, kw1, kw2, line.syllables, line_number=number, buckets=haiku_buckets))
+        return poem_lines
 
-    def generate_poetry(self, prompt_data_or_text: Union[str, Dict], session_form_rules: dict) -> str:
+    @staticmethod
+    def _prompt_text(prompt_data_or_text: Union[str, Dict]) -> str:
         if isinstance(prompt_data_or_text, dict):
-            actual_prompt = prompt_data_or_text.get('prompt', "a silent pond")
-        else:
-            actual_prompt = prompt_data_or_text
+            return prompt_data_or_text.get('prompt', "a silent pond")
+        return prompt_data_or_text
 
+    @staticmethod
+    def _clean_prompts(prompts: List[str]) -> List[List[str]]:
+        # Lower-cases and tokenizes every prompt in one pass over the joined text:
+        # anything other than letters, digits, apostrophes and whitespace becomes a space.
+        joined = BATCH_SEPARATOR.join(prompt.replace(BATCH_SEPARATOR, " ") for prompt in prompts).lower()
+        cleaned = ''.join(char if char.isalnum() or char == "'" or char.isspace() else ' ' for char in joined)
+        return [chunk.split() for chunk in cleaned.split(BATCH_SEPARATOR)]
+
+    def generate_poetry(self, prompt_data_or_text: Union[str, Dict], session_form_rules: dict) -> str:
+        actual_prompt = self._prompt_text(prompt_data_or_text)
+        with span("generate", agent=self.agent_name, form=session_form_rules.get('name')):
+            if self.result_cache is not None:
+                return self._compose_distinct(self._compose_cached, actual_prompt, None, session_form_rules)
+            return self._compose_distinct(self._compose_poem, actual_prompt, self._clean_prompts([actual_prompt])[0], session_form_rules)
+
+    def generate_poetry_batch(self, prompts: List[Union[str, Dict]], session_form_rules: dict) -> List[str]:
+        """Generates one poem per prompt, in order, sharing tokenization and syllable buckets across the batch."""
+        actual_prompts = [self._prompt_text(prompt) for prompt in prompts]
+        if not actual_prompts: return []
+        word_lists = self._clean_prompts(actual_prompts)
+        buckets = self._persona_buckets()
+        compose = self._compose_cached if self.result_cache is not None else self._compose_poem
+        with span("generate_batch", agent=self.agent_name, form=session_form_rules.get('name'), poems=len(actual_prompts)):
+            return [self._compose_distinct(compose, actual_prompt, prompt_words, session_form_rules, buckets)
+                    for actual_prompt, prompt_words in zip(actual_prompts, word_lists)]
+
+    def _compose_distinct(self, compose, actual_prompt: str, cleaned_prompt_words: List[str], session_form_rules: dict,
+                          buckets: dict = None) -> str:
+        # Writes the poem again while it nearly duplicates one already heard or written (see dedup.py),
+        # keeping the least similar attempt if every one does.
+        best = None
+        for attempt in range(MAX_GENERATION_ATTEMPTS):
+            poem = compose(actual_prompt, cleaned_prompt_words, session_form_rules, buckets)
+            poem_signature = signature(poem)
+            if poem_signature is None:
+                return poem
+            duplicate, score = self._echo_of(poem_signature)
+            if best is None or score < best[0]:
+                best = (score, poem, poem_signature)
+            if not duplicate:
+                break
+            counters.incr("duplicate_poems_rewritten")
+            log_event(logger, DEBUG, "near-duplicate poem; writing it again", agent=self.agent_name, attempt=attempt + 1,
+                      similarity=round(score, 3))
+        score, poem, poem_signature = best
+        self.conversation_poems.add(poem_signature)
+        if self.duplicate_index is not None:
+            self.duplicate_index.add(poem_signature, self.agent_name)
+        return poem
+
+    def _echo_of(self, poem_signature) -> tuple:
+        """(whether the poem counts as a near-duplicate, its highest estimated similarity) against the conversation and shared indexes."""
+        duplicate, highest = False, 0.0
+        for index in (self._conversation_poems, self.duplicate_index):
+            if index:
+                score = index.most_similar(poem_signature)[1]
+                duplicate = duplicate or score >= index.threshold
+                highest = max(highest, score)
+        return duplicate, highest
+
+    @property
+    def conversation_poems(self) -> NearDuplicateIndex:
+        """Signatures of the poems heard and written in this conversation. Created on first use."""
+        if self._conversation_poems is None:
+            self._conversation_poems = NearDuplicateIndex()
+        return self._conversation_poems
+
+    def _hear(self, poetry: str):
+        poem_signature = signature(poetry)
+        if poem_signature is not None:
+            self.conversation_poems.add(poem_signature)
+
+    def _compose_cached(self, actual_prompt: str, cleaned_prompt_words: List[str], session_form_rules: dict, buckets: dict = None) -> str:
+        # One seed per call from the agent's generator: the poem depends only on the key, and the
+        # agent's generator advances the same way on a hit as on a miss.
+        if self.rng is random: # Unseeded: every call would draw a fresh seed and never hit, so don't fill the cache
+            counters.incr("result_cache_unseeded")
+            if cleaned_prompt_words is None:
+                cleaned_prompt_words = self._clean_prompts([actual_prompt])[0]
+            return self._compose_poem(actual_prompt, cleaned_prompt_words, session_form_rules, buckets)
+        call_seed = self.rng.getrandbits(64)
+        key = self.result_cache.key("generate", self.persona, actual_prompt, session_form_rules, call_seed,
+                                    associations=self._associations_signature())
+        poem = self.result_cache.get(key)
+        if poem is not None:
+            self.last_prompt_generated_by_me = actual_prompt
+            return poem
+        if cleaned_prompt_words is None:
+            cleaned_prompt_words = self._clean_prompts([actual_prompt])[0]
+        agent_rng, self.rng = self.rng, random.Random(call_seed)
+        try:
+            poem = self._compose_poem(actual_prompt, cleaned_prompt_words, session_form_rules, buckets)
+        finally:
+            self.rng = agent_rng
+        self.result_cache.put(key, poem)
+        return poem
+
+    def _associations_signature(self):
+        return self.word_associations.signature if self.word_associations is not None else None
+
+    def _compose_poem(self, actual_prompt: str, cleaned_prompt_words: List[str], session_form_rules: dict, buckets: dict = None) -> str:
         self.last_prompt_generated_by_me = actual_prompt
 
-        cleaned_actual_prompt = ''.join(char.lower() if char.isalnum() or char == "'" or char.isspace() else ' ' for char in actual_prompt)
-        prompt_words = [word for word in cleaned_actual_prompt.split() if len(word) > 3 and word not in self.common_words_filter]
+        prompt_words = [word for word in cleaned_prompt_words if len(word) > 3 and word not in self.common_words_filter]
         kw1 = prompt_words[0] if len(prompt_words) > 0 else "frog"
         kw2 = prompt_words[1] if len(prompt_words) > 1 else "water"
 
-        form_name = session_form_rules.get('name', "Unknown Form")
-        target_line_count = session_form_rules.get('line_count', 3)
-        target_syllables_list = session_form_rules.get('syllables', [5, 7, 5])
-
-        print(f"[{self.agent_name}] Generating for form: '{form_name}'. Target lines: {target_line_count}, Syllables: {target_syllables_list} for prompt: '{actual_prompt}'")
+        plan = form_plan(session_form_rules)
+        log_event(logger, INFO, "generating poem", agent=self.agent_name, form=plan.name, lines=len(plan.lines),
+                  syllables=list(plan.syllables), prompt=actual_prompt)
+        return "\n".join(self._generate_planned_poem(plan, actual_prompt, kw1, kw2, buckets))
+
+    @staticmethod
+    def _normalize_poems(poems: List[str]) -> List[List[str]]:
+        # Lower-cases, strips punctuation (apostrophes kept) and tokenizes every poem in one pass.
+        joined = BATCH_SEPARATOR.join(poetry.replace(BATCH_SEPARATOR, " ") for poetry in poems)
+        normalized = joined.lower().translate(PUNCTUATION_STRIP_TABLE)
+        return [chunk.split() for chunk in normalized.split(BATCH_SEPARATOR)]
+
+    def start_conversation(self):
+        """Forgets the themes and poems of the previous dialogue."""
+        self._theme_model = None
+        self._conversation_digest = None
+        self._conversation_poems = None
+
+    def resume_conversation(self, poems: Iterable[str]):
+        """Starts a conversation whose earlier turns are `poems`, oldest first (e.g. a stored dialogue's
+        `ConversationStore.iter_poems(session=...)`), so later interpretations rank themes as if it had heard them."""
+        self.start_conversation()
+        poems = iter(poems)
+        for chunk in iter(lambda: list(itertools.islice(poems, RESUME_BATCH_POEMS)), []):
+            for poetry, all_words in zip(chunk, self._normalize_poems(chunk)):
+                self._hear(poetry)
+                terms = self._significant_words(all_words)
+                if terms:
+                    self.theme_model.observe(terms)
+                self._conversation_digest = hashlib.sha256(f"{self._conversation_digest}\x1e{' '.join(terms)}".encode("utf-8")).hexdigest()
 
-        poem_lines = []
-        if form_name == "Haiku (3 lines, 5-7-5 syllables)" and PRONOUNCING_AVAILABLE:
-            for i in range(target_line_count):
-                target_syl = target_syllables_list[i] if i < len(target_syllables_list) else 0
-                line_text = self._generate_haiku_line(actual_prompt, kw1, kw2, target_syl, line_number=(i+1))
-                poem_lines.append(line_text)
-            generated_poem = "\n".join(poem_lines)
+    def interpret_poetry(self, poetry: str) -> dict:
+        with span("interpret", agent=self.agent_name):
+            self._hear(poetry)
+            if self.result_cache is not None:
+                return self._interpret_cached(poetry, None)
+            return self._interpret_words(poetry, self._normalize_poems([poetry])[0])
+
+    def interpret_poetry_batch(self, poems: List[str]) -> List[dict]:
+        """Interprets many poems in order (as successive turns of the conversation), normalizing the whole batch in a single pass."""
+        if not poems: return []
+        interpret = self._interpret_cached if self.result_cache is not None else self._interpret_words
+        with span("interpret_batch", agent=self.agent_name, poems=len(poems)):
+            for poetry in poems:
+                self._hear(poetry)
+            return [interpret(poetry, all_words) for poetry, all_words in zip(poems, self._normalize_poems(poems))]
+
+    def _interpret_cached(self, poetry: str, all_words: List[str]) -> dict:
+        # The result also depends on the conversation so far (theme model, own last prompt), so both are in the key.
+        # A hit still feeds the poem's terms to the theme model, keeping later turns identical to a miss.
+        key = self.result_cache.key("interpret", self.persona, poetry,
+                                    context=[self._conversation_digest, self.last_prompt_generated_by_me],
+                                    associations=self._associations_signature())
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            terms = cached["terms"]
+            if terms:
+                self.theme_model.observe(terms)
+            interpretation = dict(cached["interpretation"])
         else:
-            print(f"[{self.agent_name}] Warning: Form '{form_name}' not Haiku or pronouncing unavailable. Generating basic fallback.")
-            poem_lines.append(f"Prompt: {actual_prompt} ({kw1}, {kw2})")
-            poem_lines.append("Form rules not for Haiku / Or pronouncing lib missing.")
-            poem_lines.append("A simple verse instead.")
-            current_len = len(poem_lines)
-            if current_len > target_line_count:
-                poem_lines = poem_lines[:target_line_count]
-            elif current_len < target_line_count:
-                padding_needed = target_line_count - current_len
-                for _ in range(padding_needed): poem_lines.append("Line added for count.")
-            generated_poem = "\n".join(poem_lines)
-
-        return generated_poem
+            if all_words is None:
+                all_words = self._normalize_poems([poetry])[0]
+            terms = self._significant_words(all_words)
+            interpretation = self._interpret_words(poetry, all_words)
+            self.result_cache.put(key, {"interpretation": dict(interpretation), "terms": terms})
+        self._conversation_digest = hashlib.sha256(f"{self._conversation_digest}\x1e{' '.join(terms)}".encode("utf-8")).hexdigest()
+        return interpretation
 
-    def interpret_poetry(self, poetry: str) -> dict:
-        translator = str.maketrans('', '', string.punctuation.replace("'", ""))
-        normalized_poetry = poetry.lower().translate(translator)
-        all_words = normalized_poetry.split()
-        significant_words = [word for word in all_words if word not in self.common_words_filter and len(word) > 2]
+    def _significant_words(self, all_words: List[str]) -> List[str]:
+        return [word for word in all_words if word not in self.common_words_filter and len(word) > 2]
+
+    def _interpret_words(self, poetry: str, all_words: List[str]) -> dict:
+        significant_words = self._significant_words(all_words)
 
         if not significant_words:
             theme_kw1 = "mystery"
             theme_kw2 = "silence"
         else:
-            word_counts = collections.Counter(significant_words)
-            most_common = word_counts.most_common(2)
-            theme_kw1 = most_common[0][0]
-            if len(most_common) > 1:
-                theme_kw2 = most_common[1][0]
+            # Ranked by TF-IDF against the conversation so far, not just this poem's counts.
+            top_terms = self.theme_model.top_terms(significant_words, 2)
+            theme_kw1 = top_terms[0]
+            if len(top_terms) > 1:
+                theme_kw2 = top_terms[1]
             else:
-                related_fallbacks = {
-                    "stars": "sky", "dream": "sleep", "night": "day", "light": "dark",
-                    "love": "heart", "time": "eternity", "ocean": "sea", "cosmic": "universe",
-                    "robot": "future", "song": "melody", "lonely": "solitude", "space": "void"
-                }
-                theme_kw2 = related_fallbacks.get(theme_kw1, "meaning")
+                related = self.word_associations.related(theme_kw1) if self.word_associations is not None else None
+                theme_kw2 = related or RELATED_THEMES.get(theme_kw1, "meaning")
                 if theme_kw1 == theme_kw2:
                     theme_kw2 = "essence" if theme_kw1 != "essence" else "depth"
 
-        interpretation_prompt_templates = [
-            lambda kw1, kw2: f"Delve into the connection between {kw1} and {kw2}.",
-            lambda kw1, kw2: f"Imagine {kw1} as a secret held by {kw2}—what unfolds?",
-            lambda kw1, kw2: f"A reflective dialogue: {kw1} converses with {kw2}.",
-            lambda kw1, kw2: f"Explore the hidden meaning of {kw1}'s journey towards {kw2}."
-        ]
-        template_idx = (len(theme_kw1) + len(theme_kw2) + len(significant_words)) % len(interpretation_prompt_templates)
-        new_creative_prompt = interpretation_prompt_templates[template_idx](theme_kw1, theme_kw2)
+        template_idx = (len(theme_kw1) + len(theme_kw2) + len(significant_words)) % len(INTERPRETATION_TEMPLATES)
+        new_creative_prompt = INTERPRETATION_TEMPLATES[template_idx].format(kw1=theme_kw1, kw2=theme_kw2)
 
         if self.last_prompt_generated_by_me and new_creative_prompt == self.last_prompt_generated_by_me:
-            template_idx = (template_idx + 1) % len(interpretation_prompt_templates)
-            new_creative_prompt = interpretation_prompt_templates[template_idx](theme_kw1, theme_kw2)
+            template_idx = (template_idx + 1) % len(INTERPRETATION_TEMPLATES)
+            new_creative_prompt = INTERPRETATION_TEMPLATES[template_idx].format(kw1=theme_kw1, kw2=theme_kw2)
             if new_creative_prompt == self.last_prompt_generated_by_me:
                  new_creative_prompt = f"{new_creative_prompt}, from a new perspective."
 
@@ -278,33 +450,48 @@ class PoetryAgent:
                     elif words_in_line: reference_phrase = " ".join(words_in_line); break
         if reference_phrase is None: reference_phrase = ""
 
-        print(f"[{self.agent_name}] Interpreted keywords: '{theme_kw1}', '{theme_kw2}'. Ref: '{reference_phrase}'. New prompt: '{new_creative_prompt}'")
+        log_event(logger, INFO, "interpreted poem", agent=self.agent_name, keywords=f"{theme_kw1},{theme_kw2}",
+                  reference=reference_phrase, prompt=new_creative_prompt)
         return {'prompt': new_creative_prompt, 'reference': reference_phrase}
 
-    def send_message(self, recipient_id: str, message_type: str, payload: str):
-        message = {
-            "sender_id": self.agent_name, "recipient_id": recipient_id,
-            "message_type": message_type, "payload": payload,
-            "timestamp": datetime.datetime.utcnow().isoformat() + "Z"
-        }
-        filename = f"message_to_{recipient_id}.json"
-        try:
-            with open(filename, 'w') as f: json.dump(message, f, indent=4)
-            print(f"Message from {self.agent_name} sent to {recipient_id} in {filename}")
-        except IOError as e: print(f"Error writing message to file {filename}: {e}")
-
-    def receive_message(self) -> dict | None:
-        filename = f"message_to_{self.agent_name}.json"
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r') as f: message = json.load(f)
-                print(f"Message received by {self.agent_name} from {message.get('sender_id', 'unknown sender')} in {filename}")
-                try: os.remove(filename); print(f"Successfully deleted message file: {filename}")
-                except OSError as e: print(f"Error deleting message file {filename}: {e}")
-                return message
-            except json.JSONDecodeError as e: print(f"Error decoding JSON from file {filename}: {e}"); return None
-            except IOError as e: print(f"Error reading message file {filename}: {e}"); return None
-        return None
+    def _build_message(self, recipient_id: str, message_type: str, payload: Union[str, PoemPayload]) -> Message:
+        return Message(self.agent_name, recipient_id, message_type, payload) # Timestamped now, in UTC
+
+    def _log_received(self, message: Message | Dict | None) -> Message | None:
+        if message is not None:
+            if not isinstance(message, Message): # A transport that hands back plain dictionaries
+                message = Message.from_dict(message)
+            counters.incr("messages_received")
+            log_event(logger, INFO, "message received", recipient=self.agent_name,
+                      sender=message.get('sender_id', 'unknown sender'), transport=self.transport.name)
+        return message
+
+    def send_message(self, recipient_id: str, message_type: str, payload: Union[str, PoemPayload]):
+        with span("send", agent=self.agent_name, recipient=recipient_id):
+            if self.transport.send(self._build_message(recipient_id, message_type, payload)):
+                counters.incr("messages_sent")
+                log_event(logger, INFO, "message sent", sender=self.agent_name, recipient=recipient_id, transport=self.transport.name)
+
+    def receive_message(self, timeout: float = None) -> Message | None:
+        """Takes the next message. With `timeout`, blocks up to that many seconds for one to arrive."""
+        with span("receive", agent=self.agent_name):
+            if timeout is None:
+                return self._log_received(self.transport.receive(self.agent_name))
+            return self._log_received(self.transport.receive_blocking(self.agent_name, timeout))
+
+    def receive_messages(self, max_messages: int = None) -> list:
+        """Drains every waiting message (up to `max_messages`) in one call, oldest first."""
+        with span("receive", agent=self.agent_name):
+            return [self._log_received(message) for message in self.transport.receive_many(self.agent_name, max_messages)]
+
+    async def send_message_async(self, recipient_id: str, message_type: str, payload: Union[str, PoemPayload]):
+        if await self.transport.send_async(self._build_message(recipient_id, message_type, payload)):
+            counters.incr("messages_sent")
+            log_event(logger, INFO, "message sent", sender=self.agent_name, recipient=recipient_id, transport=self.transport.name)
+
+    async def receive_message_async(self, timeout: float = None) -> Message | None:
+        """Waits for the next message (up to `timeout` seconds, forever if None)."""
+        return self._log_received(await self.transport.receive_async(self.agent_name, timeout))
 
 if __name__ == '__main__':
     agent_tester = PoetryAgent(agent_name="BardTest")
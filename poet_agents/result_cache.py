@@ -0,0 +1,203 @@
+# Result Cache
+#
+# Optional memoization of `generate_poetry` and `interpret_poetry`, for replay
+# jobs that feed the same poems and prompts through the agents again and
+# again. Two tiers:
+#
+#   memory  a bounded LRU (`max_entries`) private to the process
+#   disk    one small JSON file per entry under `directory` (default:
+#           <cache dir>/results, see POET_AGENTS_CACHE_DIR), shared by every
+#           process. When the files pass `max_disk_bytes`, the least recently
+#           used are deleted. Disk hits are promoted to memory.
+#
+# Keys are SHA-256 digests of everything a result depends on: the call kind,
+# the agent persona, the input text, the form rules and a seed, plus the
+# conversation state for interpretations. A version number and the CMUdict
+# signature are included too, so results computed without `pronouncing` (or
+# by an older generator) are never served to a run that has it. Agents add
+# the identity of their word association index (its path, size and
+# modification time; see word_assoc.py) to every key, so results written with
+# one index, or with none, are never served to an agent using another.
+#
+# With a cache, an agent draws one seed per `generate_poetry` call from its
+# own generator and generates from that seed, so a seeded agent produces the
+# same poems on a hit as on a miss (though not the same poems as an uncached
+# agent with the same seed). Unseeded agents would draw a new seed on every
+# call and never hit, so they generate without the cache (counted in
+# result_cache_unseeded); interpretations are cached either way. Hits, misses and evictions are counted in `stats()`
+# and in the telemetry counters (result_cache_*).
+
+import collections
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .syllable_index import cmudict_signature, default_cache_dir
+from .telemetry import DEBUG, WARNING, counters, get_logger, log_event
+
+logger = get_logger(__name__)
+
+RESULT_CACHE_VERSION = 4 # Bump when generation or interpretation output changes
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_DISK_BYTES = 64 << 20
+DISK_EVICT_TO = 0.8 # After an eviction pass the disk tier is at most this fraction of its budget
+
+
+class ResultCache:
+    """Memory LRU in front of a size-bounded directory of JSON entries. Pass `directory=False` for memory only."""
+
+    def __init__(self, directory=None, max_entries: int = DEFAULT_MAX_ENTRIES, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.directory = None if directory is False else (directory or os.path.join(default_cache_dir(), "results"))
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.namespace = f"v{RESULT_CACHE_VERSION}:{cmudict_signature()}"
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        self._disk_bytes = self._scan_disk_bytes() if self.directory else 0
+
+    def key(self, kind: str, persona: str, text: str, form_rules: Optional[Dict] = None, seed: Optional[int] = None,
+            context: Any = None, associations: Optional[str] = None) -> str:
+        """`associations` is the signature of the word association index the result was computed with (None: no index)."""
+        material = json.dumps([self.namespace, kind, persona, text, form_rules, seed, context, associations],
+                              sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:] + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            hit = key in self._memory
+            if hit:
+                self._memory.move_to_end(key)
+                value = self._memory[key]
+        if hit:
+            self._count("memory_hits")
+            return value
+        value = self._read_disk(key) if self.directory else None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("disk_hits")
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Any):
+        self._remember(key, value)
+        self._count("stores")
+        if self.directory:
+            self._write_disk(key, value)
+
+    def _remember(self, key: str, value: Any):
+        evicted = 0
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                evicted += 1
+        for _ in range(evicted):
+            self._count("memory_evictions")
+
+    def _count(self, name: str):
+        """Callers must not hold `_lock`: it is not reentrant."""
+        with self._lock: # Counter increments are a read and a write, not atomic across threads
+            self._stats[name] += 1
+        counters.incr(f"result_cache_{name}")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path) # Recency for the disk tier's LRU eviction
+        except (OSError, ValueError):
+            return None
+        return entry.get("value") if entry.get("key") == key else None
+
+    def _write_disk(self, key: str, value: Any):
+        path = self._path(key)
+        data = json.dumps({"key": key, "value": value}, ensure_ascii=False).encode("utf-8")
+        import tempfile # Only needed once something is written
+        try:
+            replaced = os.stat(path).st_size # Overwriting an entry frees its old size
+        except OSError:
+            replaced = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path) # Atomic, so concurrent workers never read a partial entry
+        except OSError as e:
+            log_event(logger, WARNING, "could not write result cache entry", path=path, error=e)
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - replaced
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_disk_bytes(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        """Deletes least recently used entries until the disk tier is back under DISK_EVICT_TO of its budget."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * DISK_EVICT_TO
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count("disk_evictions")
+        with self._lock:
+            self._disk_bytes = total
+        log_event(logger, DEBUG, "result cache disk eviction", directory=self.directory, bytes=total)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit, miss, store and eviction counts for this cache, plus the overall hit rate."""
+        with self._lock:
+            stats = {name: self._stats[name] for name in ("memory_hits", "disk_hits", "misses", "stores",
+                                                          "memory_evictions", "disk_evictions")}
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self._memory)
+        stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def clear(self):
+        """Empties the memory tier only; delete the directory to drop the disk tier."""
+        with self._lock:
+            self._memory.clear()
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_result_cache(directory=None) -> ResultCache:
+    """Returns this process's cache for `directory`, creating it on first call (one memory tier per directory)."""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(directory)
+        if cache is None:
+            cache = _shared_caches[directory] = ResultCache(directory)
+        return cache
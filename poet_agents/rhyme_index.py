@@ -0,0 +1,216 @@
+# Rhyme-Class Index with Metrical Line Endings
+#
+# Groups CMUdict words by rhyming part (the phones from the last stressed vowel
+# to the end of the word, stress digits removed: "light" and "night" share
+# "AY T"). The grouping is built once, cached on disk next to the syllable
+# index, loaded lazily and shared by every agent, so rhymed and metered forms
+# pick their line endings with plain dictionary lookups instead of scanning the
+# dictionary with `pronouncing.rhymes()` for every line.
+#
+# For rising meters the whole stress pattern of an ending word ("reason" ->
+# "10", from the syllable index) must fit the last feet of the line: iambic
+# lines end "...0101", so "delight" ("01") fits and "reason" does not;
+# anapestic lines end "...001001". A '2' (secondary stress) fits either kind of
+# position. The endings of each rhyming part are filtered once per meter and
+# then reused.
+#
+# Only real vocabulary ends a line: CMUdict also spells out acronyms ("abc",
+# "122"), initialisms and surnames, so endings are limited to the common words
+# in vocabulary.py and the personas' own words, and a word stressed on more
+# than one of its (at most MAX_ENDING_SYLLABLES) syllables is left out.
+
+import functools
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .backends import load_backend
+from .syllable_index import (INDEX_FORMAT_VERSION, SyllableIndex, cmudict_signature, get_syllable_index,
+                             read_cached_table, write_cached_table)
+from .tracing import span
+
+RHYME_INDEX_FILENAME = f"rhyme_index_v{INDEX_FORMAT_VERSION}.pkl"
+
+MAX_ENDING_SYLLABLES = 3  # Longer words are never offered as line endings
+METER_FEET = {"iambic": "01", "anapestic": "001"} # Rising meters: the line's last syllable is stressed
+ANCHOR_FOOT = METER_FEET["iambic"] # Free rhymed forms still anchor groups on words ending on a stress
+MIN_ANCHOR_ENDINGS = 8
+
+
+def rhyming_part(phones: str) -> str:
+    """Phones from the last stressed vowel (or the last vowel, if none is stressed), digits removed."""
+    phone_list = phones.split()
+    start = None
+    for i in range(len(phone_list) - 1, -1, -1):
+        if phone_list[i][-1] in "12":
+            start = i
+            break
+    if start is None:
+        for i in range(len(phone_list) - 1, -1, -1):
+            if phone_list[i][-1].isdigit():
+                start = i
+                break
+    if start is None:
+        return phones
+    return " ".join(phone.rstrip("012") for phone in phone_list[start:])
+
+
+def build_rhyme_table() -> Dict[str, str]:
+    """Builds the word -> rhyming-part table from CMUdict (first pronunciation of plain alphabetic words)."""
+    pronouncing = load_backend("pronouncing")
+    if pronouncing is None:
+        return {}
+    pronouncing.init_cmu()
+    table = {}
+    for word, phones in pronouncing.pronunciations:
+        if word not in table and word.isalpha() and len(word) > 1:
+            table[word] = rhyming_part(phones)
+    return table
+
+
+def expand_rhyme_scheme(scheme: str, line_count: int) -> List[int]:
+    """Turns a scheme such as "ABAB CDCD EFEF GG" or "ABA BCB CDC..." into one rhyme group per line.
+
+    Spaces mark stanzas. A trailing "..." continues the chain using the shift
+    between the first two stanzas (terza rima: ABA BCB -> CDC DED ...). A
+    scheme shorter than `line_count` without "..." repeats its stanza shape
+    with fresh rhyme groups (ballad ABCB -> DEFE). Groups are returned as
+    integers so chains can run past 'Z'.
+    """
+    chained = scheme.rstrip().endswith("...")
+    stanzas = [stanza for stanza in scheme.replace("...", " ").upper().split() if stanza]
+    if not stanzas:
+        return list(range(line_count))  # No scheme: every line is its own (unrhymed) group
+
+    groups = [ord(letter) - ord("A") for stanza in stanzas for letter in stanza]
+    if chained and len(stanzas) >= 2:
+        shape = [ord(letter) - ord("A") for letter in stanzas[-1]]
+        shift = (ord(stanzas[1][0]) - ord(stanzas[0][0])) or 1
+    else:
+        shape = list(groups)
+        shift = max(shape) + 1
+    step = 1
+    while len(groups) < line_count:
+        groups.extend(group + step * shift for group in shape)
+        step += 1
+    return groups[:line_count]
+
+
+def ending_foot(session_form_rules: dict) -> Optional[str]:
+    """The foot line endings must fit ("01" for iambic lines), or None for meters that leave endings free."""
+    meter = (session_form_rules.get("meter") or "").lower()
+    for name, foot in METER_FEET.items():
+        if meter.startswith(name):
+            return foot
+    return None
+
+
+@functools.lru_cache(maxsize=1024) # Few distinct patterns: endings have at most MAX_ENDING_SYLLABLES syllables
+def fits_foot(stress: str, foot: str) -> bool:
+    """Whether a word with this stress pattern can end a line of repeated `foot`s."""
+    slots = foot * (len(stress) // len(foot) + 1)
+    return all(mark == "2" or (mark == "0") == (slot == "0") for mark, slot in zip(stress, slots[-len(stress):]))
+
+
+class RhymeIndex:
+    """Lazily loaded rhyme classes and metrical line endings shared across agents."""
+
+    def __init__(self, syllable_index: Optional[SyllableIndex] = None, cache_dir: Optional[str] = None):
+        self.syllable_index = syllable_index if syllable_index is not None else get_syllable_index()
+        self.cache_dir = cache_dir if cache_dir is not None else self.syllable_index.cache_dir
+        self._parts = None  # word -> rhyming part
+        self._endings = {}  # rhyming part -> short words usable as line endings, stressed endings first
+        self._metered = {}  # (rhyming part, foot) -> the endings that fit the foot
+        self._ending_stresses = {}  # rhyming part -> {stress pattern: number of endings}
+        self._anchor_parts = {}  # foot -> rhyming parts with enough fitting endings to anchor a rhyme group
+        self._load_lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, RHYME_INDEX_FILENAME)
+
+    def _load(self) -> Dict[str, str]:
+        with self._load_lock, span("rhyme_index_load"):
+            if self._parts is not None:
+                return self._parts
+            signature = cmudict_signature()
+            if signature is None:
+                parts = {}  # Degraded mode: no rhyme information at all
+            else:
+                parts = read_cached_table(self.path, signature)
+                if parts is None:
+                    parts = build_rhyme_table()
+                    write_cached_table(self.path, signature, parts)
+
+            from .lexicon import PERSONA_VOCABULARY # Only needed to build the endings, like the word list
+            from .vocabulary import COMMON_WORDS
+            vocabulary = COMMON_WORDS.union(*PERSONA_VOCABULARY.values())
+            stresses = self.syllable_index.stress_table()
+            endings, ending_stresses = {}, {}
+            for word, part in parts.items():
+                stress = stresses.get(word)
+                if (stress and len(stress) <= MAX_ENDING_SYLLABLES and word in vocabulary
+                        and len(stress) - stress.count("0") == 1):
+                    endings.setdefault(part, ([], []))[stress[-1] not in "12"].append(word)
+                    counts = ending_stresses.setdefault(part, {})
+                    counts[stress] = counts.get(stress, 0) + 1
+            self._endings = {part: tuple(stressed + unstressed) for part, (stressed, unstressed) in endings.items()}
+            self._ending_stresses = ending_stresses
+            self._parts = parts
+            return parts
+
+    @property
+    def available(self) -> bool:
+        parts = self._parts if self._parts is not None else self._load()
+        return bool(parts)
+
+    def rhyme_part(self, word: str) -> Optional[str]:
+        parts = self._parts if self._parts is not None else self._load()
+        return parts.get(word.lower())
+
+    def endings(self, part: str, foot: Optional[str] = None) -> Tuple[str, ...]:
+        """Short words (<= MAX_ENDING_SYLLABLES) with the given rhyming part; with `foot`, only those that fit it."""
+        if self._parts is None:
+            self._load()
+        words = self._endings.get(part, ())
+        if foot is None:
+            return words
+        metered = self._metered.get((part, foot))
+        if metered is None:
+            stresses = self.syllable_index.stress_table() # Every ending has a known stress pattern
+            metered = self._metered[(part, foot)] = tuple(word for word in words if fits_foot(stresses[word], foot))
+        return metered
+
+    def random_anchor_part(self, rng=None, exclude=(), foot: str = ANCHOR_FOOT) -> Optional[str]:
+        """A rhyming part with plenty of endings that fit `foot`, for rhyme groups with no natural anchor word."""
+        if self._parts is None:
+            self._load()
+        rng = rng or random
+        candidates = self._anchor_parts.get(foot)
+        if candidates is None:
+            candidates = self._anchor_parts[foot] = tuple(sorted(
+                part for part, counts in self._ending_stresses.items()
+                if len(self._endings[part]) >= MIN_ANCHOR_ENDINGS # Most parts are ruled out before looking at stresses
+                and sum(count for stress, count in counts.items() if fits_foot(stress, foot)) >= MIN_ANCHOR_ENDINGS))
+        for _ in range(8):  # Bounded: collisions with `exclude` are rare
+            if not candidates:
+                return None
+            part = rng.choice(candidates)
+            if part not in exclude:
+                return part
+        return None
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_rhyme_index() -> RhymeIndex:
+    """Returns the process-wide rhyme index, creating it (but not loading it) on first call."""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = RhymeIndex()
+    return _shared_index
@@ -0,0 +1,208 @@
+# Turn Scheduler
+#
+# Runs a dialogue between any number of agents for any number of rounds,
+# driven entirely by a `DialogueConfig` (no prompts). The turn order is either
+# round-robin over `agents` or a custom `order` (a list of agent names, which
+# may repeat or skip agents) that is played once per round. The first speaker
+# opens from the title prompt; every later speaker receives the previous
+# poem, interprets it and answers, and its poem is sent on to whoever speaks
+# next.
+#
+# `TurnScheduler` is a small state machine. Each `step()` performs one
+# transition:
+#
+#   OPEN     first speaker writes from the title prompt         -> SEND
+#   RECEIVE  speaker takes its message (with a timeout)         -> COMPOSE / DONE
+#   COMPOSE  speaker interprets it and writes its poem          -> SEND
+#   SEND     poem goes to the next speaker                      -> RECEIVE / DONE
+#
+# `run()` plays whole turns with `run_turn()` (each timed as a "turn" span
+# when tracing is on) until DONE. Callers can also interleave `step()` across
+# many schedulers themselves.
+#
+# Completed turns are handed to a background writer thread that feeds the
+# transcript sinks (files, console). Turn N's transcript is formatted and
+# written while the scheduler already receives and interprets turn N+1.
+
+import queue
+import random
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from .dedup import NearDuplicateIndex
+from .forms import DEFAULT_FORM, FORM_RULES
+from .lexicon import OPENING_PROMPTS
+from .poetry_agent import PoetryAgent
+from .result_cache import ResultCache
+from .telemetry import ERROR, WARNING, get_logger, log_event
+from .tracing import span
+from .transcript import TranscriptSink
+from .transport import Transport
+
+logger = get_logger(__name__)
+
+ROUND_ROBIN = "round_robin"
+
+OPEN, RECEIVE, COMPOSE, SEND, DONE = "open", "receive", "compose", "send", "done"
+
+
+class DialogueConfig:
+    """Everything a dialogue needs. `rounds` is the number of times the turn order is played."""
+
+    def __init__(self, form: str = DEFAULT_FORM, rounds: int = 2, agents: Sequence[str] = ("alpha", "beta"),
+                 order=ROUND_ROBIN, seed: Optional[int] = None, title_prompt: Optional[str] = None,
+                 prompts: Optional[Sequence[str]] = None, receive_timeout: Optional[float] = 5.0,
+                 message_dir: Optional[str] = None, transport: Optional[Transport] = None,
+                 result_cache: Optional[ResultCache] = None, duplicate_index: Optional[NearDuplicateIndex] = None):
+        if form not in FORM_RULES:
+            raise ValueError(f"unknown form {form!r}; choose from {', '.join(sorted(FORM_RULES))}")
+        if rounds < 1:
+            raise ValueError("rounds must be at least 1")
+        self.form = form
+        self.rounds = rounds
+        self.agents = list(agents)
+        if not self.agents or len(set(self.agents)) != len(self.agents):
+            raise ValueError("agents must be a non-empty list of distinct names")
+        self.order = list(self.agents) if order == ROUND_ROBIN else list(order)
+        unknown = [name for name in self.order if name not in self.agents]
+        if not self.order or unknown:
+            raise ValueError(f"turn order must be non-empty and only name configured agents (unknown: {unknown})")
+        self.seed = seed
+        self.title_prompt = title_prompt
+        self.prompts = list(prompts) if prompts else None
+        self.receive_timeout = receive_timeout
+        self.message_dir = message_dir
+        self.transport = transport
+        self.result_cache = result_cache
+        self.duplicate_index = duplicate_index # Shared across dialogues; each agent also checks its own conversation
+
+    @property
+    def rules(self) -> dict:
+        return FORM_RULES[self.form]
+
+    def turn_order(self) -> List[str]:
+        return self.order * self.rounds
+
+
+class _TranscriptWriter:
+    """Writes finished turns to the sinks on a background thread, in order."""
+
+    def __init__(self, sinks: Sequence[TranscriptSink]):
+        self.sinks = list(sinks)
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            method, args, kwargs = item
+            if self._error is not None:
+                continue
+            try:
+                with span("render", record=method):
+                    for sink in self.sinks:
+                        getattr(sink, method)(*args, **kwargs)
+            except Exception as e: # Surfaced by close(); the dialogue itself keeps going
+                self._error = e
+                log_event(logger, ERROR, "transcript write failed", error=e)
+
+    def submit(self, method: str, *args, **kwargs):
+        self._queue.put((method, args, kwargs))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class TurnScheduler:
+    """Runs one dialogue described by a `DialogueConfig`; the result is in `conversation_log`."""
+
+    def __init__(self, config: DialogueConfig, sinks: Sequence[TranscriptSink] = ()):
+        self.config = config
+        # Same derivation as the session runner: the seed picks the title, then each agent's seed in order.
+        rng = random.Random(config.seed)
+        self.title_prompt = config.title_prompt or rng.choice(config.prompts or OPENING_PROMPTS)
+        agent_kwargs = {"transport": config.transport} if config.transport is not None else {"message_dir": config.message_dir}
+        self.agents: Dict[str, PoetryAgent] = {
+            name: PoetryAgent(agent_name=name, seed=rng.getrandbits(32) if config.seed is not None else None,
+                              result_cache=config.result_cache, duplicate_index=config.duplicate_index, **agent_kwargs)
+            for name in config.agents
+        }
+        self.turns = config.turn_order()
+        self.turn = 0
+        self.state = OPEN
+        self.conversation_log = []
+        self._received = None
+        self._poem = None
+        self._writer = _TranscriptWriter(sinks) if sinks else None
+        if self._writer:
+            self._writer.submit("begin", self.title_prompt, form=config.form, rounds=config.rounds, agents=",".join(config.agents))
+
+    @property
+    def speaker(self) -> PoetryAgent:
+        return self.agents[self.turns[self.turn]]
+
+    def _record(self, poem: str, prompt: str):
+        entry = {'agent': self.speaker.agent_name, 'poem': poem, 'prompt': prompt}
+        self.conversation_log.append(entry)
+        if self._writer:
+            self._writer.submit("write_turn", entry)
+        self._poem = poem
+
+    def step(self) -> str:
+        """Performs one state transition and returns the new state."""
+        if self.state == OPEN:
+            poem = self.speaker.generate_poetry({'prompt': self.title_prompt, 'reference': None}, self.config.rules)
+            self._record(poem, self.title_prompt)
+            self.state = SEND
+        elif self.state == RECEIVE:
+            self._received = self.speaker.receive_message(timeout=self.config.receive_timeout)
+            if not self._received:
+                log_event(logger, WARNING, "dialogue ended early: no message", agent=self.speaker.agent_name, turn=self.turn + 1)
+                self.state = DONE
+            else:
+                self.state = COMPOSE
+        elif self.state == COMPOSE:
+            interpretation = self.speaker.interpret_poetry(self._received.text)
+            self._record(self.speaker.generate_poetry(interpretation, self.config.rules), interpretation['prompt'])
+            self._received = None
+            self.state = SEND
+        elif self.state == SEND:
+            if self.turn + 1 >= len(self.turns):
+                self.state = DONE
+            else:
+                recipient = self.turns[self.turn + 1]
+                self.speaker.send_message(recipient_id=recipient, message_type="initial_poem" if self.turn == 0 else "response_poem",
+                                          payload=self._poem)
+                self.turn += 1
+                self.state = RECEIVE
+        return self.state
+
+    def run_turn(self) -> str:
+        """Steps through one speaker's turn (receive, compose and send, or the opening poem) and returns the new state."""
+        with span("turn", turn=self.turn + 1, agent=self.turns[self.turn]):
+            self.step()
+            while self.state not in (RECEIVE, DONE):
+                self.step()
+        return self.state
+
+    def run(self) -> List[Dict]:
+        try:
+            while self.state != DONE:
+                self.run_turn()
+        finally:
+            self.close()
+        return self.conversation_log
+
+    def close(self):
+        """Waits for the transcript writer to finish the turns already handed to it."""
+        if self._writer:
+            writer, self._writer = self._writer, None
+            writer.submit("end")
+            writer.close()
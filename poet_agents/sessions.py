@@ -0,0 +1,293 @@
+# Non-Interactive Dialogue Sessions
+#
+# `run_dialogue` runs one complete Alpha/Beta exchange without prompting: Alpha
+# writes the opening poem from a seeded initial prompt, then the two agents take
+# turns receiving, interpreting and answering until each has written `rounds`
+# poems. Every session gets its own message directory, so any number of
+# sessions can share a filesystem without clobbering each other's
+# `message_to_<id>.json` files, and its own seed, so a session is reproducible
+# from (session_id, base_seed) alone.
+#
+# `run_dialogue_async` runs the same dialogue over an in-process asyncio queue
+# transport; `run_dialogues_concurrently` runs many of them on one event loop.
+#
+# `run_sessions` fans N sessions out over a process pool and collects their
+# conversation logs, optionally appending them to a JSON Lines file. Sessions
+# are independent and CPU-bound, so throughput scales with the worker count.
+#
+# With `transcript_path`, each finished session is also streamed to a
+# transcript sink (see transcript.py) chosen by extension: .jsonl, .html, .txt,
+# or .sqlite / .db for an indexed conversation store (conversation_store.py).
+# With `result_cache_dir`, every worker memoizes generation and interpretation
+# in a shared on-disk result cache (see result_cache.py), so re-running a
+# corpus is mostly cache reads.
+# With `global_dedup=True`, every worker shares one near-duplicate index (see
+# dedup.py) across its sessions, on top of each agent's per-conversation check.
+# With `trace=True`, every worker records timing spans (see tracing.py) and
+# ships them back with its results, so the parent's tracer holds one trace
+# covering all worker processes.
+#
+# Command line:
+#   python -m poet_agents.sessions --sessions 1000 --workers 8 --form haiku --rounds 2 --output corpus.jsonl
+#   python -m poet_agents.sessions --sessions 1000 --transcript corpus.html
+#   python -m poet_agents.sessions --sessions 100000 --transcript archive.sqlite
+#   python -m poet_agents.sessions --sessions 100 --trace sessions_trace.json
+#   python -m poet_agents.sessions --sessions 1000 --result-cache   (run twice: the second run is mostly hits)
+
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .dedup import NearDuplicateIndex, get_duplicate_index
+from .forms import DEFAULT_FORM, FORM_RULES
+from .lexicon import OPENING_PROMPTS
+from .message_structure import Message
+from .poetry_agent import PoetryAgent
+from .result_cache import ResultCache, get_result_cache
+from .rhyme_index import get_rhyme_index
+from .scheduler import DialogueConfig, TurnScheduler
+from .syllable_index import get_syllable_index
+from .telemetry import WARNING, configure_logging, counters, get_logger, log_event
+from .tracing import tracer
+from .transcript import open_transcript
+from .transport import AsyncQueueTransport, Transport
+
+logger = get_logger(__name__)
+
+ALPHA_INITIAL_PROMPTS_LIST = list(OPENING_PROMPTS)
+
+
+def session_seed(base_seed: int, session_id: int) -> int:
+    """Deterministic per-session seed; independent of which worker runs the session."""
+    return (base_seed * 1_000_003 + session_id) & 0xFFFFFFFF
+
+
+def _start_dialogue(session_id: int, form_key: str, seed: Optional[int], **agent_kwargs):
+    if seed is None:
+        seed = session_seed(0, session_id)
+    rng = random.Random(seed)
+    title_prompt = rng.choice(ALPHA_INITIAL_PROMPTS_LIST)
+    agent_alpha = PoetryAgent(agent_name="alpha", seed=rng.getrandbits(32), **agent_kwargs)
+    agent_beta = PoetryAgent(agent_name="beta", seed=rng.getrandbits(32), **agent_kwargs)
+    return seed, FORM_RULES.get(form_key, FORM_RULES[DEFAULT_FORM]), title_prompt, agent_alpha, agent_beta
+
+
+def _respond(speaker: PoetryAgent, received: Message, session_rules: dict, conversation_log: list) -> str:
+    interpretation = speaker.interpret_poetry(received.text)
+    poem = speaker.generate_poetry(interpretation, session_rules)
+    conversation_log.append({'agent': speaker.agent_name, 'poem': poem, 'prompt': interpretation['prompt']})
+    return poem
+
+
+def _session_result(session_id, seed, form_key, rounds, title_prompt, conversation_log, started) -> Dict:
+    return {
+        "session_id": session_id,
+        "seed": seed,
+        "form": form_key,
+        "rounds": rounds,
+        "title_prompt": title_prompt,
+        "conversation": conversation_log,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def run_dialogue(session_id: int, form_key: str = DEFAULT_FORM, rounds: int = 2, seed: Optional[int] = None,
+                 message_dir: Optional[str] = None, receive_timeout: Optional[float] = 5.0,
+                 result_cache: Optional[ResultCache] = None, duplicate_index: Optional[NearDuplicateIndex] = None) -> Dict:
+    """Runs one unattended Alpha/Beta dialogue over the file transport and returns its conversation log.
+
+    Messages go through `message_dir` (a fresh temporary directory, removed
+    afterwards, when not given). Each agent gets its own random generator
+    derived from `seed`, so the session is reproducible.
+    """
+    owns_dir = message_dir is None
+    if owns_dir:
+        message_dir = tempfile.mkdtemp(prefix=f"poet_session_{session_id}_")
+    else:
+        os.makedirs(message_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    if seed is None:
+        seed = session_seed(0, session_id)
+    if form_key not in FORM_RULES:
+        form_key = DEFAULT_FORM
+    try:
+        scheduler = TurnScheduler(DialogueConfig(form=form_key, rounds=rounds, seed=seed, prompts=ALPHA_INITIAL_PROMPTS_LIST,
+                                                 receive_timeout=receive_timeout, message_dir=message_dir,
+                                                 result_cache=result_cache, duplicate_index=duplicate_index))
+        title_prompt = scheduler.title_prompt
+        conversation_log = scheduler.run()
+    finally:
+        if owns_dir:
+            shutil.rmtree(message_dir, ignore_errors=True)
+
+    return _session_result(session_id, seed, form_key, rounds, title_prompt, conversation_log, started)
+
+
+async def run_dialogue_async(session_id: int, form_key: str = DEFAULT_FORM, rounds: int = 2, seed: Optional[int] = None,
+                             transport: Optional[Transport] = None, receive_timeout: Optional[float] = 5.0) -> Dict:
+    """Same dialogue as `run_dialogue`, with each agent running as its own task and awaiting its messages.
+
+    Uses a private `AsyncQueueTransport` unless `transport` is given. With the
+    same seed it produces the same conversation as `run_dialogue`.
+    """
+    transport = transport if transport is not None else AsyncQueueTransport()
+    started = time.perf_counter()
+    seed, session_rules, title_prompt, agent_alpha, agent_beta = _start_dialogue(session_id, form_key, seed, transport=transport)
+    conversation_log = []
+    total_poems = 2 * rounds
+
+    async def agent_loop(agent: PoetryAgent, partner: PoetryAgent, opens: bool):
+        turns = rounds
+        if opens:
+            poem = agent.generate_poetry({'prompt': title_prompt, 'reference': None}, session_rules)
+            conversation_log.append({'agent': agent.agent_name, 'poem': poem, 'prompt': title_prompt})
+            await agent.send_message_async(recipient_id=partner.agent_name, message_type="initial_poem", payload=poem)
+            turns -= 1
+        for _ in range(turns):
+            received = await agent.receive_message_async(timeout=receive_timeout)
+            if not received:
+                log_event(logger, WARNING, "session ended early: no message", session=session_id, agent=agent.agent_name)
+                return
+            poem = _respond(agent, received, session_rules, conversation_log)
+            if len(conversation_log) < total_poems:
+                await agent.send_message_async(recipient_id=partner.agent_name, message_type="response_poem", payload=poem)
+
+    import asyncio # Deferred: only the async runners need it, and it is slow to import
+    await asyncio.gather(agent_loop(agent_alpha, agent_beta, opens=True), agent_loop(agent_beta, agent_alpha, opens=False))
+    return _session_result(session_id, seed, form_key, rounds, title_prompt, conversation_log, started)
+
+
+async def run_dialogues_concurrently(num_sessions: int, form_key: str = DEFAULT_FORM, rounds: int = 2,
+                                     base_seed: int = 0) -> List[Dict]:
+    """Runs many dialogues at once on the current event loop, each with its own queue transport."""
+    import asyncio
+    return list(await asyncio.gather(*(run_dialogue_async(session_id, form_key, rounds, session_seed(base_seed, session_id))
+                                       for session_id in range(num_sessions))))
+
+
+def _warm_worker():
+    # Load the shared indexes once per worker process instead of inside the first session.
+    get_syllable_index().syllables("warm")
+    get_rhyme_index().available
+
+
+def _run_dialogue_task(task: tuple) -> Dict:
+    session_id, form_key, rounds, seed, root_dir, trace, result_cache_dir, global_dedup = task
+    message_dir = os.path.join(root_dir, f"session_{session_id:06d}")
+    result_cache = get_result_cache(result_cache_dir or None) if result_cache_dir is not None else None
+    duplicate_index = get_duplicate_index() if global_dedup else None
+    if trace:
+        tracer.start()
+    try:
+        result = run_dialogue(session_id, form_key, rounds, seed, message_dir, result_cache=result_cache,
+                              duplicate_index=duplicate_index)
+    finally:
+        shutil.rmtree(message_dir, ignore_errors=True)
+    if trace:
+        result["trace"] = tracer.drain() # Collected by run_sessions, never written out
+    return result
+
+
+def run_sessions(num_sessions: int, form_key: str = DEFAULT_FORM, rounds: int = 2, base_seed: int = 0,
+                 workers: Optional[int] = None, root_dir: Optional[str] = None,
+                 output_path: Optional[str] = None, transcript_path: Optional[str] = None,
+                 trace: bool = False, result_cache_dir: Optional[str] = None, global_dedup: bool = False) -> List[Dict]:
+    """Runs `num_sessions` independent dialogues across a process pool.
+
+    Results are returned in session order. With `output_path`, each log is
+    also appended to that file as one JSON line as soon as it arrives; with
+    `transcript_path`, each session is streamed to a transcript as it arrives.
+    `workers=1` runs everything in-process (handy for debugging). With
+    `trace`, the workers' timing spans are merged into `tracing.tracer`.
+    `result_cache_dir` enables the result cache in that directory ("" for
+    the default one). With `global_dedup`, agents also avoid echoing poems
+    from earlier sessions run by the same worker process, so a session's
+    poems then depend on which sessions that worker ran before it.
+    """
+    workers = workers or os.cpu_count() or 1
+    owns_root = root_dir is None
+    if owns_root:
+        root_dir = tempfile.mkdtemp(prefix="poet_sessions_")
+    tasks = [(session_id, form_key, rounds, session_seed(base_seed, session_id), root_dir, trace, result_cache_dir, global_dedup)
+             for session_id in range(num_sessions)]
+
+    results = []
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+    transcript = open_transcript(transcript_path) if transcript_path else None
+    try:
+        if workers == 1:
+            _warm_worker()
+            outcomes = map(_run_dialogue_task, tasks)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+            chunksize = max(1, num_sessions // (workers * 4))
+            outcomes = executor.map(_run_dialogue_task, tasks, chunksize=chunksize)
+        try:
+            for result in outcomes:
+                if "trace" in result:
+                    tracer.merge(*result.pop("trace"))
+                results.append(result)
+                if output:
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                if transcript:
+                    transcript.begin(result["title_prompt"], session_id=result["session_id"], seed=result["seed"], form=result["form"])
+                    for entry in result["conversation"]:
+                        transcript.write_turn(entry)
+                    transcript.end()
+        finally:
+            if executor:
+                executor.shutdown()
+    finally:
+        if output:
+            output.close()
+        if transcript:
+            transcript.close()
+        if owns_root:
+            shutil.rmtree(root_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run many independent Alpha/Beta dialogues across a process pool.")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of independent sessions.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--form", default=DEFAULT_FORM, choices=sorted(FORM_RULES), help="Poetic form for every session.")
+    parser.add_argument("--rounds", type=int, default=2, help="Poems per agent in each session.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; session i uses a seed derived from (seed, i).")
+    parser.add_argument("--output", default=None, help="Append conversation logs to this JSON Lines file.")
+    parser.add_argument("--transcript", default=None, help="Stream transcripts to this .jsonl, .html or .txt file, or a .sqlite conversation store.")
+    parser.add_argument("--result-cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="Memoize generation and interpretation on disk (default directory if DIR is omitted).")
+    parser.add_argument("--global-dedup", action="store_true",
+                        help="Also reject poems that echo earlier sessions in the same worker (not reproducible per session).")
+    parser.add_argument("--trace", default=None, help="Record timing spans in every worker and write a Chrome trace to this file.")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    started = time.perf_counter()
+    results = run_sessions(args.sessions, args.form, max(1, args.rounds), args.seed, args.workers,
+                           output_path=args.output, transcript_path=args.transcript, trace=bool(args.trace),
+                           result_cache_dir=args.result_cache, global_dedup=args.global_dedup)
+    elapsed = time.perf_counter() - started
+    poems = sum(len(result["conversation"]) for result in results)
+    print(f"Ran {len(results)} sessions ({poems} poems) in {elapsed:.2f}s "
+          f"({len(results) / elapsed if elapsed else 0:.1f} sessions/s, workers={args.workers or os.cpu_count()}).")
+    if args.workers == 1:
+        print(counters.summary())
+    if args.trace:
+        tracer.export_chrome(args.trace)
+        print(tracer.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+# Syllable / Stress Index
+#
+# A word -> stress-pattern table built once from the CMU Pronouncing Dictionary
+# (via the optional `pronouncing` library) and stored on disk as a compact
+# pickle. The syllable count of a dictionary word is simply the length of its
+# stress pattern (e.g. "reason" -> "10" -> 2 syllables), so one string per word
+# is all that needs to be kept.
+#
+# The table is loaded lazily on the first lookup and shared by every agent in
+# the process through `get_syllable_index()`. Words that are not in CMUdict
+# fall back to the vowel-group heuristic; their results are cached in-process
+# so that each distinct word is only ever estimated once.
+#
+# For bulk scoring (whole poem archives), `estimate_syllables_batch` and
+# `SyllableIndex.syllables_many` apply the same heuristic to a list of words
+# at once. With the optional NumPy backend the words are packed into a padded
+# code-point matrix (sorted by length, in chunks of at most
+# BATCH_CHUNK_CELLS characters) and vowel-run starts and the silent-'e' rule
+# become array operations; the counts are identical to `estimate_syllables`.
+# Without NumPy, or for short lists, the scalar loop is used.
+
+import os
+import string
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .backends import load_backend
+from .telemetry import TRACE, WARNING, counters, get_logger, log_event
+from .tracing import span
+
+logger = get_logger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+INDEX_FILENAME = f"syllable_index_v{INDEX_FORMAT_VERSION}.pkl"
+CACHE_DIR_ENV_VAR = "POET_AGENTS_CACHE_DIR"
+
+VOWELS = "aeiouy"
+BATCH_MIN_WORDS = 64 # Below this the scalar loop beats building arrays
+BATCH_CHUNK_CELLS = 1 << 22 # Upper bound on one padded character matrix (rows x width)
+
+
+def default_cache_dir() -> str:
+    """Directory holding the on-disk index (overridable with POET_AGENTS_CACHE_DIR)."""
+    override = os.environ.get(CACHE_DIR_ENV_VAR)
+    if override:
+        return override
+    return os.path.join(os.path.expanduser("~"), ".cache", "poet_agents")
+
+
+def normalize_word(word: str) -> str:
+    """Lower-cases a word and strips surrounding punctuation, as CMUdict keys are stored."""
+    return word.lower().strip(string.punctuation)
+
+
+def estimate_syllables(cleaned_word: str) -> int:
+    """Vowel-group heuristic for words that are not in CMUdict.
+
+    Counts runs of vowels (including 'y') and drops a trailing silent 'e'
+    ("stone" -> 1) unless the word ends in a consonant + "le" ("gentle" -> 2).
+    Expects an already normalized word.
+    """
+    if not cleaned_word:
+        return 0
+    num_vowels = 0
+    last_char_was_vowel = False
+    for char_val in cleaned_word:
+        is_vowel = char_val in VOWELS
+        if is_vowel and not last_char_was_vowel:
+            num_vowels += 1
+        last_char_was_vowel = is_vowel
+
+    if (len(cleaned_word) > 2 and cleaned_word.endswith("e") and not cleaned_word.endswith("le")
+            and num_vowels > 1 and cleaned_word[-2] not in VOWELS):
+        num_vowels -= 1
+    return max(1, num_vowels)
+
+
+def _estimate_chunk(np, words, lengths):
+    """Vectorized `estimate_syllables` for an object array of words, shortest first, and their lengths."""
+    width = max(1, int(lengths[-1]))
+    codes = words.astype(f"<U{width}").view(np.uint32).reshape(len(words), width)
+    is_vowel_code = np.zeros(128, dtype=bool) # ASCII lookup; clipping maps every code >= 127 to a non-vowel
+    is_vowel_code[[ord(char) for char in VOWELS]] = True
+    is_vowel = is_vowel_code.take(codes, mode="clip")
+    run_starts = is_vowel.copy()
+    run_starts[:, 1:] &= ~is_vowel[:, :-1]
+    num_vowels = run_starts.sum(axis=1)
+
+    rows = np.arange(len(words))
+    last = codes[rows, np.maximum(lengths - 1, 0)]
+    before_last = codes[rows, np.maximum(lengths - 2, 0)]
+    silent_e = ((lengths > 2) & (last == ord("e")) & (before_last != ord("l")) & (num_vowels > 1)
+                & ~is_vowel_code.take(before_last, mode="clip"))
+    counts = np.maximum(num_vowels - silent_e, 1)
+    counts[lengths == 0] = 0
+    return counts
+
+
+def estimate_syllables_batch(cleaned_words: Sequence[str]) -> List[int]:
+    """`estimate_syllables` for a whole list of normalized words, vectorized with NumPy when it is installed."""
+    words = cleaned_words if isinstance(cleaned_words, list) else list(cleaned_words)
+    if len(words) < BATCH_MIN_WORDS:
+        return [estimate_syllables(word) for word in words]
+    np = load_backend("numpy")
+    if np is None:
+        return [estimate_syllables(word) for word in words]
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    order = np.argsort(lengths) # Similar lengths share a chunk, so little padding is wasted
+    word_array = np.array(words, dtype=object)
+    sorted_lengths = lengths[order]
+    counts = np.empty(len(words), dtype=np.int64)
+    start = 0
+    while start < len(words):
+        # Lengths ascend, so the chunk's last word sets its width; shrinking the chunk never widens it.
+        end = min(len(words), start + BATCH_CHUNK_CELLS // max(1, int(sorted_lengths[start])))
+        end = start + max(1, min(end - start, BATCH_CHUNK_CELLS // max(1, int(sorted_lengths[end - 1]))))
+        chunk = order[start:end]
+        counts[chunk] = _estimate_chunk(np, word_array[chunk], sorted_lengths[start:end])
+        start = end
+    return counts.tolist()
+
+
+def _stress_pattern(phones: str) -> str:
+    return "".join(char for char in phones if char.isdigit())
+
+
+def build_stress_table() -> Dict[str, str]:
+    """Builds the word -> stress-pattern table from CMUdict.
+
+    Only the first (most common) pronunciation of each word is kept. Returns an
+    empty table when the `pronouncing` library is not installed.
+    """
+    pronouncing = load_backend("pronouncing")
+    if pronouncing is None:
+        return {}
+    pronouncing.init_cmu()
+    table = {}
+    for word, phones in pronouncing.pronunciations:
+        if word not in table:
+            table[word] = _stress_pattern(phones)
+    return table
+
+
+def cmudict_signature() -> Optional[str]:
+    """Identifies the CMUdict source so stale on-disk tables are rebuilt. None if unavailable."""
+    pronouncing = load_backend("pronouncing")
+    if pronouncing is None:
+        return None
+    return f"pronouncing-{getattr(pronouncing, '__version__', 'unknown')}"
+
+
+def read_cached_table(path: str, signature: str) -> Optional[dict]:
+    """Loads a table pickled by `write_cached_table`, or None if missing, corrupt or stale."""
+    import pickle # Here and below: only needed when an index is loaded or saved, not at import
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_FORMAT_VERSION or data.get("source") != signature:
+        return None
+    return data.get("table")
+
+
+def write_cached_table(path: str, signature: str, table: dict):
+    """Pickles a table next to its format version and source signature, atomically."""
+    import pickle
+    import tempfile
+    cache_dir = os.path.dirname(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"version": INDEX_FORMAT_VERSION, "source": signature, "table": table}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)  # Atomic, so concurrent workers never see a partial file
+    except OSError as e:
+        log_event(logger, WARNING, "could not write cached table; continuing with the in-memory copy", path=path, error=e)
+
+
+class SyllableIndex:
+    """Lazily loaded syllable and stress lookups shared across agents."""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self._stresses = None  # word -> stress pattern, loaded on first use
+        self._word_cache = {}  # raw token -> syllable count (dictionary and fallback words alike)
+        self._load_lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def _load(self) -> Dict[str, str]:
+        with self._load_lock, span("syllable_index_load"):
+            if self._stresses is not None:
+                return self._stresses
+            signature = cmudict_signature()
+            if signature is None:
+                stresses = {}  # No CMUdict available: every word goes through the heuristic
+            else:
+                stresses = read_cached_table(self.path, signature)
+                if stresses is None:
+                    stresses = build_stress_table()
+                    write_cached_table(self.path, signature, stresses)
+            self._stresses = stresses
+            return stresses
+
+    def stress_table(self) -> Dict[str, str]:
+        """The full word -> stress-pattern table (empty in degraded mode). Treat as read-only."""
+        return self._stresses if self._stresses is not None else self._load()
+
+    def stress(self, word: str) -> Optional[str]:
+        """CMUdict stress pattern ('1' primary, '2' secondary, '0' unstressed), or None if unknown."""
+        stresses = self._stresses if self._stresses is not None else self._load()
+        return stresses.get(normalize_word(word))
+
+    def syllables(self, word: str) -> int:
+        count = self._word_cache.get(word)
+        if count is not None:
+            counters.incr("syllable_cache_hits")
+            return count
+        stresses = self._stresses if self._stresses is not None else self._load()
+        cleaned_word = normalize_word(word)
+        pattern = stresses.get(cleaned_word)
+        if pattern:
+            count = len(pattern)
+            counters.incr("syllable_dictionary_lookups")
+        else:
+            count = estimate_syllables(cleaned_word)
+            counters.incr("syllable_fallback_uses")
+            log_event(logger, TRACE, "syllable fallback", word=cleaned_word, syllables=count)
+        self._word_cache[word] = count
+        return count
+
+    def syllables_many(self, words: Sequence[str]) -> List[int]:
+        """`syllables` for every word in a list; the out-of-dictionary ones are estimated in one batch."""
+        stresses = self._stresses if self._stresses is not None else self._load()
+        counts = [self._word_cache.get(word) for word in words]
+        misses = {}  # raw token -> normalized form, for words neither cached nor yet seen in this call
+        lookups = 0
+        for word, count in zip(words, counts):
+            if count is None and word not in misses and word not in self._word_cache:
+                cleaned_word = normalize_word(word)
+                pattern = stresses.get(cleaned_word)
+                if pattern:
+                    self._word_cache[word] = len(pattern)
+                    lookups += 1
+                else:
+                    misses[word] = cleaned_word
+        if misses:
+            for word, count in zip(misses, estimate_syllables_batch(list(misses.values()))):
+                self._word_cache[word] = count
+            counters.incr("syllable_fallback_uses", len(misses))
+        counters.incr("syllable_dictionary_lookups", lookups)
+        counters.incr("syllable_cache_hits", len(words) - lookups - len(misses))
+        return [count if count is not None else self._word_cache[word] for word, count in zip(words, counts)]
+
+    def line_syllables(self, words: Iterable[str]) -> int:
+        return sum(self.syllables(word) for word in words)
+
+    def __contains__(self, word: str) -> bool:
+        stresses = self._stresses if self._stresses is not None else self._load()
+        return normalize_word(word) in stresses
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_syllable_index() -> SyllableIndex:
+    """Returns the process-wide index, creating it (but not loading it) on first call."""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = SyllableIndex()
+    return _shared_index
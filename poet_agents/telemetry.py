@@ -0,0 +1,175 @@
+# Logging and Counters
+#
+# Leveled, structured logging for the agents and the workflow, built on the
+# standard `logging` module, plus a set of process-wide aggregate counters.
+#
+# Levels, from noisiest to quietest:
+#   TRACE (5)  per-word and per-attempt detail (syllable lookups, solver tries)
+#   DEBUG      per-line results
+#   INFO       per-poem / per-message progress
+#   WARNING    degraded modes, failed lines
+#
+# `log_event` checks the level before doing anything else, so a disabled call
+# costs one cached level check: no string formatting and no dict building for
+# the structured fields beyond the call itself. Hot loops should additionally
+# guard with `logger.isEnabledFor(TRACE)` when computing an argument is itself
+# expensive.
+#
+# Counters are always on (they are plain integer increments) and can be read
+# with `counters.snapshot()` even when all logging is turned off.
+#
+# The `logging` module is imported on first use, not with the package: it
+# costs more import time than the rest of telemetry together. Modules take
+# the level constants below and a `LazyLogger` from `get_logger`, which binds
+# the real logger the first time a level is checked.
+
+import collections
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+# Same values as the `logging` constants
+TRACE = 5
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LOG_LEVEL_ENV_VAR = "POET_AGENTS_LOG_LEVEL"
+ROOT_LOGGER_NAME = "poet_agents"
+
+_logging = None
+
+
+def _logging_module():
+    global _logging
+    if _logging is None:
+        import logging
+        logging.addLevelName(TRACE, "TRACE")
+        _logging = logging
+    return _logging
+
+
+class LazyLogger:
+    """Stands in for a `logging.Logger` until it is first used."""
+
+    __slots__ = ("name", "_logger")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._logger = None
+
+    @property
+    def logger(self):
+        if self._logger is None:
+            self._logger = _logging_module().getLogger(self.name)
+        return self._logger
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg: str, *args, stacklevel: int = 1, **kwargs):
+        self.logger.log(level, msg, *args, stacklevel=stacklevel + 1, **kwargs)
+
+
+def get_logger(name: str) -> LazyLogger:
+    """Returns a logger under the `poet_agents` hierarchy (e.g. `poet_agents.poetry_agent`)."""
+    if not name.startswith(ROOT_LOGGER_NAME):
+        name = f"{ROOT_LOGGER_NAME}.{name}"
+    return LazyLogger(name)
+
+
+def log_event(logger: LazyLogger, level: int, event: str, **fields):
+    """Logs `event` with structured key=value fields, doing no work when `level` is disabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields}, stacklevel=2)
+
+
+def _key_value_formatter(fmt: str):
+    class KeyValueFormatter(_logging_module().Formatter):
+        """Renders `[LEVEL] logger: event key=value ...`, with values repr'd when they contain spaces."""
+
+        def format(self, record) -> str:
+            line = super().format(record)
+            fields = getattr(record, "fields", None)
+            if fields:
+                rendered = []
+                for key, value in fields.items():
+                    text = str(value)
+                    rendered.append(f"{key}={text!r}" if (" " in text or not text) else f"{key}={text}")
+                line = f"{line} {' '.join(rendered)}"
+            return line
+
+    return KeyValueFormatter(fmt)
+
+
+def parse_level(level) -> int:
+    if isinstance(level, int):
+        return level
+    text = str(level).strip().upper()
+    if text == "TRACE":
+        return TRACE
+    value = _logging_module().getLevelName(text)
+    return value if isinstance(value, int) else INFO
+
+
+def configure_logging(level=None, stream=None):
+    """Attaches a single key=value handler to the `poet_agents` logger.
+
+    `level` defaults to the POET_AGENTS_LOG_LEVEL environment variable, then INFO.
+    Calling it again replaces the handler rather than adding a second one.
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV_VAR, "INFO")
+    logging = _logging_module()
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    for handler in list(root.handlers):
+        if getattr(handler, "_poet_agents_handler", False):
+            root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(_key_value_formatter("[%(levelname)s] %(name)s: %(message)s"))
+    handler._poet_agents_handler = True
+    root.addHandler(handler)
+    root.setLevel(parse_level(level))
+    root.propagate = False
+    return root
+
+
+class Counters:
+    """Process-wide named counters (cache hits, fallback uses, solver attempts, failed lines...)."""
+
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        # Counter's += is a read then a write, so concurrent increments from pool threads would be lost unlocked.
+        with self._lock:
+            self._counts[name] += amount
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counts[name]
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def summary(self, title: Optional[str] = "Counters") -> str:
+        snapshot = self.snapshot()
+        lines = [f"{title}:"] if title else []
+        width = max((len(name) for name in snapshot), default=0)
+        for name in sorted(snapshot):
+            lines.append(f"  {name.ljust(width)}  {snapshot[name]}")
+        lines_generated = snapshot.get("lines_generated", 0)
+        if lines_generated:
+            lines.append(f"  {'attempts_per_line'.ljust(width)}  {snapshot.get('line_attempts', 0) / lines_generated:.2f}")
+        return "\n".join(lines)
+
+
+counters = Counters()
@@ -0,0 +1,75 @@
+# Conversation Theme Model
+#
+# Chooses the theme keywords an agent takes from each poem it hears, with
+# memory of the whole dialogue rather than of one poem at a time.
+#
+# For every poem the model updates, in time proportional to the poem's own
+# tokens:
+#   - document frequencies: in how many poems of the conversation each term
+#     has appeared, giving a smoothed IDF, log((1 + N) / (1 + df)) + 1;
+#   - a decayed term salience: each term's counts summed over the poems so
+#     far, with a poem `k` turns old weighted by THEME_DECAY ** k.
+#
+# A poem's candidate keywords are its own significant terms, scored by
+# salience x IDF. Words that appear in every poem (the echo of last turn's
+# keywords, a refrain) lose IDF, while words that recur across recent turns
+# keep salience, so the themes drift with the dialogue instead of locking onto
+# whatever repeats locally. For the first poem of a conversation every IDF is
+# equal and the ranking reduces to plain term counts.
+#
+# Decay is applied lazily: instead of shrinking every stored salience each
+# turn, new counts are added at a growing scale and divided out on read. The
+# stored values are renormalized in one pass only when that scale gets large.
+
+import collections
+import math
+from typing import Iterable, List, Tuple
+
+THEME_DECAY = 0.6 # Weight of a poem one turn older, relative to the newest
+_RENORMALIZE_ABOVE = 1e100
+
+
+class ThemeModel:
+    """Incremental TF-IDF over the poems of one conversation."""
+
+    def __init__(self, decay: float = THEME_DECAY):
+        self.decay = decay
+        self.documents = 0
+        self.document_frequency = collections.Counter()
+        self._salience = collections.defaultdict(float) # Stored at the current scale
+        self._scale = 1.0
+
+    def _advance(self):
+        self._scale /= self.decay
+        if self._scale > _RENORMALIZE_ABOVE:
+            for term in self._salience:
+                self._salience[term] /= self._scale
+            self._scale = 1.0
+
+    def idf(self, term: str) -> float:
+        return math.log((1 + self.documents) / (1 + self.document_frequency[term])) + 1.0
+
+    def salience(self, term: str) -> float:
+        return self._salience.get(term, 0.0) / self._scale
+
+    def observe(self, terms: Iterable[str]) -> List[Tuple[str, float]]:
+        """Adds one poem's terms to the conversation; returns its distinct terms ranked by score.
+
+        Ties keep first-occurrence order, like `collections.Counter.most_common`.
+        """
+        counts = collections.Counter(terms) # Insertion order = first occurrence
+        if self.documents:
+            self._advance()
+        self.documents += 1
+        self.document_frequency.update(counts.keys())
+        for term, count in counts.items():
+            self._salience[term] += count * self._scale
+        scored = [(term, self.salience(term) * self.idf(term)) for term in counts]
+        scored.sort(key=lambda item: -item[1]) # Stable: ties stay in first-occurrence order
+        return scored
+
+    def top_terms(self, terms: Iterable[str], n: int = 2) -> List[str]:
+        return [term for term, _ in self.observe(terms)[:n]]
+
+    def reset(self):
+        self.__init__(self.decay)
@@ -0,0 +1,176 @@
+# Timing Spans
+#
+# Built-in instrumentation that records nested, named timing spans, so a
+# slow session shows where its time went without attaching an external
+# profiler:
+#
+#   turn          one speaker's whole turn (scheduler), args: turn, agent
+#   receive       waiting for and reading a message, args: agent
+#   interpret     interpret_poetry, args: agent
+#   generate      generate_poetry, args: agent, form
+#   line_attempt  one solver attempt at a line template, args: template
+#   send          send_message, args: agent, recipient
+#   render        a transcript sink writing one record (writer thread)
+#   render_pdf    the ReportLab PDF post-processing step
+#   syllable_index_load, rhyme_index_load
+#                 first use of the shared indexes
+#
+# Tracing is off by default. `span()` then returns a shared do-nothing
+# context manager after one attribute check, so instrumented code costs a
+# call and an empty `with` block: well under a microsecond per poem or
+# message. Loops that run several times per line (solver attempts) check
+# `tracer.enabled` themselves and skip even that. `tracer.start()` turns
+# tracing on. Alternatively, set POET_AGENTS_TRACE=trace.json to trace a
+# whole process and write the file at exit ("{pid}" in the path is replaced
+# by the process id).
+#
+# Recorded spans can be exported as Chrome trace-event JSON
+# (`export_chrome`, viewable in chrome://tracing or https://ui.perfetto.dev)
+# or summarized as a table of count, total, self and mean time per span name
+# (`summary`). Self time excludes the time spent in nested spans.
+
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+TRACE_ENV_VAR = "POET_AGENTS_TRACE"
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start", "children")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.children = 0
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter_ns() - self.start
+        stack = self.tracer._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+        self.tracer._record(self.name, self.start, duration, duration - self.children, self.args)
+        return False
+
+
+class Tracer:
+    """Collects spans from every thread of the process. Events are (name, start_ns, dur_ns, self_ns, pid, tid, args)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events: List[Tuple] = []
+        self.thread_names: Dict[Tuple[int, int], str] = {}
+        self._local = threading.local()
+
+    def start(self):
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def reset(self):
+        self.events = []
+        self.thread_names = {}
+
+    def span(self, name: str, **args):
+        """Context manager timing the enclosed block. Does nothing while tracing is off."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, args)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+            thread = threading.current_thread()
+            self.thread_names[(os.getpid(), thread.ident)] = thread.name
+        return stack
+
+    def _record(self, name: str, start: int, duration: int, self_time: int, args: Dict):
+        self.events.append((name, start, duration, self_time, os.getpid(), threading.get_ident(), args))
+
+    def drain(self) -> Tuple[List[Tuple], Dict]:
+        """Returns and clears the recorded spans, e.g. to ship them from a worker process to `merge`."""
+        events, names = self.events, self.thread_names
+        self.reset()
+        return events, names
+
+    def merge(self, events: List[Tuple], thread_names: Dict):
+        self.events.extend(events)
+        self.thread_names.update(thread_names)
+
+    def chrome_trace(self) -> Dict:
+        """The spans as a Chrome trace-event document ("X" complete events, microsecond timestamps)."""
+        events = list(self.events)
+        origin = min((event[1] for event in events), default=0)
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for (pid, tid), name in self.thread_names.items()]
+        for name, start, duration, _, pid, tid, args in events:
+            trace_events.append({"name": name, "cat": "poet_agents", "ph": "X", "ts": (start - origin) / 1000.0,
+                                 "dur": duration / 1000.0, "pid": pid, "tid": tid, "args": args})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    def summary_rows(self) -> List[Tuple[str, int, float, float, float, float]]:
+        """(name, count, total ms, self ms, mean ms, max ms) per span name, by total time descending."""
+        totals = collections.defaultdict(lambda: [0, 0, 0, 0])
+        for name, _, duration, self_time, *_ in list(self.events):
+            row = totals[name]
+            row[0] += 1
+            row[1] += duration
+            row[2] += self_time
+            row[3] = max(row[3], duration)
+        rows = [(name, count, total / 1e6, self_time / 1e6, total / count / 1e6, longest / 1e6)
+                for name, (count, total, self_time, longest) in totals.items()]
+        rows.sort(key=lambda row: -row[2])
+        return rows
+
+    def summary(self, title: Optional[str] = "Trace summary") -> str:
+        rows = self.summary_rows()
+        width = max([len(row[0]) for row in rows] + [4])
+        lines = [f"{title}:"] if title else []
+        lines.append(f"  {'span'.ljust(width)}  {'count':>7}  {'total ms':>10}  {'self ms':>10}  {'mean ms':>9}  {'max ms':>9}")
+        for name, count, total, self_time, mean, longest in rows:
+            lines.append(f"  {name.ljust(width)}  {count:>7}  {total:>10.3f}  {self_time:>10.3f}  {mean:>9.4f}  {longest:>9.3f}")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def _export_at_exit(path: str):
+    if tracer.events:
+        tracer.export_chrome(path.replace("{pid}", str(os.getpid())))
+
+
+if os.environ.get(TRACE_ENV_VAR):
+    tracer.start()
+    atexit.register(_export_at_exit, os.environ[TRACE_ENV_VAR])
@@ -0,0 +1,309 @@
+# Streaming Transcripts
+#
+# A transcript sink writes each turn of a dialogue the moment it is produced,
+# instead of collecting the whole conversation in memory and rendering it at
+# the end. Memory stays flat however long the dialogue runs, and if the
+# process dies, every turn written so far is already on disk.
+#
+#   JsonlTranscriptSink  One JSON object per line: a "begin" record with the
+#                        title and session metadata, one "turn" record per poem
+#                        and an "end" record. Many sessions can share a file.
+#                        This is the canonical, machine-readable form.
+#   TextTranscriptSink   Plain text, formatted like the console output.
+#   HtmlTranscriptSink   A self-contained HTML page. A crash leaves a
+#                        truncated page that browsers still render.
+#
+# `open_transcript` also accepts .sqlite / .db paths, which open an indexed
+# conversation store instead (see conversation_store.py).
+#
+# Each sink flushes after every turn. PDF is not a streaming format. It is a
+# post-processing step (`write_pdf`, or the command line below) that renders a
+# finished JSONL transcript with ReportLab when that optional library is
+# installed, so bulk runs never wait on PDF layout.
+#
+# Command line:
+#   python -m poet_agents.transcript transcript.jsonl exchange.pdf [--session ID]
+#   python -m poet_agents.transcript transcript.jsonl exchange.html
+
+import json
+import os
+from typing import Dict, Iterator, List
+
+from .backends import load_backend
+from .telemetry import ERROR, INFO, WARNING, configure_logging, get_logger, log_event
+from .tracing import span
+
+logger = get_logger(__name__)
+
+
+class TranscriptSink:
+    """Receives a dialogue turn by turn: `begin`, then `write_turn` per poem, then `end` (or `close`)."""
+
+    def __init__(self, path_or_file, mode: str = "w", fsync: bool = False):
+        if isinstance(path_or_file, (str, os.PathLike)):
+            self.path = os.fspath(path_or_file)
+            self.stream = open(self.path, mode, encoding="utf-8")
+            self._owns_stream = True
+        else:
+            self.path = getattr(path_or_file, "name", None)
+            self.stream = path_or_file
+            self._owns_stream = False
+        self.fsync = fsync
+        self.turns = 0
+        self._in_session = False
+
+    def begin(self, title: str, **metadata):
+        if self._in_session:
+            self.end()
+        self._in_session = True
+        self.turns = 0
+        self._write_begin(title, metadata)
+        self._flush()
+
+    def write_turn(self, entry: Dict):
+        """`entry` needs 'agent' and 'poem'; any other keys (prompt, timing...) are kept where the format allows."""
+        self.turns += 1
+        self._write_turn(entry)
+        self._flush()
+
+    def end(self):
+        if self._in_session:
+            self._in_session = False
+            self._write_end()
+            self._flush()
+
+    def close(self):
+        self.end()
+        if self._owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def _flush(self):
+        self.stream.flush()
+        if self.fsync:
+            os.fsync(self.stream.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_begin(self, title: str, metadata: Dict):
+        raise NotImplementedError
+
+    def _write_turn(self, entry: Dict):
+        raise NotImplementedError
+
+    def _write_end(self):
+        pass
+
+
+class JsonlTranscriptSink(TranscriptSink):
+    """Appends by default, so successive sessions accumulate in one file."""
+
+    def __init__(self, path_or_file, mode: str = "a", fsync: bool = False):
+        super().__init__(path_or_file, mode, fsync)
+        self._metadata = {}
+
+    def _record(self, record: Dict):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _write_begin(self, title: str, metadata: Dict):
+        self._metadata = {key: metadata[key] for key in ("session_id",) if key in metadata}
+        self._record({"event": "begin", "title": title, **metadata})
+
+    def _write_turn(self, entry: Dict):
+        self._record({"event": "turn", **self._metadata, "turn": self.turns, **entry})
+
+    def _write_end(self):
+        self._record({"event": "end", **self._metadata, "turns": self.turns})
+
+
+class TextTranscriptSink(TranscriptSink):
+
+    def _write_begin(self, title: str, metadata: Dict):
+        self.stream.write(f"=== {title} ===\n")
+        if metadata:
+            self.stream.write(" ".join(f"{key}={value}" for key, value in metadata.items()) + "\n")
+
+    def _write_turn(self, entry: Dict):
+        self.stream.write(f"\n--- {entry['agent'].upper()} ---\n")
+        if entry.get("prompt"):
+            self.stream.write(f"(prompt: {entry['prompt']})\n")
+        for line in entry["poem"].split("\n"):
+            self.stream.write(f"  {line}\n")
+
+    def _write_end(self):
+        self.stream.write("\n")
+
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Poetic Exchange</title>
+<style>
+body {{ font-family: Georgia, serif; max-width: 42em; margin: 2em auto; }}
+h1 {{ text-align: center; font-size: 1.5em; }}
+h3 {{ margin-bottom: 0.2em; }}
+.prompt {{ color: #666; font-style: italic; margin: 0; }}
+.poem {{ white-space: pre-line; margin-left: 1.5em; }}
+</style></head><body>
+"""
+
+
+class HtmlTranscriptSink(TranscriptSink):
+
+    def __init__(self, path_or_file, mode: str = "w", fsync: bool = False):
+        from html import escape # Imported by the HTML writers only; html.entities is slow to load
+        self._escape = escape
+        super().__init__(path_or_file, mode, fsync)
+        self.stream.write(HTML_HEAD.format())
+        self._flush()
+
+    def _write_begin(self, title: str, metadata: Dict):
+        self.stream.write(f"<article>\n<h1>{self._escape(title.title())}</h1>\n")
+
+    def _write_turn(self, entry: Dict):
+        self.stream.write(f"<h3>{self._escape(entry['agent'].upper())}:</h3>\n")
+        if entry.get("prompt"):
+            self.stream.write(f"<p class=\"prompt\">{self._escape(entry['prompt'])}</p>\n")
+        self.stream.write(f"<div class=\"poem\">{self._escape(entry['poem'])}</div>\n")
+
+    def _write_end(self):
+        self.stream.write("</article>\n")
+
+    def close(self):
+        self.end()
+        self.stream.write("</body></html>\n")
+        super().close()
+
+
+SINKS_BY_EXTENSION = {
+    ".jsonl": JsonlTranscriptSink,
+    ".txt": TextTranscriptSink,
+    ".html": HtmlTranscriptSink,
+    ".htm": HtmlTranscriptSink,
+}
+STORE_EXTENSIONS = (".sqlite", ".db")
+
+
+def open_transcript(path: str, fsync: bool = False) -> TranscriptSink:
+    """Opens the sink matching the file extension (.jsonl, .txt, .html, or .sqlite / .db for a conversation store)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in STORE_EXTENSIONS:
+        from .conversation_store import ConversationStoreSink # Imported here: it builds on this module
+        return ConversationStoreSink(path)
+    if extension not in SINKS_BY_EXTENSION:
+        supported = sorted((*SINKS_BY_EXTENSION, *STORE_EXTENSIONS))
+        raise ValueError(f"unsupported transcript format {extension!r}; use one of {', '.join(supported)}")
+    return SINKS_BY_EXTENSION[extension](path, fsync=fsync)
+
+
+def read_jsonl_transcript(path: str) -> Iterator[Dict]:
+    """Yields one {'title', 'metadata', 'turns'} dict per session in a JSONL transcript.
+
+    A session cut off by a crash (no "end" record) is still yielded with the turns it has.
+    A truncated final line is ignored.
+    """
+    session = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            event = record.pop("event", None)
+            if event == "begin":
+                if session is not None:
+                    yield session
+                title = record.pop("title", "")
+                session = {"title": title, "metadata": record, "turns": []}
+            elif event == "turn" and session is not None:
+                session["turns"].append(record)
+            elif event == "end" and session is not None:
+                yield session
+                session = None
+    if session is not None:
+        yield session
+
+
+def write_pdf(title: str, turns: List[Dict], filename: str) -> bool:
+    """Renders one finished conversation to PDF with ReportLab. Returns False if ReportLab is missing or fails."""
+    # ReportLab is optional and only imported here, the first time a PDF is requested.
+    if load_backend("reportlab") is None:
+        log_event(logger, WARNING, "ReportLab is not available; skipping PDF generation", file=filename)
+        return False
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER
+    import html
+
+    log_event(logger, INFO, "generating PDF", file=filename)
+    doc = SimpleDocTemplate(filename)
+    styles = getSampleStyleSheet()
+
+    title_style = styles['h1']
+    title_style.alignment = TA_CENTER
+    title_style.fontSize = 18
+    title_style.spaceAfter = 0.5 * inch
+
+    agent_name_style = styles['h3']
+    agent_name_style.fontSize = 12
+    agent_name_style.spaceBefore = 0.2 * inch
+    agent_name_style.spaceAfter = 0.1 * inch
+
+    poem_style = styles['Normal']
+    poem_style.fontSize = 10
+    poem_style.leftIndent = 0.2 * inch # Indent poem lines
+    poem_style.spaceAfter = 0.1 * inch
+    poem_style.leading = 12 # Line spacing for poems
+
+    story = [Paragraph(html.escape(title.title()), title_style)]
+    for entry in turns:
+        poem_text = html.escape(entry['poem']).replace('\n', '<br/>\n') # Preserve line breaks in PDF
+        story.append(Paragraph(f"{html.escape(entry['agent'].upper())}:", agent_name_style))
+        story.append(Paragraph(poem_text, poem_style))
+        story.append(Spacer(1, 0.1 * inch)) # Small spacer after each poem block
+
+    try:
+        with span("render_pdf", turns=len(turns)):
+            doc.build(story)
+    except Exception as e:
+        log_event(logger, ERROR, "PDF generation failed", file=filename, error=e)
+        return False
+    log_event(logger, INFO, "PDF generated", file=filename)
+    return True
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Render a JSONL transcript as PDF, HTML or text.")
+    parser.add_argument("transcript", help="JSONL transcript written by JsonlTranscriptSink.")
+    parser.add_argument("output", help="Output file; the format follows the extension (.pdf, .html, .txt).")
+    parser.add_argument("--session", default=None, help="Only this session_id (PDF renders the first session by default).")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    sessions = [session for session in read_jsonl_transcript(args.transcript)
+                if args.session is None or str(session["metadata"].get("session_id")) == args.session]
+    if not sessions:
+        log_event(logger, ERROR, "no matching sessions in transcript", file=args.transcript, session=args.session)
+        return 1
+    if args.output.lower().endswith(".pdf"):
+        return 0 if write_pdf(sessions[0]["title"], sessions[0]["turns"], args.output) else 1
+    extension = os.path.splitext(args.output)[1].lower()
+    sink_class = SINKS_BY_EXTENSION.get(extension)
+    if sink_class is None or sink_class is JsonlTranscriptSink:
+        parser.error("output must be .pdf, .html or .txt")
+    with sink_class(args.output, mode="w") as sink:
+        for session in sessions:
+            sink.begin(session["title"], **session["metadata"])
+            for turn in session["turns"]:
+                sink.write_turn(turn)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+# Message Transports
+#
+# A transport moves A2A messages (`Message` objects or plain dictionaries, see
+# message_structure.py) from a sender to a recipient's mailbox. `PoetryAgent.send_message` and
+# `receive_message` build and consume the messages; the transport decides how
+# they travel:
+#
+#   FileTransport        The original mechanism: one `message_to_<id>.json`
+#                        file per recipient in a directory, written to a
+#                        temporary name and renamed into place so a reader
+#                        never sees a half-written message. The file holds
+#                        the message in the transport's codec (compact JSON
+#                        by default, see message_codec.py).
+#   AsyncQueueTransport  In-process asyncio queues, one per recipient. Agents
+#                        `await` their next message instead of polling, so many
+#                        dialogues can run concurrently on a single event loop
+#                        with no sleeps and no file round-trips. Messages are
+#                        handed over as objects, never serialized.
+#   MailboxTransport     (mailbox.py) Append-only JSON Lines log per recipient
+#                        with a consumer offset: lossless, batched delivery.
+#   HttpTransport        (http_transport.py) HTTP/1.1 to an AgentServer, for
+#                        agents in separate processes or on separate hosts.
+#
+# Every transport offers the synchronous `send` / `receive` pair (receive
+# returns None when nothing is waiting) and the awaitable `send_async` /
+# `receive_async` pair. The base class implements the async pair on top of the
+# sync one, so a new backend only has to provide `send` and `receive`.
+#
+# `receive_blocking(recipient_id, timeout)` waits for the next message. The
+# file-backed transports sleep on directory change notifications (see
+# fswatch.py) and wake as soon as the sender's rename or append lands; the
+# generic version re-checks with an adaptive backoff.
+#
+# `asyncio` is imported by the async code paths only: it is the largest part
+# of this package's import time, and synchronous workers never need it.
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+
+from .fswatch import MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, wait_until
+from .message_codec import MessageCodec, get_codec
+from .telemetry import DEBUG, ERROR, get_logger, log_event
+
+if TYPE_CHECKING:
+    import asyncio
+
+logger = get_logger(__name__)
+
+ASYNC_POLL_INTERVAL = 0.005 # Seconds between checks when a sync-only transport is awaited
+
+
+class Transport:
+    """Interface for message backends."""
+
+    __slots__ = ()
+    name = "transport"
+
+    def send(self, message: Dict) -> bool:
+        """Delivers `message` to `message['recipient_id']`. Returns False if it could not be delivered."""
+        raise NotImplementedError
+
+    def receive(self, recipient_id: str) -> Optional[Dict]:
+        """Removes and returns the next message for `recipient_id`, or None if there is none."""
+        raise NotImplementedError
+
+    def send_many(self, messages: List[Dict]) -> int:
+        """Delivers several messages, in order. Returns how many were delivered."""
+        return sum(1 for message in messages if self.send(message))
+
+    def receive_many(self, recipient_id: str, max_messages: Optional[int] = None) -> List[Dict]:
+        """Takes every waiting message (up to `max_messages`) in arrival order."""
+        messages = []
+        while max_messages is None or len(messages) < max_messages:
+            message = self.receive(recipient_id)
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    def receive_blocking(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Waits for the next message. Returns None if `timeout` seconds pass first (None waits forever)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = MIN_POLL_INTERVAL
+        while True:
+            message = self.receive(recipient_id)
+            if message is not None:
+                return message
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            time.sleep(interval if remaining is None else min(interval, remaining))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    async def send_async(self, message: Dict) -> bool:
+        return self.send(message)
+
+    async def receive_async(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Waits for the next message. Returns None if `timeout` seconds pass first."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            message = self.receive(recipient_id)
+            if message is not None:
+                return message
+            if deadline is not None and loop.time() >= deadline:
+                return None
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def close(self):
+        pass
+
+
+class FileTransport(Transport):
+    """One file per recipient (`message_to_<id>.json`) in `message_dir` (default: working directory)."""
+
+    __slots__ = ("message_dir", "codec")
+    name = "file"
+
+    def __init__(self, message_dir: Optional[str] = None, codec: Union[str, MessageCodec, None] = None):
+        self.message_dir = message_dir
+        self.codec = get_codec(codec)
+
+    def path_for(self, recipient_id: str) -> str:
+        filename = f"message_to_{recipient_id}.json"
+        return os.path.join(self.message_dir, filename) if self.message_dir else filename
+
+    def send(self, message: Dict) -> bool:
+        filename = self.path_for(message["recipient_id"])
+        tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = self.codec.encode(message)
+        try:
+            with open(tmp_filename, 'wb') as f: f.write(data)
+            os.replace(tmp_filename, filename) # Atomic: the reader sees no file or the whole message
+        except IOError as e:
+            log_event(logger, ERROR, "could not write message file", file=filename, error=e)
+            try: os.remove(tmp_filename)
+            except OSError: pass
+            return False
+        log_event(logger, DEBUG, "wrote message file", file=filename)
+        return True
+
+    def receive(self, recipient_id: str) -> Optional[Dict]:
+        filename = self.path_for(recipient_id)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, 'rb') as f: message = self.codec.decode(f.read())
+        except IOError as e:
+            log_event(logger, ERROR, "could not read message file", file=filename, error=e); return None
+        except (ValueError, TypeError) as e:
+            log_event(logger, ERROR, "could not decode message file", file=filename, codec=self.codec.name, error=e); return None
+        try: os.remove(filename); log_event(logger, DEBUG, "deleted message file", file=filename)
+        except OSError as e: log_event(logger, ERROR, "could not delete message file", file=filename, error=e)
+        return message
+
+    def receive_blocking(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        return wait_until(lambda: self.receive(recipient_id), self.message_dir or ".", timeout)
+
+
+class AsyncQueueTransport(Transport):
+    """In-process asyncio queues keyed by recipient. Create and use it inside one event loop."""
+
+    name = "asyncio"
+
+    def __init__(self):
+        import asyncio
+        self._asyncio = asyncio
+        self._queues = {}
+
+    def _queue(self, recipient_id: str) -> "asyncio.Queue":
+        queue = self._queues.get(recipient_id)
+        if queue is None:
+            queue = self._queues[recipient_id] = self._asyncio.Queue()
+        return queue
+
+    def send(self, message: Dict) -> bool:
+        self._queue(message["recipient_id"]).put_nowait(message)
+        return True
+
+    def receive(self, recipient_id: str) -> Optional[Dict]:
+        try:
+            return self._queue(recipient_id).get_nowait()
+        except self._asyncio.QueueEmpty:
+            return None
+
+    async def receive_async(self, recipient_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        queue = self._queue(recipient_id)
+        if timeout is None:
+            return await queue.get()
+        try:
+            return await self._asyncio.wait_for(queue.get(), timeout)
+        except self._asyncio.TimeoutError:
+            return None
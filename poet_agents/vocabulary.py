@@ -0,0 +1,150 @@
+# Common-Word Vocabulary
+#
+# Everyday English words (lower-case, mostly one to three syllables, with the
+# common inflections) that rhymed forms may end a line on. CMUdict also lists
+# acronyms ("abc"), initialisms and surnames ("applewhite"), which rhyme
+# perfectly well but read as noise at the end of a line, so `RhymeIndex` only
+# offers line endings that appear here (or in a persona's vocabulary). The
+# list is plain data, imported only when the rhyme index is first loaded.
+
+COMMON_WORDS = frozenset("""
+able about above absent abroad accept accord account ache ached aches aching acre act acted action add added adore
+adored advance advice afar afraid after again against age aged ages agree agreed ahead aid aim aimed aims air aired
+airs alarm alert alike alive allow allowed alone along aloud alright altar alter always amaze amazed amber amend amid
+among amount amuse ancient anger angle angry animal ankle announce annoy another answer answered anxious anyone apart
+appeal appear appeared appears apple apples applause apply approach april arch arches argue arise arm armed armor arms
+army arose around arrange array arrest arrive arrived arrow arrows art ash ashes ashore aside ask asked asking asks
+asleep assume attack attend august aunt autumn avail avoid await awake award aware away awe awhile axe
+baby back backs bad badge bag bags bake baked bald ball balls band bands bang bank banks bar bare barely bark barn bars
+base based bash basin basket bat bath bathe bay bays beach beak beam beams bean bear beard bears beast beat beaten
+beats beauty became because become bed beds bee beech beer bees before beg began begin begun behind belief believe
+bell bells belong below belt bench bend beneath bent beside best betray better between beyond bid big bill bind bird
+birds birth bit bite bites bitter black blade blame blank blast blaze bleak bled bleed blend bless blessed blew blind
+blink bliss block blocks blood bloom blooms blossom blot blow blown blows blue blues blunt blur blush board boast boat
+boats body boil bold bolt bond bone bones book books boot boots border bore bored born borrow bosom boss both bother
+bottle bottom bough bought bound bounds bow bowed bowl bows box boy boys brace brain brains branch brand brass brave
+bread break breaks breast breath breathe breathed breeze brick bride bridge brief bright brim bring brings brink broad
+broke broken brook broom brother brought brow brown brush buck bud buds build built bulb bull bump bunch burn burned
+burns burnt burst bury bush bushes busy butter button buy buzz
+cage cake call called calls calm came camp can candle cane cap cape car card cards care cared careful cares carry cart
+carve case cash cast castle cat catch cats caught cause cave caves cease cedar ceiling cell center chain chains chair
+chalk chance change changed changes chant chapel charge charm charmed chart chase chased chat cheap cheat check cheek
+cheeks cheer cheese cherry chest chew chick chief child children chill chime chimes chin chip choice choir choke choose
+chop chose chord church circle city claim clap class claw claws clay clean cleanse clear clerk clever cliff cliffs climb
+climbed cling clock close closed cloth clothes cloud clouds clown club clue coal coast coat coats code coin cold collar
+color comb combine come comes comfort command complain complete conceal concern confess confide confine confuse consent
+consume contain content control cook cool copper copy cord core corn corner cost cot cottage cotton couch cough count
+country couple courage course court cousin cove cover cow cows crack cradle craft crane crash crawl cream create creek
+creep crept crest crew cried cries crime crisp crop cross crow crowd crowded crown crows crude cruel crumb crush crust
+cry crying cup cups cure curl curse curtain curve cut cute cuts
+dad daily dam damp dance danced dances dancing danger dare dared dark darker darling dart dash date dawn dawned day
+days dead deaf deal dear death debt decay deceive decide deck declare decline deed deeds deep deeper deer defeat defend
+defy degree delay delight delights deliver demand den deny depart depth depths derive descend desert deserve design
+desire desk despair destroy detail devote dew dial dice did die died dies dig dim dime dine dinner dip direct dirt dirty
+discover dish dismay display distant dive divide dizzy dock doctor dog dogs doll done door doors dose dot double doubt
+dove down doze dozen drag drain drank draw drawn draws dread dream dreamed dreams dreary dress dressed drew dried drift
+drifts drill drink drinks drip drive driven drone drop drops drove drown drowned drum drums drunk dry duck due dug dull
+dumb dune dunes dusk dust dusty duty dwell dwelt dying
+each eager eagle ear early earn ears earth ease east eastern easy eat eaten echo edge eggs eight either elbow else
+embrace ember embers empire employ empty end ended endless ends endure enemy engage engine enjoy enough ensure enter
+entire envy equal erase err errand escape eternal eve even evening event ever every evil exact exceed excite excuse
+exist expect explain explore expose extend extreme eye eyes
+face faced faces fact fade faded fades fail failed faint fair faith fall fallen falls false fame fan fancy far fare farm
+farther fast fasten fat fate father fault favor fear feared fears feast feather fed fee feed feel feeling feels feet fell
+fellow felt fence fern fetch fever few field fields fierce fiery fifth fight fights figure file fill filled film final
+find finds fine finger fingers finish fire fires firm first fish fist fit five fix flag flags flame flames flash flat
+flee fled fleet flesh flew flies flight fling flint float flock flood floor flour flow flowed flower flowers flowing
+flows flown fly flying foam foe fog fold folk follow fond food fool foot force forest forget forgive forgot fork form
+former fort forth fortune forward fought found fountain four fowl fox frail frame free freed freeze fresh friend friends
+fright frog from front frost frown froze fruit fruits fuel full fun fur fury fuse
+gain gained gale game games gap gate gates gather gave gaze gazed gear gem general gentle ghost gift gifts girl girls
+give given gives glad glance glare glass gleam glen glide glimpse glint globe gloom glory glove glow glowed glows glue
+gnaw goal goat god gold golden gone good goods goose gown grace grade grain grand grant grape grapes grasp grass grateful
+grave graves gray great greed green greet grew grief grieve grim grin grind grip groan ground grounds group grove grow
+growl grown grows growth guard guess guest guide guilt gulf gull gulls gust
+habit hail hair half hall halls halt hammer hand hands handle hang hanged happen happy harbor hard hardly harm harp harsh
+harvest haste hat hate hatred haul haunt haven hawk hay haze head heads heal health heap hear heard hearing heart hearth
+hearts heat heaven heavy hedge heed heel height held hello helm help hen herb herd hero hid hidden hide hides high hill
+hills hint hire history hit hive hold holds hole holes hollow holy homes honest honey honor hood hook hope hoped hopes
+horn horse horses host hot hour hours house houses hover howl hue huge human humble hung hunger hungry hunt hunter hurl
+hurry hurt hush hut hymn
+ice idea idle ill image imagine impart implore improve inch incline indeed inform inn inner insist inspire instead
+intend invite iron island ivy
+jacket jail jam jar jaw jest jewel jewels job join joke journey joy joys judge jug juice jump june jungle just
+keen keep keeps kept kettle key keys kick kid kill kind king kingdom kings kiss kissed kitchen kite knee kneel knees
+knelt knew knife knight knit knock knot know known knows
+lace lack lad ladder laden lady laid lake lakes lamb lame lamp lamps land lands lane language lap large lark larks last
+late later laugh laughed laughter launch law lawn laws lay lead leader leaf league lean leap leaped leapt learn learned
+least leather leave leaves led ledge left leg legs lend length less lesson lest let letter level liar lid lie lies life
+lift light lighted lights like liked limb limbs lime limit line lines linger link lion lip lips list listen little live
+lived lives living load loaf loan lock locked lodge loft lone lonely long longer longing look looked looks loom loose
+lord lose loss lost loud love loved lover lovers loves low lower loyal luck lull lump lunch lung lure lust lute lying
+mad made magic maid mail main maintain make maker makes male man mane manner many map maple marble march mare mark
+market marks marriage marry marsh mask mass mast master match mate matter may meadow meal mean meant measure meat meet
+meeting melt member memory men mend mention mercy mere merry mess met metal mice middle midnight might mild mile miles
+milk mill mind minds mine mingle minute mirror mirth miss missed mist mists mix moan mock mode moment money month moon
+moonlight moor moral morn morning moss mother motion mount mountain mountains mourn mouse mouth move moved moves much mud
+murmur muse music mute mutter
+nail naked name named names narrow nation native nature near nearby neat neck needle neglect neighbor nerve nest net
+never new news next nice night nights nine noble nod noise none noon norm north nose note notes nothing notice novel
+number nurse nut
+oak oaks oar oath obey ocean odd odor offer office often oil old olive omen once one open opened opinion oppose orange
+orchard ordain order ore organ origin ought ounce outer outside oven owe owl own owned
+pace pack pad page paid pail pain pains paint pair pale palm pan pane panel pang pant paper parade pardon parent park
+part parted parting parts party pass passed past paste pat patch path paths patience pause paused paw pay peace peak
+pear pearl peel peer pen pencil people perceive perfect perform perhaps peril permit persist pet petal pew phrase pick
+picture pie piece pier pierce pig pile pill pillow pin pine pines pink pipe pit pitch pity place placed plain plan plane
+plank plant plate play played plea plead please pleased pledge plot plow pluck plum plume plunge pocket poem poet point
+poise poison pole polish pond pool poor pop porch port pose post pot pour poured power praise pray prayed prayer prayers
+preach prefer prepare present preserve press pretend pretty prevail prevent prey price pride priest prince print prison
+prize proceed profound prompt proof proper protect proud prove provide prune public pull pulse pump punch pure purple
+purpose purse pursue push put
+quail queen quench quest quick quiet quill quit quite quiver quote
+race rack rage raid rail rain rainbow rained rains raise raised rake ran range rank rare rat rate rather raven raw ray
+rays reach reached read ready realm reap rear recall receive record red reed reeds refrain refuse regain regard regret
+reign rein reject rejoice relate release relief relieve remain remains remember remind remote remove render renew repair
+repay repeat reply report repose request rescue reserve resign resist resolve respect rest restore retain retire retreat
+return returned reveal revere reward rhyme rib ribbon rice rich rid ridge ride rides right rights ring rings ripe rise
+risen rises rising risk rite river rivers road roads roam roar roast rob robe rock rocks rod rode role roll rolled rolls
+roof room rooms root roots rope rose roses rot rough round rouse row rows rub rude rug ruin rule ruled rules run rung rush
+rust
+sack sad saddle safe said sail sails saint sake sale salt same sand sands sang sank sat save saved saw say says scale
+scar scarce scare scene scent school score scorn scream screen sea seal seam search seas season seat second secret see
+seed seeds seek seem seemed seen sees seize sell send sense sent serene serve set sets settle seven sew shade shades
+shadow shadows shake shaken shall shame shape share sharp shawl shed sheep sheer sheet shelf shell shelter shepherd
+shield shift shine shines shining ship ships shirt shock shoe shone shook shoot shop shore shores short shot shout shove
+show showed shower shown shows shrine shrink shut shy sick side sides sigh sighed sighs sight sign signs silence silent
+silk silver simple sin since sing singer singing sings sink sip sir sister sit site six size skill skin skip skirt sky
+skies slain slate slave sleep sleeping sleeve slept slice slid slide slight slim slip slope slow slowly small smart smell
+smile smiled smiles smoke smooth snail snake snap snow snows soak soap soar sob sod soft soil sold soldier sole solve
+son song songs soon sore sorrow sorry sort sought soul souls sound sounds soup source south sow space spade span spare
+spark sparks speak spear speech speed spell spend spent spin spine spite splash split spoil spoke spoon sport spot
+spray spread spring springs sprout spur spy square squeeze stable stack staff stage stain stair stairs stake stale
+stalk stall stamp stand stands star stare stars start starve state stay stayed steady steal steam steel steep steer
+stem step steps stern stick stiff still sting stir stitch stock stole stone stones stood stool stoop stop store storm
+storms story stout stove straight strain strand strange stranger straw stray stream streams street strength stretch
+strewn stride strife strike string strip stripe strive stroke strong struck struggle stuck study stuff stumble stump
+style subtle succeed such suck sudden sue suffer sugar suit sum summer summit sun sung sunk sunlight sunny sunrise sunset
+supply support suppose sure surf surface surge surprise surround swallow swam swamp swan sway swear sweat sweep sweet
+swell swept swift swim swing sword swore sworn swung
+table tail take taken takes tale tales talk tall tame tan tap tape task taste taught tea teach tear tears tease teeth
+tell temple tempt ten tend tender tent term test thank thaw thee theme thick thief thin thine thing things think third
+thirst thorn thorns thou though thought thoughts thread threat three threw thrill throat throne throng through throw
+thrown thumb thunder tick tide tides tie tied tiger tight till timber time times tin tiny tip tire tired title toad toast
+today toe together toil told tomb tone tongue tonight took tool tooth top torch tore torn toss touch tough tour toward
+tower town toy trace track trade trail train trait tramp trap tray tread treasure treat tree trees tremble trend trial
+tribe trick tried trim trip troop trouble trout truce truck true truly trunk trust truth try tube tuck tune turf turn
+turned turns twelve twenty twice twig twin twist two
+unfold unite unknown untie upon urge use used useful utter
+vain vale valley value van vanish vapor vast veil vein velvet verse vessel vest vice view vine vines violet visit voice
+voices void vote vow vowed voyage
+wade wage wagon wail waist wait waited wake waked walk walked walks wall walls wander wandered want war ward warm warmth
+warn wash waste watch water waters wave waved waves wax way ways weak wealth weapon wear weary weave web wed weed week
+weep weigh weight welcome well went wept west wet whale wheat wheel whim whip whirl whisper whispered whistle white whole
+wicked wide widow width wife wild will willow win wind winds window windows wine wing wings wink winter wipe wire wisdom
+wise wish wished wit witch with wither within without witness woe woke wolf woman women wonder wood woods wool word words
+wore work worked world worm worn worry worse worth would wound wove wrap wrath wreath wreck wren wrist write written wrong
+wrote
+yard yarn year years yell yellow yes yield young youth
+zeal zone
+""".split())
@@ -0,0 +1,381 @@
+# Word Associations
+#
+# A word -> related-words index built offline from a local text corpus and
+# read through a memory map, so it loads in well under a millisecond whatever
+# its size and every process on the machine shares one copy of its pages.
+#
+# Building (`build_word_associations`, or the command line below) tokenizes
+# the corpus the way the interpreter does (lower-cased, stopwords and words of
+# one or two letters dropped), keeps words seen at least `min_count` times,
+# and counts how often two of them occur within `window` words of each other
+# in the same paragraph. For every word the `top_k` neighbours by positive
+# pointwise mutual information (pairs seen fewer than `min_pair_count` times
+# are ignored) are ranked once, at build time. Neighbour frequencies are
+# raised to CONTEXT_SMOOTHING first, the usual correction for PMI's taste for
+# rare words.
+#
+# File layout (little-endian), each section 8-byte aligned:
+#
+#   header      magic, format version, vocabulary size V, top_k, hash table
+#               size T, non-zero co-occurrence count NNZ
+#   word_ends   u64[V]     end offset of each word in `words`
+#   word_counts u32[V]     corpus frequency of each word
+#   table       u32[T]     open-addressing hash table (crc32, linear probing)
+#                          of word id + 1; 0 marks an empty slot
+#   row_ends    u64[V]     CSR: end of each word's co-occurrence row
+#   columns     u32[NNZ]   CSR: neighbour ids, ascending within a row
+#   pair_counts u32[NNZ]   CSR: co-occurrence counts
+#   neighbours  u32[V*k]   top-k neighbour ids per word, NO_WORD-padded
+#   words       UTF-8 bytes of every word, concatenated
+#
+# A lookup hashes the word once and probes the table (O(1) expected), and its
+# neighbours are one slice of `neighbours`: no dictionary is built at load
+# time. `get_word_associations()` opens the index at WORD_ASSOC_ENV_VAR or
+# <cache dir>/word_assoc_v1.bin and returns None if there is none, in which
+# case the agents fall back to the small RELATED_THEMES table.
+#
+# Command line:
+#   python -m poet_agents.word_assoc build corpus_dir/ more.txt [--output PATH] [--window 4] [--top-k 16]
+#   python -m poet_agents.word_assoc query river light [--index PATH]
+
+import array
+import collections
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .lexicon import STOPWORDS
+from .syllable_index import default_cache_dir
+from .telemetry import ERROR, INFO, WARNING, configure_logging, get_logger, log_event
+from .tracing import span
+
+logger = get_logger(__name__)
+
+ASSOC_FORMAT_VERSION = 1
+ASSOC_FILENAME = f"word_assoc_v{ASSOC_FORMAT_VERSION}.bin"
+WORD_ASSOC_ENV_VAR = "POET_AGENTS_WORD_ASSOC"
+DEFAULT_WINDOW = 4
+DEFAULT_TOP_K = 16
+DEFAULT_MIN_COUNT = 3
+DEFAULT_MIN_PAIR_COUNT = 2
+DEFAULT_MAX_VOCABULARY = 200_000
+CORPUS_EXTENSIONS = (".txt", ".md")
+CONTEXT_SMOOTHING = 0.75
+NO_WORD = 0xFFFFFFFF
+
+_MAGIC = b"POETWA\x00\x00"
+_HEADER = struct.Struct("<8sIIIIQ") # magic, version, vocabulary, top_k, table size, nnz
+_TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)*")
+
+
+def _hash(word_bytes: bytes) -> int:
+    return zlib.crc32(word_bytes)
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def corpus_paragraphs(paths: Sequence[str]) -> Iterator[List[str]]:
+    """Yields the significant words of each paragraph of the corpus files (directories are walked for .txt and .md files)."""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                           for name in names if name.lower().endswith(CORPUS_EXTENSIONS))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                paragraph = []
+                for line in f:
+                    words = [word for word in _TOKEN.findall(line.lower()) if len(word) > 2 and word not in STOPWORDS]
+                    if words:
+                        paragraph.extend(words)
+                    elif not line.strip() and paragraph:
+                        yield paragraph
+                        paragraph = []
+                if paragraph:
+                    yield paragraph
+
+
+def build_word_associations(paragraphs: Iterable[List[str]], path: str, window: int = DEFAULT_WINDOW,
+                            top_k: int = DEFAULT_TOP_K, min_count: int = DEFAULT_MIN_COUNT,
+                            min_pair_count: int = DEFAULT_MIN_PAIR_COUNT,
+                            max_vocabulary: int = DEFAULT_MAX_VOCABULARY) -> Dict[str, int]:
+    """Counts co-occurrences in `paragraphs` (lists of significant words) and writes the index to `path` atomically.
+
+    `paragraphs` is read twice, so pass a re-iterable (a list, or a sequence of file paths via `corpus_paragraphs`).
+    Returns build statistics.
+    """
+    with span("word_assoc_build"):
+        frequency = collections.Counter()
+        for paragraph in paragraphs:
+            frequency.update(paragraph)
+        ranked = sorted((word for word, count in frequency.items() if count >= min_count),
+                        key=lambda word: (-frequency[word], word))[:max_vocabulary]
+        word_ids = {word: position for position, word in enumerate(ranked)}
+        vocabulary = len(ranked)
+
+        pairs = collections.Counter() # first id * V + second id, first < second
+        for paragraph in paragraphs:
+            ids = [word_ids[word] for word in paragraph if word in word_ids]
+            for position, first in enumerate(ids):
+                for second in ids[position + 1:position + 1 + window]:
+                    if first != second:
+                        pairs[min(first, second) * vocabulary + max(first, second)] += 1
+
+        rows = [[] for _ in range(vocabulary)]
+        for key, count in pairs.items():
+            if count >= min_pair_count:
+                first, second = divmod(key, vocabulary)
+                rows[first].append((second, count))
+                rows[second].append((first, count))
+        del pairs
+
+        smoothed = [frequency[word] ** CONTEXT_SMOOTHING for word in ranked]
+        scale = sum(smoothed) / (sum(sum(count for _, count in row) for row in rows) or 1)
+        total = sum(frequency[word] for word in ranked) or 1
+        row_ends, columns, pair_counts = array.array("Q"), array.array("I"), array.array("I")
+        neighbours = array.array("I", [NO_WORD]) * (vocabulary * top_k)
+        for word_id, row in enumerate(rows):
+            row.sort()
+            columns.extend(column for column, _ in row)
+            pair_counts.extend(count for _, count in row)
+            row_ends.append(len(columns))
+            # PMI = log(P(word, neighbour) / (P(word) P_smoothed(neighbour))); the pair count and then the id break
+            # ties so builds are reproducible.
+            word_share = frequency[ranked[word_id]] / total
+            scored = sorted(((math.log(count * scale / (word_share * smoothed[column])), -count, column) for column, count in row),
+                            key=lambda item: (-item[0], item[1], item[2]))
+            for slot, (pmi, _, column) in enumerate(scored[:top_k]):
+                if pmi <= 0:
+                    break
+                neighbours[word_id * top_k + slot] = column
+            rows[word_id] = None
+
+        encoded = [word.encode("utf-8") for word in ranked]
+        table_size = 1 << max(4, (2 * vocabulary).bit_length())
+        table = array.array("I", [0]) * table_size
+        for word_id, word_bytes in enumerate(encoded):
+            slot = _hash(word_bytes) & (table_size - 1)
+            while table[slot]:
+                slot = (slot + 1) & (table_size - 1)
+            table[slot] = word_id + 1
+        word_ends, end = array.array("Q"), 0
+        for word_bytes in encoded:
+            end += len(word_bytes)
+            word_ends.append(end)
+        word_counts = array.array("I", (min(frequency[word], NO_WORD) for word in ranked))
+
+        sections = [word_ends, word_counts, table, row_ends, columns, pair_counts, neighbours]
+        if sys.byteorder != "little":
+            for section in sections:
+                section.byteswap()
+        import tempfile # Build-time only, like argparse in main(): agents just read the index
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, ASSOC_FORMAT_VERSION, vocabulary, top_k, table_size, len(columns)))
+            for section in [*sections, b"".join(encoded)]:
+                f.write(b"\x00" * (_aligned(f.tell()) - f.tell()))
+                f.write(section if isinstance(section, bytes) else section.tobytes())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path) # Atomic: processes that already mapped the old file keep reading it
+    stats = {"vocabulary": vocabulary, "pairs": len(columns) // 2, "tokens": sum(frequency.values())}
+    log_event(logger, INFO, "word association index built", path=path, **stats)
+    return stats
+
+
+class WordAssociations:
+    """Read-only view of an index file written by `build_word_associations`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.vocabulary_size, self.top_k, self._table_size, nnz = _HEADER.unpack_from(self._map)
+            if magic != _MAGIC or version != ASSOC_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {ASSOC_FORMAT_VERSION} word association index")
+            if sys.byteorder != "little":
+                raise ValueError("word association indexes are little-endian; this platform is not")
+            view = memoryview(self._map)
+            self._views = [view]
+            offset = _HEADER.size
+
+            def section(code: str, length: int) -> memoryview:
+                nonlocal offset
+                start = _aligned(offset)
+                offset = start + length * struct.calcsize(code)
+                section_view = view[start:offset].cast(code)
+                self._views.append(section_view)
+                return section_view
+
+            vocabulary = self.vocabulary_size
+            self._word_ends = section("Q", vocabulary)
+            self._word_counts = section("I", vocabulary)
+            self._table = section("I", self._table_size)
+            self._row_ends = section("Q", vocabulary)
+            self._columns = section("I", nnz)
+            self._pair_counts = section("I", nnz)
+            self._neighbours = section("I", vocabulary * self.top_k)
+            self._words_start = _aligned(offset)
+            if self._words_start + (self._word_ends[-1] if vocabulary else 0) > len(self._map):
+                raise ValueError(f"{path} is truncated")
+        except (ValueError, struct.error, TypeError):
+            self.close()
+            raise
+        # Builds replace the file, so its path, size and modification time identify it without reading its pages.
+        self.signature = f"assoc-{vocabulary}-{stat.st_size}-{stat.st_mtime_ns}-{os.path.abspath(path)}"
+
+    def _word(self, word_id: int) -> str:
+        start = self._word_ends[word_id - 1] if word_id else 0
+        return self._map[self._words_start + start:self._words_start + self._word_ends[word_id]].decode("utf-8")
+
+    def word_id(self, word: str) -> Optional[int]:
+        """The word's id, or None if it is not in the index. Expects a lower-cased word."""
+        word_bytes = word.encode("utf-8")
+        mask = self._table_size - 1
+        slot = _hash(word_bytes) & mask
+        while True:
+            entry = self._table[slot]
+            if not entry:
+                return None
+            word_id = entry - 1
+            start = self._word_ends[word_id - 1] if word_id else 0
+            end = self._word_ends[word_id]
+            if end - start == len(word_bytes) and self._map[self._words_start + start:self._words_start + end] == word_bytes:
+                return word_id
+            slot = (slot + 1) & mask
+
+    def __contains__(self, word: str) -> bool:
+        return self.word_id(word) is not None
+
+    def __len__(self) -> int:
+        return self.vocabulary_size
+
+    def frequency(self, word: str) -> int:
+        word_id = self.word_id(word)
+        return 0 if word_id is None else self._word_counts[word_id]
+
+    def neighbours(self, word: str, k: Optional[int] = None) -> List[str]:
+        """The word's precomputed most associated words, strongest first (at most `top_k`)."""
+        word_id = self.word_id(word)
+        if word_id is None:
+            return []
+        start = word_id * self.top_k
+        result = []
+        for neighbour in self._neighbours[start:start + min(k or self.top_k, self.top_k)]:
+            if neighbour == NO_WORD:
+                break
+            result.append(self._word(neighbour))
+        return result
+
+    def related(self, word: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """The word's strongest neighbour that is not in `exclude`, or None."""
+        excluded = set(exclude)
+        for neighbour in self.neighbours(word):
+            if neighbour not in excluded:
+                return neighbour
+        return None
+
+    def cooccurrences(self, first: str, second: str) -> int:
+        """How often the two words occurred within the build window of each other (0 if rarer than `min_pair_count`)."""
+        first_id, second_id = self.word_id(first), self.word_id(second)
+        if first_id is None or second_id is None:
+            return 0
+        low, high = (self._row_ends[first_id - 1] if first_id else 0), self._row_ends[first_id]
+        while low < high: # Columns ascend within a row
+            middle = (low + high) // 2
+            if self._columns[middle] < second_id:
+                low = middle + 1
+            else:
+                high = middle
+        return self._pair_counts[low] if low < self._row_ends[first_id] and self._columns[low] == second_id else 0
+
+    def close(self):
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        self._map.close()
+
+
+def default_index_path() -> str:
+    return os.environ.get(WORD_ASSOC_ENV_VAR) or os.path.join(default_cache_dir(), ASSOC_FILENAME)
+
+
+_shared_associations = None
+_shared_associations_loaded = False
+_shared_associations_lock = threading.Lock()
+
+
+def get_word_associations() -> Optional[WordAssociations]:
+    """The process-wide index at `default_index_path()`, opened on first call; None if there is no usable index."""
+    global _shared_associations, _shared_associations_loaded
+    if not _shared_associations_loaded:
+        with _shared_associations_lock:
+            if not _shared_associations_loaded:
+                path = default_index_path()
+                if os.path.exists(path):
+                    try:
+                        _shared_associations = WordAssociations(path)
+                    except (OSError, ValueError) as e:
+                        log_event(logger, WARNING, "could not open word association index; using built-in themes", path=path, error=e)
+                _shared_associations_loaded = True
+    return _shared_associations
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or query the word association index.")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (TRACE, DEBUG, INFO, WARNING...).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build an index from text files and directories of .txt/.md files.")
+    build.add_argument("corpus", nargs="+", help="Corpus files or directories.")
+    build.add_argument("--output", default=None, help=f"Index file (default: {default_index_path()}).")
+    build.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Words on each side counted as co-occurring.")
+    build.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Neighbours stored per word.")
+    build.add_argument("--min-count", type=int, default=DEFAULT_MIN_COUNT, help="Drop words rarer than this.")
+    build.add_argument("--min-pair-count", type=int, default=DEFAULT_MIN_PAIR_COUNT, help="Drop word pairs rarer than this.")
+    build.add_argument("--max-vocabulary", type=int, default=DEFAULT_MAX_VOCABULARY, help="Keep at most this many words.")
+    query = commands.add_parser("query", help="Print the neighbours of words.")
+    query.add_argument("words", nargs="+")
+    query.add_argument("--index", default=None, help="Index file (default: the shared one).")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    if args.command == "build":
+        paragraphs = _Paragraphs(args.corpus)
+        stats = build_word_associations(paragraphs, args.output or default_index_path(), args.window, args.top_k,
+                                        args.min_count, args.min_pair_count, args.max_vocabulary)
+        print(" ".join(f"{key}={value}" for key, value in stats.items()))
+        return 0
+    associations = WordAssociations(args.index) if args.index else get_word_associations()
+    if associations is None:
+        log_event(logger, ERROR, "no word association index", path=default_index_path())
+        return 1
+    for word in args.words:
+        print(f"{word}: {' '.join(associations.neighbours(word.lower())) or '(unknown)'}")
+    return 0
+
+
+class _Paragraphs:
+    """Re-iterable `corpus_paragraphs`, so the build can read the corpus twice without holding it in memory."""
+
+    def __init__(self, paths: Sequence[str]):
+        self.paths = paths
+
+    def __iter__(self) -> Iterator[List[str]]:
+        return corpus_paragraphs(self.paths)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())